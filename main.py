@@ -1,6 +1,6 @@
 import sys
 import os
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QMessageBox
 from PyQt5.QtCore import QTimer
 from PyQt5.QtWebEngineWidgets import QWebEngineSettings
 
@@ -20,12 +20,30 @@ if __name__ == "__main__":
     # Create main window but don't show it yet
     main_window = MainWindow()
     
+    data_service = main_window.data_service
+    splash_time_over = False
+    
     # Function to close splash and show main window
     def show_main():
+        # Wait for both the splash time and the database (migrations may take a while)
+        if not splash_time_over or not data_service.is_ready:
+            return
         splash.close()
         main_window.show()
     
-    # Close splash and show main after 2.5 seconds
-    QTimer.singleShot(2500, show_main)
+    def end_splash_time():
+        global splash_time_over
+        splash_time_over = True
+        show_main()
+    
+    def database_failed(error):
+        splash.close()
+        QMessageBox.critical(None, "Database Error", f"Could not open the database:\n{error}")
+        app.exit(1)
+    
+    # Close splash and show main after 2.5 seconds, or once the database is open
+    QTimer.singleShot(2500, end_splash_time)
+    data_service.ready.connect(show_main)
+    data_service.open_failed.connect(database_failed)
     
     sys.exit(app.exec_())
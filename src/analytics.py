@@ -13,8 +13,6 @@ import seaborn as sns
 import numpy as np
 import calendar
 
-from src.utils.database import DatabaseManager
-
 class MplCanvas(FigureCanvas):
     def __init__(self, width=5, height=4, dpi=100):
         self.fig = Figure(figsize=(width, height), dpi=dpi)
@@ -29,10 +27,13 @@ class MplCanvas(FigureCanvas):
         self.fig.tight_layout()
 
 class AnalyticsWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, data_service, parent=None):
         super().__init__(parent)
         self.parent = parent
-        self.db_manager = DatabaseManager()
+        self.data_service = data_service
+        self.db_manager = data_service.db
+        self.db_worker = data_service.worker
+        self.chart_request = None
         
         # Main layout
         layout = QVBoxLayout(self)
@@ -246,15 +247,43 @@ class AnalyticsWidget(QWidget):
     
     def update_chart(self):
         """Update the chart based on selected type"""
+        # A newer update supersedes one still being read
+        if self.chart_request is not None:
+            self.chart_request.cancel()
+        request = self.db_worker.submit(
+            self.fetch_chart_data, self.year_combo.currentText(), self.month_combo.currentText()
+        )
+        request.finished.connect(lambda result, request=request: self.apply_chart_data(request, result))
+        self.chart_request = request
+    
+    def fetch_chart_data(self, current_year, current_month):
+        """Read the filter options and the filtered data for the charts (database worker thread)"""
+        years = [str(y) for y in self.db_manager.get_available_years()]
+        month_nums = self.db_manager.get_available_months()
+        name_to_num = {calendar.month_name[m]: m for m in month_nums}
+        # Selections that no longer exist fall back to all years/months, as the combos will
+        year = int(current_year) if current_year in years else None
+        month = name_to_num.get(current_month)
+        # Filter data in SQL; columnar result: one NumPy array per column
+        filtered_data = self.db_manager.query_crab_data_columns(
+            year=year,
+            month=month,
+            columns=['id', 'date_month', 'population', 'male_counts', 'female_counts',
+                     'latitude', 'longitude']
+        )
+        return years, month_nums, filtered_data
+    
+    def apply_chart_data(self, request, result):
+        """Refill the filter combos and draw the selected chart"""
+        if request is not self.chart_request:
+            return
+        self.chart_request = None
+        years, month_nums, filtered_data = result
+        
         chart_type = self.chart_type_combo.currentText()
-        crab_data = self.db_manager.get_all_crab_data()
         # Populate year/month combos
-        years = sorted(set(str(d['date_year']) for d in crab_data if d.get('date_year')))
         # Use month numbers for sorting, but display names
-        month_nums = sorted(set(int(d['date_month']) for d in crab_data if d.get('date_month')))
         month_names = [calendar.month_name[m] for m in month_nums]
-        num_to_name = {m: calendar.month_name[m] for m in month_nums}
-        name_to_num = {calendar.month_name[m]: m for m in month_nums}
         current_year = self.year_combo.currentText()
         current_month = self.month_combo.currentText()
         self.year_combo.blockSignals(True)
@@ -271,23 +300,13 @@ class AnalyticsWidget(QWidget):
             self.month_combo.setCurrentText(current_month)
         self.year_combo.blockSignals(False)
         self.month_combo.blockSignals(False)
-        # Filter data
-        year = self.year_combo.currentText()
-        month = self.month_combo.currentText()
-        filtered_data = crab_data
-        if year != "All Years":
-            filtered_data = [d for d in filtered_data if str(d.get('date_year')) == year]
-        if month != "All Months":
-            # Convert month name to number for filtering
-            month_num = name_to_num.get(month)
-            filtered_data = [d for d in filtered_data if int(d.get('date_month', 0)) == month_num]
-        if not filtered_data:
+        if len(filtered_data['population']) == 0:
             self.clear_all_charts()
             self.update_stat_cards_empty()
             return
-        populations = np.array([d['population'] for d in filtered_data])
-        latitudes = np.array([d['latitude'] for d in filtered_data])
-        longitudes = np.array([d['longitude'] for d in filtered_data])
+        populations = filtered_data['population']
+        latitudes = filtered_data['latitude']
+        longitudes = filtered_data['longitude']
         if chart_type == "Population Distribution":
             self.tab_widget.setCurrentIndex(0)
             self.update_distribution_chart(populations)
@@ -324,15 +343,9 @@ class AnalyticsWidget(QWidget):
         # Create categories based on population ranges
         categories = ["0-100", "101-200", "201-300", "301-400", "401-500", "500+"]
         
-        # Count populations in each category
-        counts = [
-            sum(1 for p in populations if p <= 100),
-            sum(1 for p in populations if 100 < p <= 200),
-            sum(1 for p in populations if 200 < p <= 300),
-            sum(1 for p in populations if 300 < p <= 400),
-            sum(1 for p in populations if 400 < p <= 500),
-            sum(1 for p in populations if p > 500)
-        ]
+        # Count populations in each category (bins are right-inclusive)
+        bins = np.digitize(populations, [100, 200, 300, 400, 500], right=True)
+        counts = np.bincount(bins, minlength=6).tolist()
         
         # Add data to bar set
         for count in counts:
@@ -419,11 +432,11 @@ class AnalyticsWidget(QWidget):
         self.trends_canvas.axes.clear()
         
         # Sort data by ID (assuming ID might have some chronological meaning)
-        sorted_data = sorted(crab_data, key=lambda x: x['id'])
+        order = np.argsort(crab_data['id'], kind='stable')
         
         # Extract data
-        ids = [d['id'] for d in sorted_data]
-        populations = [d['population'] for d in sorted_data]
+        ids = crab_data['id'][order].tolist()
+        populations = crab_data['population'][order]
         
         # Create line plot
         self.trends_canvas.axes.plot(ids, populations, marker='o', linestyle='-', color='#3498DB')
@@ -459,11 +472,14 @@ class AnalyticsWidget(QWidget):
         self.size_canvas.axes.clear()
         
         # Define size categories
+        small, medium, large, very_large = np.bincount(
+            np.digitize(populations, [100, 300, 500]), minlength=4
+        ).tolist()
         size_categories = {
-            'Small (<100)': sum(1 for p in populations if p < 100),
-            'Medium (100-300)': sum(1 for p in populations if 100 <= p < 300),
-            'Large (300-500)': sum(1 for p in populations if 300 <= p < 500),
-            'Very Large (500+)': sum(1 for p in populations if p >= 500)
+            'Small (<100)': small,
+            'Medium (100-300)': medium,
+            'Large (300-500)': large,
+            'Very Large (500+)': very_large
         }
         
         # Create pie chart
@@ -502,15 +518,11 @@ class AnalyticsWidget(QWidget):
         self.monthly_canvas.axes.clear()
         months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
         # Aggregate real data by month
-        month_totals = [0] * 12
-        month_counts = [0] * 12
-        for d in crab_data:
-            m = int(d['date_month']) - 1
-            if 0 <= m < 12:
-                month_totals[m] += d['population']
-                month_counts[m] += 1
+        month_index = crab_data['date_month'].astype(np.int64) - 1
+        month_totals = np.bincount(month_index, weights=crab_data['population'], minlength=12)[:12]
+        month_counts = np.bincount(month_index, minlength=12)[:12]
         # Calculate average population per month
-        monthly_avg = [month_totals[i] // month_counts[i] if month_counts[i] > 0 else 0 for i in range(12)]
+        monthly_avg = (month_totals // np.maximum(month_counts, 1)).astype(np.int64).tolist()
         # Create line plot
         self.monthly_canvas.axes.plot(months, monthly_avg, marker='o', linestyle='-', color='#3498DB', linewidth=2)
         # Fill area under the line
@@ -531,8 +543,8 @@ class AnalyticsWidget(QWidget):
 
     def update_ratio_chart(self, crab_data):
         self.ratio_series.clear()
-        total_males = sum(d['male_counts'] for d in crab_data) if crab_data else 0
-        total_females = sum(d['female_counts'] for d in crab_data) if crab_data else 0
+        total_males = int(crab_data['male_counts'].sum())
+        total_females = int(crab_data['female_counts'].sum())
         if total_males > 0:
             slice_male = self.ratio_series.append(f"Males: {total_males:,}", total_males)
             slice_male.setBrush(QColor("#06b6d4"))
@@ -5,8 +5,6 @@ from PyQt5.QtGui import QFont, QIcon, QPainter, QColor, QLinearGradient, QBrush
 from PyQt5.QtChart import QChart, QChartView, QPieSeries, QBarSeries, QBarSet, QBarCategoryAxis, QValueAxis
 import qtawesome as qta
 
-from src.utils.database import DatabaseManager
-
 class StatCard(QFrame):
     def __init__(self, title, value, icon_name, color="#3498DB", parent=None):
         super().__init__(parent)
@@ -76,10 +74,12 @@ class ChartCard(QFrame):
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
 class DashboardWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, data_service, parent=None):
         super().__init__(parent)
         self.parent = parent
-        self.db_manager = DatabaseManager()
+        self.data_service = data_service
+        self.db_manager = data_service.db
+        self.db_worker = data_service.worker
         
         # Main layout
         layout = QVBoxLayout(self)
@@ -115,41 +115,33 @@ class DashboardWidget(QWidget):
         stats_layout = QGridLayout()
         stats_layout.setSpacing(15)
         
-        # Get data for stats
-        all_crab_data = self.db_manager.get_all_crab_data()
-        # Find the latest year
-        years = [d['date_year'] for d in all_crab_data if d.get('date_year')]
-        latest_year = max(years) if years else None
-        crab_data = [d for d in all_crab_data if d.get('date_year') == latest_year] if latest_year else all_crab_data
-        total_locations = len(crab_data)
-        total_population = sum(d['population'] for d in crab_data) if crab_data else 0
-        total_females = sum(d['female_counts'] for d in crab_data) if crab_data else 0
-        total_males = sum(d['male_counts'] for d in crab_data) if crab_data else 0
+        # The stats are read on the worker; the cards show placeholders until then
+        self.data_version = None
         
         # Create stat cards
         self.locations_card = StatCard(
             "Total Locations", 
-            total_locations, 
+            "...", 
             "fa5s.map-marker-alt", 
             "#3498DB"
         )
         
         self.population_card = StatCard(
             "Total Population", 
-            total_population, 
+            "...", 
             "fa5s.users", 
             "#2E86C1"
         )
         
         self.female_card = StatCard(
             "Female Population",
-            total_females,
+            "...",
             "fa5s.venus",
             "#ec4899"
         )
         self.male_card = StatCard(
             "Male Population",
-            total_males,
+            "...",
             "fa5s.mars",
             "#06b6d4"
         )
@@ -166,7 +158,7 @@ class DashboardWidget(QWidget):
         charts_layout = QHBoxLayout()
         
         # Create distribution chart
-        self.distribution_chart = self.create_distribution_chart(crab_data)
+        self.distribution_chart = self.create_distribution_chart((0, 0, 0))
         charts_layout.addWidget(self.distribution_chart)
         
         # Create male/female ratio pie chart ONCE
@@ -194,9 +186,10 @@ class DashboardWidget(QWidget):
         layout.setStretchFactor(charts_layout, 2)
         
         # Initial pie chart data
-        self.update_ratio_chart(crab_data)
+        self.update_ratio_chart(0, 0)
+        self.refresh_data()
     
-    def create_distribution_chart(self, crab_data):
+    def create_distribution_chart(self, bucket_counts):
         """Create a chart showing population distribution"""
         chart_card = ChartCard("Population Distribution")
         chart_layout = chart_card.layout()
@@ -213,11 +206,9 @@ class DashboardWidget(QWidget):
         # Create pie series
         series = QPieSeries()
         
-        if crab_data:
-            # Count populations in each category
-            low = sum(1 for d in crab_data if d['population'] < 100)
-            medium = sum(1 for d in crab_data if 100 <= d['population'] <= 500)
-            high = sum(1 for d in crab_data if d['population'] > 500)
+        if any(bucket_counts):
+            # Records in each population category
+            low, medium, high = bucket_counts
             
             # Add slices
             if low > 0:
@@ -256,10 +247,8 @@ class DashboardWidget(QWidget):
         
         return chart_card
     
-    def update_ratio_chart(self, crab_data):
+    def update_ratio_chart(self, total_males, total_females):
         self.ratio_series.clear()
-        total_males = sum(d['male_counts'] for d in crab_data) if crab_data else 0
-        total_females = sum(d['female_counts'] for d in crab_data) if crab_data else 0
         if total_males > 0:
             slice_male = self.ratio_series.append(f"Males: {total_males:,}", total_males)
             slice_male.setBrush(QColor("#06b6d4"))
@@ -276,16 +265,39 @@ class DashboardWidget(QWidget):
             no_data.setLabelVisible(True)
             no_data.setLabelColor(QColor("#e0e0e0"))
 
+    def get_latest_year_stats(self):
+        """Get totals and low/medium/high bucket counts for the latest survey year"""
+        years = self.db_manager.get_available_years()
+        latest_year = years[-1] if years else None
+        stats = self.db_manager.get_summary_stats(latest_year)
+        # Low (<100), Medium (100-500), High (>500)
+        bucket_counts = self.db_manager.get_population_bucket_counts([99, 500], latest_year)
+        return stats, bucket_counts
+    
     def refresh_data(self):
         """Refresh dashboard data from the database and update UI."""
-        all_crab_data = self.db_manager.get_all_crab_data()
-        years = [d['date_year'] for d in all_crab_data if d.get('date_year')]
-        latest_year = max(years) if years else None
-        crab_data = [d for d in all_crab_data if d.get('date_year') == latest_year] if latest_year else all_crab_data
-        total_locations = len(crab_data)
-        total_population = sum(d['population'] for d in crab_data) if crab_data else 0
-        total_females = sum(d['female_counts'] for d in crab_data) if crab_data else 0
-        total_males = sum(d['male_counts'] for d in crab_data) if crab_data else 0
+        request = self.db_worker.submit(self.fetch_stats_if_changed, self.data_version)
+        request.finished.connect(self.apply_stats)
+    
+    def fetch_stats_if_changed(self, known_version):
+        """Read the latest year stats unless the data is still at known_version (database worker thread)"""
+        version = self.db_manager.get_data_version()
+        if version == known_version:
+            return None
+        stats, bucket_counts = self.get_latest_year_stats()
+        return version, stats, bucket_counts
+    
+    def apply_stats(self, result):
+        """Update the cards and charts with freshly read stats"""
+        # Nothing to redraw if no data changed since the last refresh
+        if result is None:
+            return
+        self.data_version, stats, bucket_counts = result
+        
+        total_locations = stats['record_count']
+        total_population = stats['total_population']
+        total_females = stats['total_females']
+        total_males = stats['total_males']
 
         # Update stat cards
         self.locations_card.update_value(total_locations)
@@ -305,7 +317,7 @@ class DashboardWidget(QWidget):
             widget = charts_layout.itemAt(i).widget()
             if widget and widget is not self.ratio_chart_card:
                 widget.setParent(None)
-        charts_layout.insertWidget(0, self.create_distribution_chart(crab_data))
+        charts_layout.insertWidget(0, self.create_distribution_chart(bucket_counts))
         # Update ratio chart data only
-        self.update_ratio_chart(crab_data)
+        self.update_ratio_chart(total_males, total_females)
         self.update()
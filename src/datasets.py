@@ -1,16 +1,63 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                             QTableWidget, QTableWidgetItem, QHeaderView,
                             QPushButton, QLineEdit, QComboBox, QFrame, QDialog,
-                            QFormLayout, QSpinBox, QDialogButtonBox, QMessageBox)
-from PyQt5.QtCore import Qt, QSize
+                            QFormLayout, QSpinBox, QDialogButtonBox, QMessageBox,
+                            QCheckBox)
+from PyQt5.QtCore import Qt, QSize, QTimer
 from PyQt5.QtGui import QIcon, QColor, QFont
 
 import qtawesome as qta
 from datetime import datetime
 
-from src.utils.database import DatabaseManager
+from src.utils.database import SEARCH_RANK_LIMIT
+from src.utils.db_worker import PRIORITY_INTERACTIVE, PRIORITY_BULK
+from src.utils.import_batches_dialog import ImportBatchesDialog
 from src.utils.notification import show_notification
 
+# Records shown per page of the table
+PAGE_SIZE = 100
+
+# Population filter choices as inclusive (min, max) ranges
+POPULATION_RANGES = {1: (None, 99), 2: (100, 500), 3: (501, None)}
+
+EDIT_DIALOG_STYLE = """
+QDialog {
+    background-color: rgba(15, 32, 65, 0.95);
+    color: #e0e0e0;
+}
+QLabel {
+    color: #e0e0e0;
+    font-weight: bold;
+}
+QLineEdit, QSpinBox, QComboBox {
+    background-color: rgba(10, 25, 50, 0.7);
+    border: 1px solid rgba(41, 128, 185, 0.5);
+    border-radius: 8px;
+    padding: 8px;
+    color: #e0e0e0;
+}
+QLineEdit:focus, QSpinBox:focus, QComboBox:focus {
+    border: 1px solid rgba(52, 152, 219, 0.8);
+    background-color: rgba(20, 40, 80, 0.7);
+}
+QPushButton {
+    background-color: rgba(41, 128, 185, 0.8);
+    color: white;
+    border: none;
+    border-radius: 8px;
+    padding: 8px 16px;
+    font-weight: bold;
+}
+QPushButton:hover {
+    background-color: rgba(52, 152, 219, 0.9);
+}
+QComboBox QAbstractItemView {
+    background-color: rgba(15, 32, 65, 0.95);
+    color: #e0e0e0;
+    selection-background-color: rgba(41, 128, 185, 0.8);
+}
+"""
+
 class EditDialog(QDialog):
     def __init__(self, data, parent=None):
         super().__init__(parent)
@@ -19,43 +66,7 @@ class EditDialog(QDialog):
         self.setFixedSize(400, 400)  # Reduced height
         
         # Apply dark theme
-        self.setStyleSheet("""
-            QDialog {
-                background-color: rgba(15, 32, 65, 0.95);
-                color: #e0e0e0;
-            }
-            QLabel {
-                color: #e0e0e0;
-                font-weight: bold;
-            }
-            QLineEdit, QSpinBox, QComboBox {
-                background-color: rgba(10, 25, 50, 0.7);
-                border: 1px solid rgba(41, 128, 185, 0.5);
-                border-radius: 8px;
-                padding: 8px;
-                color: #e0e0e0;
-            }
-            QLineEdit:focus, QSpinBox:focus, QComboBox:focus {
-                border: 1px solid rgba(52, 152, 219, 0.8);
-                background-color: rgba(20, 40, 80, 0.7);
-            }
-            QPushButton {
-                background-color: rgba(41, 128, 185, 0.8);
-                color: white;
-                border: none;
-                border-radius: 8px;
-                padding: 8px 16px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: rgba(52, 152, 219, 0.9);
-            }
-            QComboBox QAbstractItemView {
-                background-color: rgba(15, 32, 65, 0.95);
-                color: #e0e0e0;
-                selection-background-color: rgba(41, 128, 185, 0.8);
-            }
-        """)
+        self.setStyleSheet(EDIT_DIALOG_STYLE)
         
         layout = QVBoxLayout(self)
         
@@ -147,11 +158,95 @@ class EditDialog(QDialog):
             'population': population
         }
 
+class BulkEditDialog(QDialog):
+    def __init__(self, count, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Bulk Edit Records")
+        self.setModal(True)
+        self.setFixedSize(400, 260)
+        
+        # Same dark theme as the single-record editor
+        self.setStyleSheet(EDIT_DIALOG_STYLE)
+        
+        layout = QVBoxLayout(self)
+        
+        info = QLabel(f"Apply to {count} selected records. Only ticked fields are changed.")
+        info.setWordWrap(True)
+        layout.addWidget(info)
+        
+        form_layout = QFormLayout()
+        
+        # Each field is enabled by its checkbox
+        self.year_check = QCheckBox("Year:")
+        self.year_spin = QSpinBox()
+        self.year_spin.setRange(1900, datetime.now().year)
+        self.year_spin.setValue(datetime.now().year)
+        self.year_spin.setEnabled(False)
+        self.year_check.toggled.connect(self.year_spin.setEnabled)
+        form_layout.addRow(self.year_check, self.year_spin)
+        
+        self.month_check = QCheckBox("Month:")
+        self.month_combo = QComboBox()
+        self.month_combo.addItems([
+            "January", "February", "March", "April", "May", "June",
+            "July", "August", "September", "October", "November", "December"
+        ])
+        self.month_combo.setEnabled(False)
+        self.month_check.toggled.connect(self.month_combo.setEnabled)
+        form_layout.addRow(self.month_check, self.month_combo)
+        
+        self.observer_check = QCheckBox("Observer:")
+        self.observer_input = QLineEdit()
+        self.observer_input.setPlaceholderText("Observer name")
+        self.observer_input.setEnabled(False)
+        self.observer_check.toggled.connect(self.observer_input.setEnabled)
+        form_layout.addRow(self.observer_check, self.observer_input)
+        
+        layout.addLayout(form_layout)
+        
+        # Buttons
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+    
+    def get_changes(self):
+        """Get the values to apply to every selected record"""
+        changes = {}
+        if self.year_check.isChecked():
+            changes['date_year'] = self.year_spin.value()
+        if self.month_check.isChecked():
+            changes['date_month'] = self.month_combo.currentIndex() + 1
+        if self.observer_check.isChecked():
+            name = self.observer_input.text().strip()
+            if not name:
+                raise ValueError("Observer name is required")
+            changes['observer_name'] = name
+        
+        if not changes:
+            raise ValueError("Tick at least one field to change")
+        return changes
+
 class DatasetsWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, data_service, parent=None):
         super().__init__(parent)
         self.parent = parent
-        self.db_manager = DatabaseManager()
+        self.data_service = data_service
+        self.db_manager = data_service.db
+        self.db_worker = data_service.worker
+        self.load_request = None
+        
+        # The table shows one page of the records matching the search box and
+        # filters. page_keys holds where each page visited so far starts: a
+        # keyset position when browsing, a result offset when searching
+        self.page = 0
+        self.page_keys = [None]
+        self.page_text = ''
+        self.total_records = 0
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.apply_filters)
         
         # Main layout
         layout = QVBoxLayout(self)
@@ -185,14 +280,15 @@ class DatasetsWidget(QWidget):
         search_icon.setPixmap(search_icon_qta.pixmap(16, 16))
         
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Search by ID or Observer...")
+        self.search_input.setPlaceholderText("Search by ID, observer or location...")
         self.search_input.setStyleSheet("""
             border: none;
             padding: 5px;
             background-color: transparent;
             color: #e0e0e0;
         """)
-        self.search_input.textChanged.connect(self.filter_data)
+        # Search once typing pauses rather than on every keystroke
+        self.search_input.textChanged.connect(self.search_timer.start)
         
         search_layout.addWidget(search_icon)
         search_layout.addWidget(self.search_input)
@@ -210,7 +306,7 @@ class DatasetsWidget(QWidget):
             padding: 5px;
             color: #e0e0e0;
         """)
-        self.filter_combo.currentIndexChanged.connect(self.filter_data)
+        self.filter_combo.currentIndexChanged.connect(self.apply_filters)
         
         year_label = QLabel("Year:")
         year_label.setStyleSheet("margin-left: 10px; color: #e0e0e0;")
@@ -224,7 +320,7 @@ class DatasetsWidget(QWidget):
             padding: 5px;
             color: #e0e0e0;
         """)
-        self.year_combo.currentIndexChanged.connect(self.filter_data)
+        self.year_combo.currentIndexChanged.connect(self.apply_filters)
         
         # Action buttons
         self.refresh_btn = QPushButton("Refresh")
@@ -242,6 +338,10 @@ class DatasetsWidget(QWidget):
                 background-color: rgba(52, 152, 219, 0.9);
             }
         """)
+        self.bulk_edit_btn = QPushButton("Bulk Edit")
+        self.bulk_edit_btn.setIcon(qta.icon('fa5s.edit', color='white'))
+        self.bulk_edit_btn.clicked.connect(self.bulk_edit_records)
+        self.bulk_edit_btn.setStyleSheet(self.refresh_btn.styleSheet())
         self.delete_selected_btn = QPushButton("Delete Selected")
         self.delete_selected_btn.setIcon(qta.icon('fa5s.trash', color='white'))
         self.delete_selected_btn.clicked.connect(self.delete_selected_records)
@@ -250,6 +350,10 @@ class DatasetsWidget(QWidget):
         self.delete_all_btn.setIcon(qta.icon('fa5s.trash-alt', color='white'))
         self.delete_all_btn.clicked.connect(self.delete_all_records)
         self.delete_all_btn.setStyleSheet(self.refresh_btn.styleSheet())
+        self.import_batches_btn = QPushButton("Import Batches")
+        self.import_batches_btn.setIcon(qta.icon('fa5s.history', color='white'))
+        self.import_batches_btn.clicked.connect(self.show_import_batches)
+        self.import_batches_btn.setStyleSheet(self.refresh_btn.styleSheet())
         
         controls_layout.addWidget(search_container)
         controls_layout.addWidget(filter_label)
@@ -258,8 +362,10 @@ class DatasetsWidget(QWidget):
         controls_layout.addWidget(self.year_combo)
         controls_layout.addStretch()
         controls_layout.addWidget(self.refresh_btn)
+        controls_layout.addWidget(self.bulk_edit_btn)
         controls_layout.addWidget(self.delete_selected_btn)
         controls_layout.addWidget(self.delete_all_btn)
+        controls_layout.addWidget(self.import_batches_btn)
         
         layout.addLayout(controls_layout)
         
@@ -328,85 +434,225 @@ class DatasetsWidget(QWidget):
         
         layout.addWidget(self.table)
         
+        # Page controls
+        pager_layout = QHBoxLayout()
+        self.page_label = QLabel("")
+        self.page_label.setStyleSheet("color: #c0c0c0;")
+        self.prev_page_btn = QPushButton("Previous")
+        self.prev_page_btn.setIcon(qta.icon('fa5s.chevron-left', color='white'))
+        self.prev_page_btn.clicked.connect(self.previous_page)
+        self.prev_page_btn.setStyleSheet(self.refresh_btn.styleSheet())
+        self.next_page_btn = QPushButton("Next")
+        self.next_page_btn.setIcon(qta.icon('fa5s.chevron-right', color='white'))
+        self.next_page_btn.clicked.connect(self.next_page)
+        self.next_page_btn.setStyleSheet(self.refresh_btn.styleSheet())
+        self.prev_page_btn.setEnabled(False)
+        self.next_page_btn.setEnabled(False)
+        
+        pager_layout.addWidget(self.page_label)
+        pager_layout.addStretch()
+        pager_layout.addWidget(self.prev_page_btn)
+        pager_layout.addWidget(self.next_page_btn)
+        layout.addLayout(pager_layout)
+        
         # Load initial data
+        self.data_version = None
+        self.load_data()
+    
+    def refresh_if_changed(self):
+        """Reload the table only if the data changed since it was loaded"""
+        request = self.db_worker.submit(self.db_manager.get_data_version)
+        request.finished.connect(
+            lambda version: self.load_data() if version != self.data_version else None
+        )
+    
+    def current_filters(self):
+        """Get the year and population filters as query_crab_data arguments"""
+        filters = {}
+        if self.year_combo.currentIndex() > 0:
+            filters['year'] = int(self.year_combo.currentText())
+        if self.filter_combo.currentIndex() > 0:
+            filters['pop_range'] = POPULATION_RANGES[self.filter_combo.currentIndex()]
+        return filters
+    
+    def apply_filters(self):
+        """Show the first page of records matching the search box and filters"""
+        self.search_timer.stop()
+        self.page = 0
+        self.page_keys = [None]
         self.load_data()
     
+    def next_page(self):
+        """Show the page after the current one"""
+        if self.page + 1 < len(self.page_keys):
+            self.page += 1
+            self.load_data()
+    
+    def previous_page(self):
+        """Show the page before the current one"""
+        if self.page > 0:
+            self.page -= 1
+            self.load_data()
+    
     def load_data(self):
-        """Load data from database into table"""
-        self.table.setRowCount(0)
+        """Load the current page from the database into the table"""
+        # A newer load supersedes one still running
+        if self.load_request is not None:
+            self.load_request.cancel()
+        
+        self.prev_page_btn.setEnabled(False)
+        self.next_page_btn.setEnabled(False)
+        
+        self.page_text = self.search_input.text().strip()
+        request = self.db_worker.submit(
+            self._read_page, self.page_text, self.current_filters(),
+            self.page_keys[self.page], self.page == 0, priority=PRIORITY_INTERACTIVE
+        )
+        request.finished.connect(lambda result, request=request: self._on_page_loaded(request, result))
+        request.failed.connect(
+            lambda error: show_notification(self.parent, "Error", f"Failed to load records: {error}")
+        )
+        self.load_request = request
+    
+    def _read_page(self, text, filters, start, count):
+        """Read one page of records and where the next one starts (database worker thread)
+        
+        Only the rows on the page are read, from the full-text search when
+        there is search text and from the filtered table otherwise. Search
+        matches are only counted when count is True; later pages of a search
+        keep the total read with its first page.
+        """
+        version = self.db_manager.get_data_version()
+        years = self.db_manager.get_available_years()
+        
+        if text:
+            rows = self.db_manager.search(text, PAGE_SIZE, offset=start or 0, **filters)
+            next_start = (start or 0) + len(rows)
+            if not count:
+                total = None
+            elif len(rows) < PAGE_SIZE:
+                total = len(rows)
+            else:
+                # Stops counting past the ranking limit; shown as "more than"
+                total = self.db_manager.count_search(text, SEARCH_RANK_LIMIT + 1, **filters)
+        else:
+            next_start, rows = next(
+                self.db_manager.iter_crab_data(batch_size=PAGE_SIZE, after_key=start, **filters),
+                (start, [])
+            )
+            total = self.db_manager.count_crab_data(**filters)
+        return version, years, rows, next_start, total
+    
+    def _on_page_loaded(self, request, result):
+        """Show a page read by _read_page"""
+        if request is not self.load_request:
+            return
+        self.load_request = None
         
-        crab_data = self.db_manager.get_all_crab_data()
+        self.data_version, years, rows, next_start, total = result
+        if total is not None:
+            self.total_records = total
         
-        if not crab_data:
+        if self.set_years(years):
+            # The selected year no longer exists, so this page was empty
+            self.apply_filters()
             return
         
-        # Populate year filter
+        self.table.setRowCount(len(rows))
+        for i, data in enumerate(rows):
+            self.add_table_row(i, data)
+        self.table.scrollToTop()
+        
+        first = self.page * PAGE_SIZE
+        exact = self.total_records <= SEARCH_RANK_LIMIT or not self.page_text
+        has_next = len(rows) == PAGE_SIZE and (first + len(rows) < self.total_records or not exact)
+        del self.page_keys[self.page + 1:]
+        if has_next:
+            self.page_keys.append(next_start)
+        
+        if not rows:
+            self.page_label.setText("No matching records")
+        else:
+            of = f"{self.total_records:,}" if exact else f"more than {SEARCH_RANK_LIMIT:,}"
+            self.page_label.setText(f"Records {first + 1:,}-{first + len(rows):,} of {of}")
+        self.prev_page_btn.setEnabled(self.page > 0)
+        self.next_page_btn.setEnabled(has_next)
+    
+    def set_years(self, years):
+        """Refill the year filter, keeping the selected year; True if it was dropped"""
+        selected = self.year_combo.currentText()
+        # Refilling would reload the table once per added item
+        self.year_combo.blockSignals(True)
         self.year_combo.clear()
         self.year_combo.addItem("All Years")
-        years = sorted(set(data['date_year'] for data in crab_data))
         for year in years:
             self.year_combo.addItem(str(year))
-        
-        # Fill table
-        self.table.setRowCount(len(crab_data))
-        
+        index = self.year_combo.findText(selected)
+        self.year_combo.setCurrentIndex(max(index, 0))
+        self.year_combo.blockSignals(False)
+        return index < 0
+    
+    def add_table_row(self, i, data):
+        """Fill table row i with one crab data record"""
         month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
                       "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
         
-        for i, data in enumerate(crab_data):
-            # Checkbox
-            checkbox_item = QTableWidgetItem()
-            checkbox_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
-            checkbox_item.setCheckState(Qt.Unchecked)
-            self.table.setItem(i, 0, checkbox_item)
-            
-            # ID
-            id_item = QTableWidgetItem(data['id'])
-            id_item.setFlags(id_item.flags() & ~Qt.ItemIsEditable)
-            id_item.setForeground(QColor("#e0e0e0"))
-            self.table.setItem(i, 1, id_item)
-            
-            # Month
-            month_item = QTableWidgetItem(month_names[data['date_month'] - 1])
-            month_item.setTextAlignment(Qt.AlignCenter)
-            month_item.setForeground(QColor("#e0e0e0"))
-            self.table.setItem(i, 2, month_item)
-            
-            # Year
-            year_item = QTableWidgetItem(str(data['date_year']))
-            year_item.setTextAlignment(Qt.AlignCenter)
-            year_item.setForeground(QColor("#e0e0e0"))
-            self.table.setItem(i, 3, year_item)
-            
-            # Only keep male and female counts
-            male_item = QTableWidgetItem(str(data['male_counts']))
-            male_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            male_item.setForeground(QColor("#06b6d4"))
-            self.table.setItem(i, 4, male_item)
-            
-            female_item = QTableWidgetItem(str(data['female_counts']))
-            female_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            female_item.setForeground(QColor("#ec4899"))
-            self.table.setItem(i, 5, female_item)
-            
-            # Population
-            pop_item = QTableWidgetItem(str(data['population']))
-            pop_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            pop_item.setForeground(QColor("#f59e0b"))
-            pop_item.setFont(QFont("Arial", 10, QFont.Bold))
-            self.table.setItem(i, 6, pop_item)
-            
-            # Observer
-            obs_item = QTableWidgetItem(data['observer_name'] or 'Unknown')
-            obs_item.setForeground(QColor("#e0e0e0"))
-            self.table.setItem(i, 7, obs_item)
-            
-            # Location
-            loc_item = QTableWidgetItem(data['location_name'] or f"{data['latitude']:.3f}, {data['longitude']:.3f}")
-            loc_item.setForeground(QColor("#e0e0e0"))
-            self.table.setItem(i, 8, loc_item)
-            
-            # Actions
+        # Checkbox
+        checkbox_item = QTableWidgetItem()
+        checkbox_item.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
+        checkbox_item.setCheckState(Qt.Unchecked)
+        self.table.setItem(i, 0, checkbox_item)
+        
+        # ID: the code is shown, the integer key is kept for edits and deletes
+        id_item = QTableWidgetItem(data['code'])
+        id_item.setData(Qt.UserRole, data['id'])
+        id_item.setFlags(id_item.flags() & ~Qt.ItemIsEditable)
+        id_item.setForeground(QColor("#e0e0e0"))
+        self.table.setItem(i, 1, id_item)
+        
+        # Month
+        month_item = QTableWidgetItem(month_names[data['date_month'] - 1])
+        month_item.setTextAlignment(Qt.AlignCenter)
+        month_item.setForeground(QColor("#e0e0e0"))
+        self.table.setItem(i, 2, month_item)
+        
+        # Year
+        year_item = QTableWidgetItem(str(data['date_year']))
+        year_item.setTextAlignment(Qt.AlignCenter)
+        year_item.setForeground(QColor("#e0e0e0"))
+        self.table.setItem(i, 3, year_item)
+        
+        # Only keep male and female counts
+        male_item = QTableWidgetItem(str(data['male_counts']))
+        male_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        male_item.setForeground(QColor("#06b6d4"))
+        self.table.setItem(i, 4, male_item)
+        
+        female_item = QTableWidgetItem(str(data['female_counts']))
+        female_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        female_item.setForeground(QColor("#ec4899"))
+        self.table.setItem(i, 5, female_item)
+        
+        # Population
+        pop_item = QTableWidgetItem(str(data['population']))
+        pop_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        pop_item.setForeground(QColor("#f59e0b"))
+        pop_item.setFont(QFont("Arial", 10, QFont.Bold))
+        self.table.setItem(i, 6, pop_item)
+        
+        # Observer
+        obs_item = QTableWidgetItem(data['observer_name'] or 'Unknown')
+        obs_item.setForeground(QColor("#e0e0e0"))
+        self.table.setItem(i, 7, obs_item)
+        
+        # Location
+        loc_item = QTableWidgetItem(data['location_name'] or f"{data['latitude']:.3f}, {data['longitude']:.3f}")
+        loc_item.setForeground(QColor("#e0e0e0"))
+        self.table.setItem(i, 8, loc_item)
+        
+        # Actions. The buttons act on whatever record is in row i, so rows
+        # keep theirs when the table is refilled with another page
+        if self.table.cellWidget(i, 9) is None:
             actions_widget = QWidget()
             actions_layout = QHBoxLayout(actions_widget)
             actions_layout.setContentsMargins(5, 2, 5, 2)
@@ -449,142 +695,163 @@ class DatasetsWidget(QWidget):
             actions_layout.addStretch()
             
             self.table.setCellWidget(i, 9, actions_widget)
-            
-            # Created timestamp
-            created_item = QTableWidgetItem(data['created_at'][:10] if data['created_at'] else '')
-            created_item.setTextAlignment(Qt.AlignCenter)
-            created_item.setForeground(QColor("#a0a0a0"))
-            self.table.setItem(i, 10, created_item)
-            
-            # Color rows based on population
-            if data['population'] < 100:
-                row_color = QColor(59, 130, 246, 30)
-            elif data['population'] <= 500:
-                row_color = QColor(16, 185, 129, 30)
-            else:
-                row_color = QColor(239, 68, 68, 30)
-            
-            for j in range(10):
-                if j != 9:  # Skip actions column (now at 9)
-                    item = self.table.item(i, j)
-                    if item:
-                        item.setBackground(row_color)
-    
-    def filter_data(self):
-        """Filter table data based on search and filter criteria"""
-        search_text = self.search_input.text().lower()
-        filter_idx = self.filter_combo.currentIndex()
-        year_filter = self.year_combo.currentText()
         
-        # Show all rows first
-        for i in range(self.table.rowCount()):
-            self.table.setRowHidden(i, False)
+        # Created timestamp
+        created_item = QTableWidgetItem(data['created_at'][:10] if data['created_at'] else '')
+        created_item.setTextAlignment(Qt.AlignCenter)
+        created_item.setForeground(QColor("#a0a0a0"))
+        self.table.setItem(i, 10, created_item)
+        
+        # Color rows based on population
+        if data['population'] < 100:
+            row_color = QColor(59, 130, 246, 30)
+        elif data['population'] <= 500:
+            row_color = QColor(16, 185, 129, 30)
+        else:
+            row_color = QColor(239, 68, 68, 30)
         
-        # Apply filters
-        for i in range(self.table.rowCount()):
-            id_item = self.table.item(i, 1)
-            pop_item = self.table.item(i, 6)
-            year_item = self.table.item(i, 3)
-            obs_item = self.table.item(i, 7)
-            
-            # Search filter
-            search_match = (search_text == "" or 
-                           search_text in id_item.text().lower() or
-                           search_text in obs_item.text().lower())
-            
-            # Population filter
-            pop_match = True
-            if filter_idx > 0:
-                population = int(pop_item.text())
-                if filter_idx == 1:  # Low
-                    pop_match = population < 100
-                elif filter_idx == 2:  # Medium
-                    pop_match = 100 <= population <= 500
-                elif filter_idx == 3:  # High
-                    pop_match = population > 500
-            
-            # Year filter
-            year_match = True
-            if year_filter != "All Years":
-                year_match = year_item.text() == year_filter
-            
-            self.table.setRowHidden(i, not (search_match and pop_match and year_match))
-    
+        for j in range(10):
+            if j != 9:  # Skip actions column (now at 9)
+                item = self.table.item(i, j)
+                if item:
+                    item.setBackground(row_color)
+
     def edit_record(self, row):
         """Edit a record"""
+        # Get record ID
+        record_id = self.table.item(row, 1).data(Qt.UserRole)
+        
+        # Get current data, then open the edit dialog with it
+        request = self.db_worker.submit(self.db_manager.get_crab_data_by_id, record_id)
+        request.finished.connect(lambda data: self._show_edit_dialog(record_id, data))
+        request.failed.connect(
+            lambda error: show_notification(self.parent, "Error", f"Failed to edit record: {error}")
+        )
+    
+    def _show_edit_dialog(self, record_id, data):
+        if not data:
+            show_notification(self.parent, "Error", "Record not found")
+            return
+        
+        dialog = EditDialog(data, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
         try:
-            # Get record ID
-            record_id = self.table.item(row, 1).text()
-            
-            # Get current data
-            data = self.db_manager.get_crab_data_by_id(record_id)
-            if not data:
-                show_notification(self.parent, "Error", "Record not found")
-                return
-            
-            # Open edit dialog
-            dialog = EditDialog(data, self)
-            if dialog.exec_() == QDialog.Accepted:
-                try:
-                    updated_data = dialog.get_data()
-                    self.db_manager.update_crab_data(record_id, updated_data)
-                    
-                    show_notification(self.parent, "Success", "Record updated successfully")
-                    self.load_data()  # Reload data
-                    
-                except ValueError as e:
-                    show_notification(self.parent, "Validation Error", str(e))
-                except Exception as e:
-                    show_notification(self.parent, "Error", f"Failed to update record: {str(e)}")
-                    
-        except Exception as e:
-            show_notification(self.parent, "Error", f"Failed to edit record: {str(e)}")
+            updated_data = dialog.get_data()
+        except ValueError as e:
+            show_notification(self.parent, "Validation Error", str(e))
+            return
+        
+        # Written on the worker so a running import can't freeze the UI on the lock
+        request = self.db_worker.submit(
+            self.db_manager.update_crab_data, record_id, updated_data, priority=PRIORITY_BULK
+        )
+        request.finished.connect(self._on_edit_finished)
+        request.failed.connect(
+            lambda error: show_notification(self.parent, "Error", f"Failed to update record: {error}")
+        )
+    
+    def _on_edit_finished(self, _):
+        show_notification(self.parent, "Success", "Record updated successfully")
+        self.data_service.notify_changed()  # Reload every page
     
     def delete_record(self, row):
         """Delete a record"""
-        try:
-            # Get record ID
-            record_id = self.table.item(row, 1).text()
-            
-            # Confirm deletion
-            reply = QMessageBox.question(
-                self, 
-                "Confirm Deletion",
-                f"Are you sure you want to delete record {record_id}?\n\nThis action cannot be undone.",
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No
+        # Get record ID
+        record_id = self.table.item(row, 1).data(Qt.UserRole)
+        record_code = self.table.item(row, 1).text()
+        
+        # Confirm deletion
+        reply = QMessageBox.question(
+            self, 
+            "Confirm Deletion",
+            f"Are you sure you want to delete record {record_code}?\n\nThis action cannot be undone.",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        
+        if reply == QMessageBox.Yes:
+            request = self.db_worker.submit(self.db_manager.delete_crab_data, record_id, priority=PRIORITY_BULK)
+            request.finished.connect(self._on_delete_finished)
+            request.failed.connect(
+                lambda error: show_notification(self.parent, "Error", f"Failed to delete record: {error}")
             )
-            
-            if reply == QMessageBox.Yes:
-                self.db_manager.delete_crab_data(record_id)
-                show_notification(self.parent, "Success", "Record deleted successfully")
-                self.load_data()  # Reload data
-                
-        except Exception as e:
-            show_notification(self.parent, "Error", f"Failed to delete record: {str(e)}")
+    
+    def _on_delete_finished(self, _):
+        show_notification(self.parent, "Success", "Record deleted successfully")
+        self.data_service.notify_changed()  # Reload every page
 
-    def delete_selected_records(self):
-        """Delete all selected records (checked checkboxes)"""
-        rows_to_delete = []
+    def selected_record_ids(self):
+        """Get the database ids of all checked rows on the current page"""
+        ids = []
         for i in range(self.table.rowCount()):
             item = self.table.item(i, 0)
             if item and item.checkState() == Qt.Checked:
-                rows_to_delete.append(i)
-        if not rows_to_delete:
+                ids.append(self.table.item(i, 1).data(Qt.UserRole))
+        return ids
+
+    def delete_selected_records(self):
+        """Delete all selected records (checked checkboxes)"""
+        ids = self.selected_record_ids()
+        if not ids:
             show_notification(self.parent, "No Selection", "No records selected for deletion.")
             return
         reply = QMessageBox.question(
             self, "Confirm Deletion",
-            f"Are you sure you want to delete {len(rows_to_delete)} selected records?\n\nThis action cannot be undone.",
+            f"Are you sure you want to delete {len(ids)} selected records?\n\nThis action cannot be undone.",
             QMessageBox.Yes | QMessageBox.No, QMessageBox.No
         )
         if reply == QMessageBox.Yes:
-            for row in sorted(rows_to_delete, reverse=True):
-                record_id = self.table.item(row, 1).text()
-                self.db_manager.delete_crab_data(record_id)
-            show_notification(self.parent, "Success", f"Deleted {len(rows_to_delete)} records.")
-            self.load_data()
+            # One set-based delete instead of a round trip per row
+            self.delete_selected_btn.setEnabled(False)
+            request = self.db_worker.submit(self.db_manager.delete_crab_data_many, ids, priority=PRIORITY_BULK)
+            request.finished.connect(self._on_delete_selected_finished)
+            request.failed.connect(self._on_delete_selected_failed)
+
+    def _on_delete_selected_finished(self, deleted):
+        self.delete_selected_btn.setEnabled(True)
+        show_notification(self.parent, "Success", f"Deleted {deleted} records.")
+        self.data_service.notify_changed()
+
+    def _on_delete_selected_failed(self, error):
+        self.delete_selected_btn.setEnabled(True)
+        show_notification(self.parent, "Error", f"Failed to delete records: {error}")
+
+    def bulk_edit_records(self):
+        """Change year, month or observer on all selected records at once"""
+        ids = self.selected_record_ids()
+        if not ids:
+            show_notification(self.parent, "No Selection", "No records selected for editing.")
+            return
+        dialog = BulkEditDialog(len(ids), self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        try:
+            values = dialog.get_changes()
+        except ValueError as e:
+            show_notification(self.parent, "Validation Error", str(e))
+            return
+
+        self.bulk_edit_btn.setEnabled(False)
+        changes = {record_id: values for record_id in ids}
+        request = self.db_worker.submit(self.db_manager.update_crab_data_many, changes, priority=PRIORITY_BULK)
+        request.finished.connect(self._on_bulk_edit_finished)
+        request.failed.connect(self._on_bulk_edit_failed)
+
+    def _on_bulk_edit_finished(self, updated):
+        self.bulk_edit_btn.setEnabled(True)
+        show_notification(self.parent, "Success", f"Updated {updated} records.")
+        self.data_service.notify_changed()
+
+    def _on_bulk_edit_failed(self, error):
+        self.bulk_edit_btn.setEnabled(True)
+        show_notification(self.parent, "Error", f"Failed to update records: {error}")
 
+    def show_import_batches(self):
+        """List CSV imports so a whole upload can be rolled back"""
+        dialog = ImportBatchesDialog(self.data_service, self)
+        dialog.exec_()
+    
     def delete_all_records(self):
         """Delete all records from the database"""
         reply = QMessageBox.question(
@@ -593,6 +860,16 @@ class DatasetsWidget(QWidget):
             QMessageBox.Yes | QMessageBox.No, QMessageBox.No
         )
         if reply == QMessageBox.Yes:
-            self.db_manager.delete_all_crab_data()
-            show_notification(self.parent, "Success", "All records deleted.")
-            self.load_data()
+            self.delete_all_btn.setEnabled(False)
+            request = self.db_worker.submit(self.db_manager.delete_all_crab_data, priority=PRIORITY_BULK)
+            request.finished.connect(self._on_delete_all_finished)
+            request.failed.connect(self._on_delete_all_failed)
+    
+    def _on_delete_all_finished(self, _):
+        self.delete_all_btn.setEnabled(True)
+        show_notification(self.parent, "Success", "All records deleted.")
+        self.data_service.notify_changed()
+    
+    def _on_delete_all_failed(self, error):
+        self.delete_all_btn.setEnabled(True)
+        show_notification(self.parent, "Error", f"Failed to delete records: {error}")
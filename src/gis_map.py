@@ -8,16 +8,19 @@ import json
 import os
 import qtawesome as qta
 
-from src.utils.database import DatabaseManager
 from src.utils.map_controls import MapControlsWidget
 from src.utils.glass_controls import GlassMapControls, GlassFilterControls, GlassAnalyticsCards
 
 class GISMapWidget(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, data_service, parent=None):
         super().__init__(parent)
         self.parent = parent
-        self.db_manager = DatabaseManager()
+        self.data_service = data_service
+        self.db_manager = data_service.db
+        self.db_worker = data_service.worker
+        self.map_request = None
         self.selected_year = None  # Track selected year
+        self.data_version = None  # Set when the year filter is first filled
         
         # Main layout
         layout = QVBoxLayout(self)
@@ -474,53 +477,69 @@ class GISMapWidget(QWidget):
     
     def refresh_map_data(self, year=None):
         """Refresh the map with current data, filtered by year if given"""
+        # A newer refresh supersedes one still being built
+        if self.map_request is not None:
+            self.map_request.cancel()
+        request = self.db_worker.submit(self.build_map_payload, year)
+        request.finished.connect(lambda payload, request=request: self.apply_map_payload(request, payload))
+        self.map_request = request
+    
+    def build_map_payload(self, year=None):
+        """Read the markers and analytics for the map (database worker thread)"""
+        # Switching back to a year already shown is served from the query cache
+        return self.db_manager.cached_query('map_payload', self._read_map_payload, year)
+    
+    def _read_map_payload(self, year):
+        # Stream the records in keyset pages and build the JSON payload
+        # piece by piece, so the full result set is never held as dicts
+        pieces = []
+        total_records = 0
+        max_population = 0
+        for _, batch in self.db_manager.iter_crab_data(batch_size=5000, year=year):
+            pieces.append(json.dumps(batch)[1:-1])
+            total_records += len(batch)
+            max_population = max(max_population, max(item['population'] for item in batch))
+        print(f"Loaded {total_records} records from database (filtered by year={year})")
+        return {
+            'year': year,
+            'data_json': "[" + ",".join(pieces) + "]",
+            'total_records': total_records,
+            'max_population': max_population,
+            # Summary tables are already filtered to the year
+            'analytics': self.db_manager.get_analytics_data(year)
+        }
+    
+    def apply_map_payload(self, request, payload):
+        """Send a freshly built payload to the map"""
+        if request is not self.map_request:
+            return
+        self.map_request = None
         try:
-            crab_data = self.db_manager.get_all_crab_data()
-            # Filter by year if specified
-            if year is not None:
-                crab_data = [item for item in crab_data if item['date_year'] == year]
-            # Grouping logic: always show all records for each (lat, lon, year)
-            grouped = {}
-            for item in crab_data:
-                key = (item['latitude'], item['longitude'], item['date_year'])
-                if key not in grouped:
-                    grouped[key] = []
-                grouped[key].append(item)
-            all_years_records = [rec for records in grouped.values() for rec in records]
-            print(f"Loaded {len(crab_data)} records from database (filtered by year={year})")
-            print(f"Unique (lat,lon,year) groups: {len(grouped)}")
-            if all_years_records:
-                print("Sample data:", all_years_records[0])
-            data_json = json.dumps(all_years_records)
             js_code = f"""
-            console.log('Adding {len(all_years_records)} markers to map');
-            addCrabMarkers({data_json});
+            console.log('Adding {payload['total_records']} markers to map');
+            addCrabMarkers({payload['data_json']});
             """
             self.web_view.page().runJavaScript(js_code)
-            self.refresh_analytics(all_years_records, year)
+            self.refresh_analytics(payload['analytics'], payload['total_records'],
+                                   payload['max_population'], payload['year'])
         except Exception as e:
             print(f"Error refreshing map data: {e}")
             import traceback
             traceback.print_exc()
     
-    def refresh_analytics(self, crab_data, year=None):
+    def refresh_analytics(self, analytics_data, total_records, max_population, year=None):
         """Refresh analytics data, filtered by year if given"""
         try:
-            analytics_data = self.db_manager.get_analytics_data()
-            # If year is set, filter analytics_data['monthly'] to that year
-            if year is not None:
-                analytics_data['monthly'] = [m for m in analytics_data['monthly'] if m['date_year'] == year]
             total_population = sum(item['total_population'] for item in analytics_data['monthly'])
             total_males = sum(item['total_males'] for item in analytics_data['monthly'])
             total_females = sum(item['total_females'] for item in analytics_data['monthly'])
-            max_population = max(item['population'] for item in crab_data) if crab_data else 0
             analytics_summary = {
                 'total_population': total_population,
                 'total_males': total_males,
                 'total_females': total_females,
                 'male_percentage': round((total_males / total_population * 100) if total_population > 0 else 0, 1),
                 'female_percentage': round((total_females / total_population * 100) if total_population > 0 else 0, 1),
-                'total_records': len(crab_data),
+                'total_records': total_records,
                 'regions': len(analytics_data['regional']),
                 'max_population': max_population,
                 'year': year
@@ -579,10 +598,10 @@ class GISMapWidget(QWidget):
         # Filter controls (top left)
         self.filter_controls = GlassFilterControls(self.web_view)
         
-        # Populate year filter
-        crab_data = self.db_manager.get_all_crab_data()
-        years = sorted(set(item['date_year'] for item in crab_data))
-        self.filter_controls.set_years(years)
+        # Populate year filter once the worker has read the years
+        self.filter_controls.set_years([])
+        request = self.db_worker.submit(self.fetch_years_if_changed, None)
+        request.finished.connect(self.apply_years)
         
         # Analytics cards (bottom left)
         self.analytics_cards = GlassAnalyticsCards(self.web_view)
@@ -742,8 +761,30 @@ class GISMapWidget(QWidget):
 
     def reload_years_and_refresh(self):
         """Reload year filter options and refresh map/analytics after data upload."""
-        crab_data = self.db_manager.get_all_crab_data()
-        years = sorted(set(item['date_year'] for item in crab_data))
+        request = self.db_worker.submit(self.fetch_years_if_changed, self.data_version)
+        request.finished.connect(self.apply_years_and_refresh)
+    
+    def fetch_years_if_changed(self, known_version):
+        """Read the survey years unless the data is still at known_version (database worker thread)"""
+        version = self.db_manager.get_data_version()
+        if version == known_version:
+            return None
+        return version, self.db_manager.get_available_years()
+    
+    def apply_years_and_refresh(self, result):
+        """Update the year filter and redraw the map"""
+        # Skip the reload if no data changed since the map was last built
+        if result is None:
+            return
+        self.apply_years(result)
+        self.refresh_map_data(self.selected_year)
+    
+    def apply_years(self, result):
+        """Fill the year filter with freshly read years, keeping the selection if it still exists"""
+        self.data_version, years = result
+        
+        # Refilling the combo would trigger a map refresh per change; callers refresh once
+        self.filter_controls.year_filter.blockSignals(True)
         self.filter_controls.set_years(years)
         # Try to re-select the current year if it still exists
         if self.selected_year and self.selected_year in years:
@@ -751,4 +792,4 @@ class GISMapWidget(QWidget):
         else:
             self.selected_year = None
             self.filter_controls.year_filter.setCurrentText("All Years")
-        self.refresh_map_data(self.selected_year)
+        self.filter_controls.year_filter.blockSignals(False)
@@ -1,8 +1,8 @@
 import os
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QStackedWidget, QLabel, QFrame)
+                            QStackedWidget, QLabel, QFrame, QShortcut)
 from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QIcon, QFont, QLinearGradient, QColor, QPalette, QBrush
+from PyQt5.QtGui import QIcon, QFont, QLinearGradient, QColor, QPalette, QBrush, QKeySequence
 
 from src.sidebar import Sidebar
 from src.dashboard import DashboardWidget
@@ -12,6 +12,8 @@ from src.datasets import DatasetsWidget
 from src.upload_data import UploadDataWidget
 from src.about import AboutWidget
 from src.utils.notification import NotificationManager
+from src.utils.data_service import DataService
+from src.utils.query_log_dialog import QueryLogDialog
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -158,6 +160,9 @@ class MainWindow(QMainWindow):
         # Initialize notification manager
         self.notification_manager = NotificationManager(self)
         
+        # One data service shared by every page: connections, caches, worker and change notifications
+        self.data_service = DataService(parent=self)
+        
         # Create central widget and main layout
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -184,11 +189,11 @@ class MainWindow(QMainWindow):
         main_layout.setStretchFactor(self.content_stack, 1)
         
         # Create and add all page widgets
-        self.dashboard_widget = DashboardWidget(self)
-        self.gis_widget = GISMapWidget(self)
-        self.analytics_widget = AnalyticsWidget(self)
-        self.datasets_widget = DatasetsWidget(self)
-        self.upload_widget = UploadDataWidget(self)
+        self.dashboard_widget = DashboardWidget(self.data_service, self)
+        self.gis_widget = GISMapWidget(self.data_service, self)
+        self.analytics_widget = AnalyticsWidget(self.data_service, self)
+        self.datasets_widget = DatasetsWidget(self.data_service, self)
+        self.upload_widget = UploadDataWidget(self.data_service, self)
         self.about_widget = AboutWidget(self)
         
         self.content_stack.addWidget(self.dashboard_widget)
@@ -201,10 +206,20 @@ class MainWindow(QMainWindow):
         # Connect sidebar signals
         self.sidebar.page_changed.connect(self.change_page)
         
-        # Connect upload data signal to auto-refresh dashboard, datasets, and map
-        self.upload_widget.data_changed.connect(self.dashboard_widget.refresh_data)
-        self.upload_widget.data_changed.connect(self.datasets_widget.load_data)
-        self.upload_widget.data_changed.connect(self.gis_widget.reload_years_and_refresh)
+        # Refresh the data pages whenever any page changes the data
+        self.data_service.data_changed.connect(self.dashboard_widget.refresh_data)
+        self.data_service.data_changed.connect(self.datasets_widget.refresh_if_changed)
+        self.data_service.data_changed.connect(self.gis_widget.reload_years_and_refresh)
+        self.data_service.data_changed.connect(self.analytics_widget.update_chart)
+        
+        # Background maintenance reports go to the query log dialog
+        self.maintenance_report = None
+        self.query_log_dialog = None
+        self.data_service.maintenance_done.connect(self.on_maintenance_done)
+        
+        # Slow query log for diagnosing database performance
+        self.query_log_shortcut = QShortcut(QKeySequence("Ctrl+Shift+L"), self)
+        self.query_log_shortcut.activated.connect(self.show_query_log)
         
         # Set default page
         self.content_stack.setCurrentIndex(0)
@@ -219,5 +234,24 @@ class MainWindow(QMainWindow):
         self.setPalette(palette)
         super().resizeEvent(event)
         
+    def closeEvent(self, event):
+        """Stop the database worker and close connections before the window goes away"""
+        self.data_service.close()
+        super().closeEvent(event)
+    
+    def show_query_log(self):
+        """Open the slow query log"""
+        self.query_log_dialog = QueryLogDialog(
+            self.data_service.db.query_log, self, maintenance_report=self.maintenance_report
+        )
+        self.query_log_dialog.exec_()
+        self.query_log_dialog = None
+    
+    def on_maintenance_done(self, report):
+        """Keep the latest maintenance report for the query log dialog"""
+        self.maintenance_report = report
+        if self.query_log_dialog is not None:
+            self.query_log_dialog.set_maintenance_report(report)
+    
     def change_page(self, index):
         self.content_stack.setCurrentIndex(index)
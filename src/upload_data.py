@@ -1,16 +1,19 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
                             QFileDialog, QFormLayout, QLineEdit, QTabWidget, 
                             QTableWidget, QTableWidgetItem, QHeaderView, QFrame,
-                            QSplitter, QGroupBox, QSizePolicy, QSpinBox, QComboBox)
-from PyQt5.QtCore import Qt, QMimeData, QUrl, QDate, pyqtSignal
+                            QSplitter, QGroupBox, QSizePolicy, QSpinBox, QComboBox,
+                            QProgressBar)
+from PyQt5.QtCore import Qt, QMimeData, QUrl, QDate
 from PyQt5.QtGui import QIcon, QColor, QPixmap, QFont, QPainter, QPainterPath, QLinearGradient
 
-import pandas as pd
 import os
 from datetime import datetime
 import qtawesome as qta
 
-from src.utils.database import DatabaseManager
+from src.utils.csv_errors_dialog import CsvErrorsDialog
+from src.utils.csv_import import CsvImporter, read_csv_header
+from src.utils.db_worker import PRIORITY_BULK
+from src.utils.merge import DatabaseMerger
 from src.utils.notification import show_notification
 
 class DropArea(QFrame):
@@ -193,11 +196,12 @@ class DropArea(QFrame):
         """)
 
 class UploadDataWidget(QWidget):
-    data_changed = pyqtSignal()
-    def __init__(self, parent=None):
+    def __init__(self, data_service, parent=None):
         super().__init__(parent)
         self.parent = parent
-        self.db_manager = DatabaseManager()
+        self.data_service = data_service
+        self.db_manager = data_service.db
+        self.db_worker = data_service.worker
         
         # Main layout
         layout = QVBoxLayout(self)
@@ -308,6 +312,43 @@ class UploadDataWidget(QWidget):
         self.upload_btn.setVisible(False)
         self.upload_btn.clicked.connect(self.upload_csv_to_db)
         
+        # Runs the whole import and rolls it back, reporting what would change
+        self.dry_run_btn = QPushButton("Dry Run")
+        self.dry_run_btn.setIcon(qta.icon('fa5s.vial', color='white'))
+        self.dry_run_btn.setFixedSize(140, 40)
+        self.dry_run_btn.setStyleSheet(self.upload_btn.styleSheet())
+        self.dry_run_btn.setVisible(False)
+        self.dry_run_btn.clicked.connect(self.dry_run_csv)
+        
+        # What to do with rows that are already in the database
+        self.duplicate_mode_combo = QComboBox()
+        for label, mode in (("Skip duplicates", 'skip'), ("Update counts", 'upsert'), ("Fail import", 'fail')):
+            self.duplicate_mode_combo.addItem(label, mode)
+        self.duplicate_mode_combo.setToolTip(
+            "Rows identical to an existing record or an earlier line can be\n"
+            "skipped or make the whole import fail. Updating counts matches rows\n"
+            "on year, month, observer and location and overwrites the counts"
+        )
+        self.duplicate_mode_combo.setFixedHeight(40)
+        self.duplicate_mode_combo.setStyleSheet("""
+            QComboBox {
+                border: 1px solid rgba(41, 128, 185, 0.5);
+                border-radius: 8px;
+                padding: 5px 10px;
+                background-color: rgba(10, 25, 50, 0.7);
+                color: #e0e0e0;
+            }
+            QComboBox::drop-down {
+                border: 0px;
+            }
+            QComboBox QAbstractItemView {
+                background-color: rgba(15, 32, 65, 0.95);
+                color: #e0e0e0;
+                selection-background-color: rgba(41, 128, 185, 0.8);
+            }
+        """)
+        self.duplicate_mode_combo.setVisible(False)
+        
         csv_layout.addWidget(self.preview_label)
         csv_layout.addWidget(self.preview_table)
         
@@ -316,10 +357,66 @@ class UploadDataWidget(QWidget):
         upload_btn_layout.setContentsMargins(0, 0, 0, 0)
         upload_btn_layout.addStretch()
         upload_btn_layout.addWidget(self.upload_btn)
+        upload_btn_layout.addWidget(self.dry_run_btn)
+        upload_btn_layout.addWidget(self.duplicate_mode_combo)
         upload_btn_layout.addStretch()
         
         csv_layout.addWidget(upload_btn_container)
         
+        # Upload progress, shown while a CSV is streamed into the database
+        self.csv_path = None
+        self.upload_request = None
+        self.upload_progress = QProgressBar()
+        self.upload_progress.setRange(0, 1000)
+        self.upload_progress.setTextVisible(False)
+        self.upload_progress.setFixedHeight(12)
+        self.upload_progress.setStyleSheet("""
+            QProgressBar {
+                background-color: rgba(10, 25, 50, 0.7);
+                border: 1px solid rgba(41, 128, 185, 0.3);
+                border-radius: 6px;
+            }
+            QProgressBar::chunk {
+                background-color: rgba(41, 128, 185, 0.8);
+                border-radius: 6px;
+            }
+        """)
+        self.upload_progress.setVisible(False)
+        csv_layout.addWidget(self.upload_progress)
+        
+        self.upload_status = QLabel()
+        self.upload_status.setAlignment(Qt.AlignCenter)
+        self.upload_status.setStyleSheet("color: #c0c0c0; font-size: 12px;")
+        self.upload_status.setVisible(False)
+        csv_layout.addWidget(self.upload_status)
+        
+        # Validation errors of the last upload
+        self.last_errors = None
+        self.errors_btn = QPushButton("View Errors")
+        self.errors_btn.setIcon(qta.icon('fa5s.exclamation-triangle', color='white'))
+        self.errors_btn.setFixedSize(240, 40)
+        self.errors_btn.setStyleSheet(self.upload_btn.styleSheet())
+        self.errors_btn.setVisible(False)
+        self.errors_btn.clicked.connect(self.show_upload_errors)
+        
+        # Merge whole field-team databases into this one
+        self.merge_request = None
+        self.merge_btn = QPushButton("Merge Field Databases")
+        self.merge_btn.setIcon(qta.icon('fa5s.object-group', color='white'))
+        self.merge_btn.setFixedSize(240, 40)
+        self.merge_btn.setStyleSheet(self.upload_btn.styleSheet())
+        self.merge_btn.clicked.connect(self.merge_databases)
+        
+        merge_btn_container = QWidget()
+        merge_btn_layout = QHBoxLayout(merge_btn_container)
+        merge_btn_layout.setContentsMargins(0, 0, 0, 0)
+        merge_btn_layout.addStretch()
+        merge_btn_layout.addWidget(self.merge_btn)
+        merge_btn_layout.addWidget(self.errors_btn)
+        merge_btn_layout.addStretch()
+        
+        csv_layout.addWidget(merge_btn_container)
+        
         # Manual Entry section
         manual_group = QGroupBox("Manual Entry")
         manual_group.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
@@ -528,172 +625,288 @@ class UploadDataWidget(QWidget):
             self.process_csv(file_path)
     
     def process_csv(self, file_path):
-        """Process the selected CSV file"""
+        """Check the selected CSV's columns and preview its first rows
+        
+        Only the first rows are read here; the whole file is streamed and
+        validated chunk by chunk when it is uploaded.
+        """
         try:
-            # Read CSV file
-            df = pd.read_csv(file_path)
-            # Strip spaces from column names
-            df.columns = df.columns.str.strip()
-            
-            # Check if required columns exist
-            required_columns = [
-                'date_month', 'date_year', 'male_counts', 'female_counts',
-                'population', 'observer_name', 'latitude', 'longitude'
-            ]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                show_notification(
-                    self.parent, 
-                    "Error", 
-                    f"CSV is missing required columns: {', '.join(missing_columns)}"
-                )
-                return
-            
-            # Convert month names to numbers if needed
-            month_map = {
-                'jan': 1, 'january': 1,
-                'feb': 2, 'february': 2,
-                'mar': 3, 'march': 3,
-                'apr': 4, 'april': 4,
-                'may': 5,
-                'jun': 6, 'june': 6,
-                'jul': 7, 'july': 7,
-                'aug': 8, 'august': 8,
-                'sep': 9, 'september': 9,
-                'oct': 10, 'october': 10,
-                'nov': 11, 'november': 11,
-                'dec': 12, 'december': 12
-            }
-            def month_to_num(val):
-                if isinstance(val, str):
-                    val_stripped = val.strip().lower()
-                    return month_map.get(val_stripped, val)
-                return val
-            df['date_month'] = df['date_month'].apply(month_to_num)
-            
-            # Convert numeric columns to appropriate types
-            try:
-                numeric_columns = [
-                    'date_month', 'date_year', 'male_counts', 'female_counts',
-                    'population', 'latitude', 'longitude'
-                ]
-                for col in numeric_columns:
-                    for idx, val in enumerate(df[col], start=2):  # start=2 to account for header row
-                        try:
-                            float(val)
-                        except Exception:
-                            show_notification(
-                                self.parent,
-                                "Error",
-                                f"Invalid value in row {idx}, column '{col}': '{val}'"
-                            )
-                            return
-                    df[col] = pd.to_numeric(df[col])
-            except Exception as e:
-                show_notification(
-                    self.parent,
-                    "Error",
-                    f"Invalid numeric data in CSV. Please check that all numeric fields contain valid numbers.\nDetails: {str(e)}"
-                )
-                return
-            
-            # Validate data
-            validation_errors = []
-            for index, row in df.iterrows():
-                # Check population totals
-                if row['male_counts'] + row['female_counts'] != row['population']:
-                    validation_errors.append(f"Row {index + 1}: Male + Female counts don't equal population")
-            
-                # Check month range
-                if not (1 <= row['date_month'] <= 12):
-                    validation_errors.append(f"Row {index + 1}: Invalid month value")
-            
-            if validation_errors:
-                show_notification(
-                    self.parent, 
-                    "Validation Error", 
-                    "Data validation failed:\n" + "\n".join(validation_errors[:5]) + 
-                    (f"\n... and {len(validation_errors) - 5} more errors" if len(validation_errors) > 5 else "")
-                )
-                return
-            
-            # Display preview
-            self.preview_label.setVisible(True)
-            self.preview_table.setVisible(True)
-            self.upload_btn.setVisible(True)
-            
-            # Set up table
-            self.preview_table.setRowCount(min(5, len(df)))
-            self.preview_table.setColumnCount(len(df.columns))
-            self.preview_table.setHorizontalHeaderLabels(df.columns)
-            
-            # Fill table with data
-            for i in range(min(5, len(df))):
-                for j in range(len(df.columns)):
-                    item = QTableWidgetItem(str(df.iloc[i, j]))
-                    item.setForeground(QColor("#e0e0e0"))
-                    self.preview_table.setItem(i, j, item)
-            
-            # Adjust column widths
-            self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-            
-            # Store the dataframe for later upload
-            self.df = df
-            
+            preview, missing_columns = read_csv_header(file_path)
+        except Exception as e:
             show_notification(
                 self.parent, 
-                "Success", 
-                f"CSV file loaded successfully. {len(df)} records found."
+                "Error", 
+                f"Failed to process CSV: {str(e)}"
             )
-            
-        except Exception as e:
+            return
+        
+        if missing_columns:
             show_notification(
                 self.parent, 
                 "Error", 
-                f"Failed to process CSV: {str(e)}"
+                f"CSV is missing required columns: {', '.join(missing_columns)}"
             )
+            return
+        
+        # Display preview
+        self.preview_label.setVisible(True)
+        self.preview_table.setVisible(True)
+        self.upload_btn.setVisible(True)
+        self.dry_run_btn.setVisible(True)
+        self.duplicate_mode_combo.setVisible(True)
+        
+        # Set up table
+        self.preview_table.setRowCount(len(preview))
+        self.preview_table.setColumnCount(len(preview.columns))
+        self.preview_table.setHorizontalHeaderLabels(preview.columns)
+        
+        # Fill table with data
+        for i in range(len(preview)):
+            for j in range(len(preview.columns)):
+                item = QTableWidgetItem(str(preview.iloc[i, j]))
+                item.setForeground(QColor("#e0e0e0"))
+                self.preview_table.setItem(i, j, item)
+        
+        # Adjust column widths
+        self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        
+        # Remember the file for the upload
+        self.csv_path = file_path
+        
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        show_notification(
+            self.parent, 
+            "Success", 
+            f"CSV file loaded successfully ({size_mb:.1f} MB). Rows are validated during upload."
+        )
     
     def upload_csv_to_db(self):
-        """Upload the CSV data to the database"""
-        try:
-            # Convert dataframe to records
-            records = []
-            for _, row in self.df.iterrows():
-                record = {
-                    'date_month': int(row['date_month']),
-                    'date_year': int(row['date_year']),
-                    'male_counts': int(row['male_counts']),
-                    'female_counts': int(row['female_counts']),
-                    'population': int(row['population']),
-                    'observer_name': str(row['observer_name']),
-                    'latitude': float(row['latitude']),
-                    'longitude': float(row['longitude'])
-                }
-                records.append(record)
-            
-            # Insert data into database
-            self.db_manager.insert_many_crab_data(records)
-            
+        """Import the CSV on the database worker, or cancel a running upload"""
+        if self.upload_request is not None:
+            self.upload_request.cancel()
+            self.upload_btn.setText("Cancelling...")
+            return
+        self._start_import(dry_run=False)
+    
+    def dry_run_csv(self):
+        """Check what importing the CSV would change without saving anything"""
+        if self.upload_request is None:
+            self._start_import(dry_run=True)
+    
+    def _start_import(self, dry_run):
+        self.upload_btn.setText("Cancel Upload")
+        self.dry_run_btn.setEnabled(False)
+        self.duplicate_mode_combo.setEnabled(False)
+        self.upload_progress.setValue(0)
+        self.upload_progress.setVisible(True)
+        self.upload_status.setText("Starting upload...")
+        self.upload_status.setVisible(True)
+        
+        self.upload_request = self.db_worker.submit_job(
+            self._import_csv_job, self.csv_path, dry_run, self.duplicate_mode_combo.currentData(),
+            priority=PRIORITY_BULK
+        )
+        self.upload_request.partial.connect(self._on_upload_progress)
+        self.upload_request.finished.connect(self._on_upload_finished)
+        self.upload_request.failed.connect(self._on_upload_failed)
+        self.upload_request.cancelled.connect(self._on_upload_cancelled)
+    
+    def _import_csv_job(self, request, path, dry_run, mode):
+        """Import the CSV (database worker thread)"""
+        return CsvImporter(self.db_manager).import_file(
+            path, progress=request.report_partial, is_cancelled=request.is_cancelled,
+            dry_run=dry_run, mode=mode
+        )
+    
+    def _on_upload_progress(self, stats):
+        """Show how far the upload is, its speed and the time left"""
+        if stats['total_bytes']:
+            self.upload_progress.setValue(int(stats['bytes_read'] * 1000 / stats['total_bytes']))
+        if stats['stage'] == 'committing':
+            self.upload_status.setText(
+                f"{stats['rows'] - stats['rejected']:,} valid rows - resolving observers "
+                f"and locations and committing..."
+            )
+            return
+        eta = stats['eta_seconds']
+        eta_text = f"{int(eta) // 60}:{int(eta) % 60:02d}" if eta is not None else "--:--"
+        self.upload_status.setText(
+            f"{stats['rows']:,} rows ({stats['rejected']:,} rejected) - "
+            f"{stats['rows_per_second']:,.0f} rows/s - ETA {eta_text}"
+        )
+    
+    def _upload_done(self):
+        self.upload_request = None
+        self.upload_btn.setText("Upload to Database")
+        self.dry_run_btn.setEnabled(True)
+        self.duplicate_mode_combo.setEnabled(True)
+        self.upload_progress.setVisible(False)
+        self.upload_status.setVisible(False)
+    
+    def _on_upload_finished(self, result):
+        """Report the outcome of an upload or dry run"""
+        self._upload_done()
+        
+        if result['aborted']:
+            # Keep the preview so the file can be fixed or uploaded in another mode
+            message = (
+                f"{'Uploading would fail' if result['dry_run'] else 'Upload failed'}: "
+                f"{result['aborted']}. Nothing was saved."
+            )
+        elif result['dry_run']:
+            # Keep the preview so the file can be uploaded next
+            message = (
+                f"Dry run finished in {result['seconds']:.1f}s. Nothing was saved.\n\n"
+                f"Uploading would add {result['inserted']} records, update {result['updated']} "
+                f"and create {result['observers_created']} observers and "
+                f"{result['locations_created']} locations."
+            )
+        else:
             # Clear preview
             self.preview_label.setVisible(False)
             self.preview_table.setVisible(False)
             self.upload_btn.setVisible(False)
+            self.dry_run_btn.setVisible(False)
+            self.duplicate_mode_combo.setVisible(False)
             self.preview_table.setRowCount(0)
             
-            show_notification(
-                self.parent, 
-                "Success", 
-                f"{len(records)} records uploaded to database successfully."
+            message = (
+                f"{result['inserted']} records uploaded to database successfully "
+                f"in {result['seconds']:.1f}s."
             )
-            self.data_changed.emit()
-            
-        except Exception as e:
-            show_notification(
-                self.parent, 
-                "Error", 
-                f"Failed to upload data: {str(e)}"
+            if result['updated']:
+                message += f" {result['updated']} existing records had their counts updated."
+            if result['batch_id']:
+                message += (
+                    f"\nSaved as import batch {result['batch_id']}; it can be rolled back "
+                    f"from Datasets > Import Batches."
+                )
+        errors = result['errors']
+        if result['rejected_count']:
+            details = "\n".join(
+                f"Line {line}: {column} - {error}" if column else f"Line {line}: {error}"
+                for line, column, error in errors[['line', 'column', 'error']].head(5).itertuples(index=False)
             )
+            message += (
+                f"\n\n{result['rejected_count']} rows {'would be' if result['dry_run'] else 'were'} "
+                f"rejected ({result['error_count']} errors, {result['duplicates']} duplicates, "
+                f"{result['existing'] if result['mode'] != 'upsert' else 0} already in the database):\n{details}"
+            )
+            if result['error_count'] > 5:
+                message += f"\n... and {result['error_count'] - 5} more. Use View Errors to see them all."
+        
+        self.last_errors = result if len(errors) else None
+        self.errors_btn.setText(f"View Errors ({result['error_count']:,})")
+        self.errors_btn.setVisible(self.last_errors is not None)
+        
+        show_notification(
+            self.parent, 
+            "Error" if result['aborted'] else "Dry Run" if result['dry_run'] else "Success", 
+            message
+        )
+        if not result['dry_run'] and not result['aborted']:
+            self.data_service.notify_changed()
+    
+    def show_upload_errors(self):
+        """Browse the validation errors of the last upload"""
+        if self.last_errors is None:
+            return
+        dialog = CsvErrorsDialog(self.last_errors['errors'], self.last_errors['error_count'], self)
+        dialog.exec_()
+    
+    def _on_upload_failed(self, error):
+        self._upload_done()
+        show_notification(
+            self.parent, 
+            "Error", 
+            f"Failed to upload data: {error}"
+        )
+    
+    def _on_upload_cancelled(self):
+        self._upload_done()
+        show_notification(
+            self.parent, 
+            "Upload Cancelled", 
+            "Upload cancelled. No records from this file were saved."
+        )
+    
+    def merge_databases(self):
+        """Pick field database files and merge them on the database worker, or cancel a running merge"""
+        if self.merge_request is not None:
+            self.merge_request.cancel()
+            self.merge_btn.setText("Cancelling...")
+            return
+        
+        paths, _ = QFileDialog.getOpenFileNames(
+            self, "Select Field Databases", "", "SQLite Databases (*.db *.sqlite);;All Files (*)"
+        )
+        if not paths:
+            return
+        
+        self.merge_btn.setText("Cancel Merge")
+        self.merge_request = self.db_worker.submit_job(self._merge_job, paths, priority=PRIORITY_BULK)
+        self.merge_request.progress.connect(self._on_merge_progress)
+        self.merge_request.finished.connect(self._on_merge_finished)
+        self.merge_request.failed.connect(self._on_merge_failed)
+        self.merge_request.cancelled.connect(self._on_merge_cancelled)
+    
+    def _merge_job(self, request, paths):
+        """Merge the files (database worker thread)"""
+        return DatabaseMerger(self.db_manager).merge(
+            paths, progress=request.report_progress, is_cancelled=request.is_cancelled
+        )
+    
+    def _on_merge_progress(self, done, total):
+        if self.merge_request is not None and not self.merge_request.is_cancelled():
+            self.merge_btn.setText(f"Cancel Merge ({done * 100 // max(total, 1)}%)")
+    
+    def _merge_done(self):
+        self.merge_request = None
+        self.merge_btn.setText("Merge Field Databases")
+    
+    def _on_merge_finished(self, result):
+        """Summarize a finished merge, listing the first conflicts"""
+        self._merge_done()
+        
+        message = (
+            f"{result['inserted']} records merged from {len(result['files'])} files "
+            f"in {result['seconds']:.1f}s.\n"
+            f"{result['observers_created']} new observers, {result['locations_created']} new locations."
+        )
+        if result['rejected']:
+            message += f"\n{result['rejected']} records were rejected."
+        if result['conflict_count']:
+            details = "\n".join(self._describe_conflict(item) for item in result['conflicts'][:5])
+            message += f"\n\n{result['conflict_count']} conflicts (master values kept):\n{details}"
+            if result['conflict_count'] > 5:
+                message += f"\n... and {result['conflict_count'] - 5} more"
+        for report in result['files']:
+            if report['error']:
+                message += f"\n\n{os.path.basename(report['source'])} failed: {report['error']}"
+        
+        title = "Error" if len(result['failed']) == len(result['files']) else "Success"
+        show_notification(self.parent, title, message)
+        self.data_service.notify_changed()
+    
+    def _describe_conflict(self, item):
+        name = os.path.basename(item['source'])
+        if item['field'] is None:
+            return f"{name}: {item['value']}"
+        return f"{name}: {item['type']} {item['key']} {item['field']} '{item['master']}' vs '{item['value']}'"
+    
+    def _on_merge_failed(self, error):
+        self._merge_done()
+        show_notification(self.parent, "Error", f"Failed to merge databases: {error}")
+        self.data_service.notify_changed()
+    
+    def _on_merge_cancelled(self):
+        # Batches merged before the cancel are kept; merging again resumes
+        self._merge_done()
+        show_notification(
+            self.parent, "Merge Cancelled",
+            "Merge cancelled. Records merged so far were kept; merge the same files again to continue."
+        )
+        self.data_service.notify_changed()
     
     def add_manual_entry(self):
         """Add a manually entered record to the database"""
@@ -750,22 +963,11 @@ class UploadDataWidget(QWidget):
                 'longitude': longitude_val
             }
             
-            record_id = self.db_manager.insert_crab_data(record)
-            
-            # Clear inputs
-            self.male_input.setValue(0)
-            self.female_input.setValue(0)
-            self.observer_input.clear()
-            self.latitude_input.clear()
-            self.longitude_input.clear()
-            self.population_input.clear()
-            
-            show_notification(
-                self.parent, 
-                "Success", 
-                f"Record added to database successfully with ID: {record_id}"
-            )
-            self.data_changed.emit()
+            # Written on the worker; a running import would otherwise freeze the UI on the lock
+            self.add_btn.setEnabled(False)
+            request = self.db_worker.submit(self._insert_manual_entry, record, priority=PRIORITY_BULK)
+            request.finished.connect(self._on_manual_entry_added)
+            request.failed.connect(self._on_manual_entry_failed)
             
         except Exception as e:
             show_notification(
@@ -773,6 +975,33 @@ class UploadDataWidget(QWidget):
                 "Error", 
                 f"Failed to add record: {str(e)}"
             )
+    
+    def _insert_manual_entry(self, record):
+        """Insert the record and return its code (database worker thread)"""
+        record_id = self.db_manager.insert_crab_data(record)
+        return self.db_manager.get_crab_data_by_id(record_id)['code']
+    
+    def _on_manual_entry_added(self, record_code):
+        self.add_btn.setEnabled(True)
+        
+        # Clear inputs
+        self.male_input.setValue(0)
+        self.female_input.setValue(0)
+        self.observer_input.clear()
+        self.latitude_input.clear()
+        self.longitude_input.clear()
+        self.population_input.clear()
+        
+        show_notification(
+            self.parent, 
+            "Success", 
+            f"Record added to database successfully with ID: {record_code}"
+        )
+        self.data_service.notify_changed()
+    
+    def _on_manual_entry_failed(self, error):
+        self.add_btn.setEnabled(True)
+        show_notification(self.parent, "Error", f"Failed to add record: {error}")
 
     def validate_observer_name(self):
         """Validate and format observer name to only contain letters and convert to uppercase"""
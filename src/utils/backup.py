@@ -0,0 +1,187 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from src.utils.db_worker import CancelledError
+
+# Backups older than this are refreshed when auto backup is on
+AUTO_BACKUP_INTERVAL = 24 * 60 * 60
+
+class BackupManager:
+    """Online backups of the SQLite database with rotation and verification"""
+
+    def __init__(self, db_path="data/blue_crab.db", backup_dir=None, keep=7,
+                 compress=True, pages_per_step=1024, step_sleep=0.005):
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(db_path) or '.', 'backups')
+        self.keep = keep
+        self.compress = compress
+        # Pages copied per backup step and the pause between steps
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+
+        name = os.path.splitext(os.path.basename(db_path))[0]
+        self._prefix = f"{name}-"
+
+    def list_backups(self):
+        """Get the paths of existing backups, newest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        paths = [
+            os.path.join(self.backup_dir, entry)
+            for entry in os.listdir(self.backup_dir)
+            if entry.startswith(self._prefix) and entry.endswith(('.db', '.db.gz'))
+        ]
+        # The timestamp in the name sorts chronologically
+        return sorted(paths, reverse=True)
+
+    def last_backup_time(self):
+        """Get the modification time of the newest backup, or None"""
+        backups = self.list_backups()
+        return os.path.getmtime(backups[0]) if backups else None
+
+    def is_backup_due(self, interval=AUTO_BACKUP_INTERVAL):
+        """Whether the newest backup is older than interval seconds"""
+        last = self.last_backup_time()
+        return last is None or time.time() - last >= interval
+
+    def create_backup(self, progress=None, is_cancelled=None):
+        """Copy the database to a new backup file and return its details
+
+        The copy is made with the SQLite online backup API a few pages at a
+        time. A read transaction is held on the source for the whole copy,
+        so in WAL mode writers carry on and the backup is a consistent
+        snapshot that never restarts. progress(done, total) is called after
+        each step; is_cancelled() is checked there and raises CancelledError.
+        The copy is verified with PRAGMA integrity_check before it is kept.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.backup_dir, f"{self._prefix}{stamp}.db")
+        partial = path + '.partial'
+        started = time.perf_counter()
+
+        def on_step(status, remaining, total):
+            if is_cancelled and is_cancelled():
+                raise CancelledError()
+            if progress:
+                progress(total - remaining, total)
+            if self.step_sleep:
+                time.sleep(self.step_sleep)
+
+        source = sqlite3.connect(self.db_path, isolation_level=None)
+        target = sqlite3.connect(partial)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(target, pages=self.pages_per_step, progress=on_step)
+            source.execute("COMMIT")
+
+            # A standalone backup file shouldn't depend on a -wal file
+            target.execute("PRAGMA journal_mode = DELETE")
+            pages = target.execute("PRAGMA page_count").fetchone()[0]
+        except BaseException:
+            target.close()
+            source.close()
+            self._remove(partial)
+            raise
+        target.close()
+        source.close()
+
+        if not self.verify(partial):
+            self._remove(partial)
+            raise RuntimeError("Backup failed integrity check")
+
+        if self.compress:
+            path += '.gz'
+            with open(partial, 'rb') as raw, gzip.open(path + '.partial', 'wb', compresslevel=6) as packed:
+                shutil.copyfileobj(raw, packed, 1024 * 1024)
+            self._remove(partial)
+            partial = path + '.partial'
+        os.replace(partial, path)
+
+        removed = self.rotate()
+        seconds = time.perf_counter() - started
+        print(f"Backed up {pages} pages to {path} in {seconds:.1f}s")
+        return {
+            'path': path,
+            'size': os.path.getsize(path),
+            'pages': pages,
+            'seconds': seconds,
+            'removed': removed
+        }
+
+    def verify(self, path):
+        """Run PRAGMA integrity_check on a backup, decompressing it if needed"""
+        check_path = path[:-3] + '.verify' if path.endswith('.gz') else path
+        try:
+            if check_path != path:
+                with gzip.open(path, 'rb') as packed, open(check_path, 'wb') as raw:
+                    shutil.copyfileobj(packed, raw, 1024 * 1024)
+            conn = sqlite3.connect(f"file:{check_path}?mode=ro", uri=True)
+            try:
+                result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                conn.close()
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            print(f"Backup {path} could not be checked: {e}")
+            return False
+        finally:
+            if check_path != path:
+                self._remove(check_path)
+
+        if result != 'ok':
+            print(f"Backup {path} failed integrity check: {result}")
+        return result == 'ok'
+
+    def rotate(self):
+        """Delete all but the newest keep backups and return the removed paths"""
+        removed = self.list_backups()[self.keep:]
+        for path in removed:
+            self._remove(path)
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class BackupThread(QThread):
+    """Run one BackupManager.create_backup on its own thread
+
+    Backups don't go through the database worker, so a long copy never
+    holds up page queries or imports queued there.
+    """
+    progress = pyqtSignal(int, int)  # pages done, total
+    succeeded = pyqtSignal(object)   # create_backup result
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self._cancel = False
+
+    def cancel(self):
+        """Stop the backup at its next step"""
+        self._cancel = True
+
+    def run(self):
+        try:
+            result = self.manager.create_backup(
+                progress=self.progress.emit,
+                is_cancelled=lambda: self._cancel
+            )
+        except CancelledError:
+            self.cancelled.emit()
+        except Exception as e:
+            print(f"Backup failed: {e}")
+            self.failed.emit(str(e))
+        else:
+            self.succeeded.emit(result)
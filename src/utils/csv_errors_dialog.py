@@ -0,0 +1,159 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                            QTableView, QHeaderView, QComboBox, QFileDialog, QAbstractItemView)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from src.utils.csv_validation import ERROR_COLUMNS
+from src.utils.notification import show_notification
+
+class ErrorTableModel(QAbstractTableModel):
+    """Read-only model over an error table DataFrame
+
+    Cells are read on demand, so tables with hundreds of thousands of rows
+    open instantly.
+    """
+    HEADERS = {'line': "Line", 'column': "Column", 'value': "Value", 'error': "Error"}
+
+    def __init__(self, errors, parent=None):
+        super().__init__(parent)
+        self.errors = errors
+
+    def set_errors(self, errors):
+        self.beginResetModel()
+        self.errors = errors
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.errors)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(ERROR_COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self.errors.iat[index.row(), index.column()])
+        if role == Qt.TextAlignmentRole and index.column() == 0:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[ERROR_COLUMNS[section]]
+        return None
+
+class CsvErrorsDialog(QDialog):
+    """Browse and export the validation errors of a CSV upload"""
+
+    def __init__(self, errors, error_count=None, parent=None):
+        super().__init__(parent)
+        self.errors = errors[list(ERROR_COLUMNS)]
+        self.error_count = len(errors) if error_count is None else error_count
+        self.setWindowTitle("CSV Validation Errors")
+        self.resize(900, 600)
+
+        self.setStyleSheet("""
+            QDialog {
+                background-color: rgba(15, 32, 65, 0.95);
+                color: #e0e0e0;
+            }
+            QLabel {
+                color: #e0e0e0;
+            }
+            QComboBox, QTableView {
+                background-color: rgba(10, 25, 50, 0.7);
+                border: 1px solid rgba(41, 128, 185, 0.5);
+                border-radius: 8px;
+                padding: 4px;
+                color: #e0e0e0;
+            }
+            QHeaderView::section {
+                background-color: rgba(41, 128, 185, 0.7);
+                color: white;
+                border: none;
+                padding: 5px;
+                font-weight: bold;
+            }
+            QPushButton {
+                background-color: rgba(41, 128, 185, 0.8);
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 8px 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: rgba(52, 152, 219, 0.9);
+            }
+        """)
+
+        layout = QVBoxLayout(self)
+
+        # Filters and export
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Column:"))
+        self.column_combo = QComboBox()
+        self.column_combo.addItem("All")
+        self.column_combo.addItems(sorted(str(value) for value in self.errors['column'].unique() if value))
+        self.column_combo.currentIndexChanged.connect(self.apply_filter)
+        controls.addWidget(self.column_combo)
+
+        controls.addWidget(QLabel("Error:"))
+        self.error_combo = QComboBox()
+        self.error_combo.addItem("All")
+        self.error_combo.addItems(sorted(str(value) for value in self.errors['error'].unique()))
+        self.error_combo.currentIndexChanged.connect(self.apply_filter)
+        controls.addWidget(self.error_combo)
+        controls.addStretch()
+
+        export_btn = QPushButton("Export CSV")
+        export_btn.clicked.connect(self.export)
+        controls.addWidget(export_btn)
+        layout.addLayout(controls)
+
+        self.model = ErrorTableModel(self.errors, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        for column in range(3):
+            header.setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(3, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.apply_filter()
+
+    def filtered(self):
+        """The errors matching the column and error filters"""
+        errors = self.errors
+        if self.column_combo.currentIndex() > 0:
+            errors = errors[errors['column'] == self.column_combo.currentText()]
+        if self.error_combo.currentIndex() > 0:
+            errors = errors[errors['error'] == self.error_combo.currentText()]
+        return errors
+
+    def apply_filter(self):
+        errors = self.filtered()
+        self.model.set_errors(errors)
+        text = f"{len(errors):,} of {len(self.errors):,} errors on {errors['line'].nunique():,} lines"
+        if self.error_count > len(self.errors):
+            text += f" (first {len(self.errors):,} of {self.error_count:,} kept)"
+        self.summary_label.setText(text)
+
+    def export(self):
+        """Save the errors matching the filters as CSV"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Errors", "csv_errors.csv", "CSV Files (*.csv)"
+        )
+        if not file_path:
+            return
+        try:
+            self.filtered().to_csv(file_path, index=False)
+            show_notification(self, "Success", f"Errors exported to {file_path}")
+        except OSError as e:
+            show_notification(self, "Error", f"Failed to export errors: {str(e)}")
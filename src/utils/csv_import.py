@@ -0,0 +1,542 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils.csv_validation import (CSV_INTEGER_COLUMNS, CSV_REQUIRED_COLUMNS, CSV_TEXT_COLUMNS,
+                                      ERROR_COLUMNS, empty_errors, validate_frame)
+from src.utils.database import content_hash_sql, normalize_observer_name
+from src.utils.db_worker import CancelledError
+
+# Rows read, validated and staged at a time
+CSV_CHUNK_SIZE = 20000
+
+# Error table rows kept from one import; the rest are only counted
+MAX_REPORTED_ERRORS = 500000
+
+# What to do with rows already in the database or repeating an earlier line:
+# keep the existing record, update its counts, or reject the whole import.
+# 'skip' and 'fail' compare the whole natural key (year, month, observer,
+# location and counts); 'upsert' leaves out the counts to find the record
+DUPLICATE_MODES = ('skip', 'upsert', 'fail')
+
+# Bytes read at a time when hashing a file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Columns of the staging table, in insert order after the line number
+STAGING_COLUMNS = (
+    'date_month', 'date_year', 'male_counts', 'female_counts', 'population',
+    'observer_name', 'name_key', 'observer_email', 'observer_organization',
+    'latitude', 'longitude', 'location_name', 'region'
+)
+
+class _RollBack(Exception):
+    """Raised to roll back the promote of a dry run or a failed import"""
+
+def _read_options(path):
+    """read_csv options that keep the text columns as text
+
+    Column names may carry spaces, so the raw header is read first.
+    """
+    header = pd.read_csv(path, nrows=0, skipinitialspace=True).columns
+    return {
+        'skipinitialspace': True,
+        'dtype': {name: str for name in header if str(name).strip() in CSV_TEXT_COLUMNS}
+    }
+
+def read_csv_header(path, preview_rows=5):
+    """Read the column names and first rows of a CSV without loading the rest
+
+    Returns (preview DataFrame, missing required columns).
+    """
+    preview = pd.read_csv(path, nrows=preview_rows, dtype=str, skipinitialspace=True)
+    preview.columns = preview.columns.str.strip()
+    missing = [column for column in CSV_REQUIRED_COLUMNS if column not in preview.columns]
+    return preview, missing
+
+def file_hash(path):
+    """SHA-256 of a file's contents, as hex"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _staging_rows(values, valid, first_line):
+    """Tuples for the staging table from the valid rows of validate_frame"""
+    count = int(valid.sum())
+    lines = (np.flatnonzero(valid) + first_line).tolist()
+
+    # Observer names repeat, so each distinct spelling is cleaned and keyed once
+    codes, uniques = pd.factorize(np.asarray(values['observer_name'])[valid])
+    names = [' '.join(name.split()) for name in uniques]
+    observers = {
+        'observer_name': np.array(names, dtype=object)[codes].tolist(),
+        'name_key': np.array([normalize_observer_name(name) for name in names], dtype=object)[codes].tolist()
+    }
+
+    columns = []
+    for column in STAGING_COLUMNS:
+        if column in observers:
+            columns.append(observers[column])
+        elif column in values:
+            data = np.asarray(values[column])[valid]
+            columns.append(data.astype('int64').tolist() if column in CSV_INTEGER_COLUMNS else data.tolist())
+        else:
+            columns.append([''] * count)
+    return list(zip(lines, *columns))
+
+class CsvImporter:
+    """Import a crab data CSV through a staging table
+
+    The file is streamed chunk by chunk, validated and bulk-loaded into a
+    scratch database attached next to the main one, so only one chunk is
+    in memory and nothing in the main database is written while the file
+    is read. Observers and locations are then resolved with set-based SQL,
+    rows already in the database are found through the content hash index
+    and the rest are promoted into crab_data with INSERT ... SELECT in a
+    single transaction: an import either adds every valid row or nothing.
+    Each import is recorded in import_batches, its records carry the
+    batch_id and the counts it overwrites are kept in import_batch_updates,
+    so DatabaseManager.rollback_import_batch can undo it later.
+    It must run outside a transaction, on the thread that owns the
+    connection (normally the database worker).
+    """
+
+    def __init__(self, db_manager, chunk_size=CSV_CHUNK_SIZE):
+        self.db = db_manager
+        self.chunk_size = chunk_size
+
+    def import_file(self, path, progress=None, is_cancelled=None, dry_run=False, mode='skip'):
+        """Import every valid row of the CSV at path and return a report
+
+        progress(stats) is called after each chunk with the rows read and
+        rejected so far, bytes read, rows per second and the estimated
+        seconds left, and once more with stage 'committing' before the
+        promote. is_cancelled() is checked before each chunk and before the
+        promote and raises CancelledError, leaving the database unchanged.
+
+        mode (one of DUPLICATE_MODES) decides what happens to rows with the
+        natural key of an existing record or of an earlier line. 'skip'
+        keeps the existing record and the first line. 'fail' saves nothing
+        and sets 'aborted' in the report. 'upsert' matches on year, month,
+        observer and location only and writes the counts of the last line
+        with that key to the existing record.
+
+        The report counts the rows read, inserted, updated and rejected, the
+        repeated lines ('duplicates'), the rows matching existing records
+        ('existing') and the observers and locations created, and gives the
+        import's batch_id (None when nothing was inserted or updated, or on
+        a dry run).
+        'errors' is the table of every validation error and duplicate row
+        (see csv_validation.ERROR_COLUMNS) up to MAX_REPORTED_ERRORS. With
+        dry_run the whole import runs and is rolled back, so the report says
+        exactly what an import would change.
+        """
+        if mode not in DUPLICATE_MODES:
+            raise ValueError(f"Unknown duplicate mode {mode!r}; use one of {', '.join(DUPLICATE_MODES)}")
+        if self.db.connection_manager.in_transaction():
+            raise RuntimeError("CSV files can't be imported inside a transaction")
+
+        started = time.perf_counter()
+        report = {
+            'path': path,
+            'file_hash': file_hash(path),
+            'batch_id': None,
+            'dry_run': dry_run,
+            'mode': mode,
+            'aborted': None,
+            'rows': 0,
+            'inserted': 0,
+            'updated': 0,
+            'rejected_count': 0,
+            'error_count': 0,
+            'duplicates': 0,
+            'existing': 0,
+            'observers_created': 0,
+            'locations_created': 0,
+            'seconds': 0.0
+        }
+
+        staging_path = f"{self.db.db_path}-staging"
+        self._remove(staging_path)
+        conn = self.db.get_connection()
+        # ATTACH isn't allowed inside a transaction, so it brackets the import
+        conn.execute("ATTACH DATABASE ? AS import_staging", (staging_path,))
+        try:
+            # Scratch data: no journal, no syncs; the file is deleted afterwards
+            conn.execute("PRAGMA import_staging.journal_mode = OFF")
+            conn.execute("PRAGMA import_staging.synchronous = OFF")
+            self._create_staging(conn)
+            errors = self._stage_file(conn, path, report, progress, is_cancelled, started)
+
+            if is_cancelled and is_cancelled():
+                raise CancelledError()
+            if progress:
+                progress(dict(self._stats(report, started), stage='committing'))
+
+            try:
+                with self.db.transaction() as conn:
+                    cursor = conn.cursor()
+                    self._promote(cursor, report)
+                    errors.append(self._duplicate_errors(cursor, mode))
+                    if dry_run or report['aborted']:
+                        raise _RollBack()
+            except _RollBack:
+                report['batch_id'] = None
+                if report['aborted']:
+                    report['observers_created'] = report['locations_created'] = 0
+        finally:
+            conn.execute("DETACH DATABASE import_staging")
+            self._remove(staging_path)
+
+        errors = pd.concat(errors, ignore_index=True) if errors else empty_errors()
+        report['errors'] = errors.sort_values('line', kind='stable', ignore_index=True).iloc[:MAX_REPORTED_ERRORS]
+        # Updated rows aren't errors; skipped and repeated ones are
+        listed = report['duplicates'] + (report['existing'] if mode != 'upsert' else 0)
+        report['rejected_count'] += listed
+        report['error_count'] += listed
+        report['seconds'] = time.perf_counter() - started
+        if report['aborted']:
+            print(f"Import of {path} failed: {report['aborted']}")
+        print(f"{'Dry run of' if dry_run else 'Imported'} {path}: {report['inserted']} of "
+              f"{report['rows']} rows in {report['seconds']:.1f}s ({report['updated']} updated, "
+              f"{report['existing']} existing, {report['duplicates']} duplicates, "
+              f"{report['observers_created']} new observers, {report['locations_created']} new locations)")
+        return report
+
+    def _remove(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _create_staging(self, conn):
+        conn.execute('''
+        CREATE TABLE import_staging.rows (
+            line INTEGER PRIMARY KEY,
+            date_month INTEGER NOT NULL,
+            date_year INTEGER NOT NULL,
+            male_counts INTEGER NOT NULL,
+            female_counts INTEGER NOT NULL,
+            population INTEGER NOT NULL,
+            observer_name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            observer_email TEXT,
+            observer_organization TEXT,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            location_name TEXT,
+            region TEXT
+        )
+        ''')
+        # Distinct observer names and points, each with the first line that uses it
+        conn.execute('''
+        CREATE TABLE import_staging.observer_map (
+            name_key TEXT PRIMARY KEY,
+            first_line INTEGER NOT NULL,
+            observer_id INTEGER
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE import_staging.point_map (
+            point INTEGER PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            first_line INTEGER NOT NULL,
+            location_id INTEGER
+        )
+        ''')
+        # Resolved rows with their key hash, lines repeating a key and the
+        # existing records rows match
+        conn.execute('''
+        CREATE TABLE import_staging.keyed (
+            line INTEGER PRIMARY KEY,
+            content_hash INTEGER NOT NULL,
+            date_month INTEGER NOT NULL,
+            date_year INTEGER NOT NULL,
+            male_counts INTEGER NOT NULL,
+            female_counts INTEGER NOT NULL,
+            population INTEGER NOT NULL,
+            observer_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE import_staging.duplicates (
+            line INTEGER PRIMARY KEY,
+            kept_line INTEGER NOT NULL
+        )
+        ''')
+        conn.execute('''
+        CREATE TABLE import_staging.matches (
+            line INTEGER PRIMARY KEY,
+            crab_id INTEGER NOT NULL
+        )
+        ''')
+
+    def _stage_file(self, conn, path, report, progress, is_cancelled, started):
+        """Validate the file into the staging table; returns the validation error tables"""
+        total_bytes = os.path.getsize(path)
+        options = _read_options(path)
+        placeholders = ', '.join('?' * (len(STAGING_COLUMNS) + 1))
+        errors = []
+        kept = 0
+
+        # Read from a binary handle so tell() gives the bytes consumed
+        with open(path, 'rb') as handle:
+            for chunk in pd.read_csv(handle, chunksize=self.chunk_size, **options):
+                if is_cancelled and is_cancelled():
+                    raise CancelledError()
+
+                first_line = report['rows'] + 2
+                values, valid, chunk_errors = validate_frame(chunk, first_line)
+                if valid.any():
+                    # One short transaction per chunk; only the staging file is written
+                    with self.db.transaction() as conn:
+                        conn.executemany(
+                            f"INSERT INTO import_staging.rows (line, {', '.join(STAGING_COLUMNS)}) "
+                            f"VALUES ({placeholders})",
+                            _staging_rows(values, valid, first_line)
+                        )
+
+                if kept < MAX_REPORTED_ERRORS and len(chunk_errors):
+                    errors.append(chunk_errors.iloc[:MAX_REPORTED_ERRORS - kept])
+                    kept += len(errors[-1])
+                report['rows'] += len(chunk)
+                report['rejected_count'] += len(chunk) - int(valid.sum())
+                report['error_count'] += len(chunk_errors)
+
+                if progress:
+                    progress(self._stats(report, started, handle.tell(), total_bytes))
+        return errors
+
+    def _promote(self, cursor, report):
+        """Resolve the staged rows and write them to crab_data (inside the caller's transaction)"""
+        self._map_observers(cursor, report)
+        self._map_locations(cursor, report)
+        self._key_rows(cursor)
+        self._find_duplicates(cursor, report)
+
+        if report['mode'] == 'fail' and (report['duplicates'] or report['existing']):
+            report['aborted'] = (
+                f"{report['existing']} rows match records already in the database and "
+                f"{report['duplicates']} repeat an earlier line"
+            )
+            return
+
+        cursor.execute('''
+        INSERT INTO main.import_batches (file_name, file_hash) VALUES (?, ?)
+        ''', (os.path.basename(report['path']), report['file_hash']))
+        batch_id = cursor.lastrowid
+
+        if report['mode'] == 'upsert' and report['existing']:
+            # Only records whose counts change are written (and logged); their
+            # current counts are kept first so a rollback can restore them
+            cursor.execute('''
+            INSERT INTO main.import_batch_updates (batch_id, crab_id, male_counts, female_counts, population)
+            SELECT ?, cd.id, cd.male_counts, cd.female_counts, cd.population
+            FROM import_staging.matches m
+            JOIN import_staging.keyed k ON k.line = m.line
+            JOIN main.crab_data cd ON cd.id = m.crab_id
+            WHERE cd.male_counts != k.male_counts OR cd.female_counts != k.female_counts
+            ''', (batch_id,))
+            cursor.execute('''
+            UPDATE main.crab_data
+            SET male_counts = k.male_counts, female_counts = k.female_counts, population = k.population
+            FROM import_staging.matches m
+            JOIN import_staging.keyed k ON k.line = m.line
+            WHERE crab_data.id = m.crab_id
+              AND (crab_data.male_counts != k.male_counts OR crab_data.female_counts != k.female_counts)
+            ''')
+            report['updated'] = cursor.rowcount
+
+        _, report['inserted'] = self.db.insert_from_select(cursor, 'crab_data', (
+            'date_month', 'date_year', 'male_counts', 'female_counts',
+            'population', 'observer_id', 'location_id', 'batch_id'
+        ), '''
+        SELECT k.line AS sort_key, k.date_month, k.date_year, k.male_counts, k.female_counts,
+               k.population, k.observer_id, k.location_id, :batch_id AS batch_id
+        FROM import_staging.keyed k
+        WHERE k.line NOT IN (SELECT line FROM import_staging.duplicates)
+          AND k.line NOT IN (SELECT line FROM import_staging.matches)
+        ''', {'batch_id': batch_id})
+        if not report['inserted'] and not report['updated']:
+            # Nothing to roll back later, so the import isn't listed
+            cursor.execute('DELETE FROM main.import_batches WHERE id = ?', (batch_id,))
+            return
+        cursor.execute(
+            'UPDATE main.import_batches SET row_count = ?, updated_count = ? WHERE id = ?',
+            (report['inserted'], report['updated'], batch_id)
+        )
+        report['batch_id'] = batch_id
+
+    def _key_rows(self, cursor):
+        """Fill import_staging.keyed with the resolved rows and their content hash"""
+        # The same expression as crab_data.content_hash, over the whole file in one pass
+        content_hash = content_hash_sql(
+            's.date_year', 's.date_month', 'om.observer_id', 'pm.location_id', 's.male_counts', 's.female_counts'
+        )
+        cursor.execute(f'''
+        INSERT INTO import_staging.keyed (
+            line, content_hash, date_month, date_year, male_counts, female_counts,
+            population, observer_id, location_id
+        )
+        SELECT s.line, {content_hash}, s.date_month, s.date_year, s.male_counts,
+               s.female_counts, s.population, om.observer_id, pm.location_id
+        FROM import_staging.rows s
+        JOIN import_staging.observer_map om ON om.name_key = s.name_key
+        JOIN import_staging.point_map pm ON pm.latitude = s.latitude AND pm.longitude = s.longitude
+        ''')
+
+    def _find_duplicates(self, cursor, report):
+        """Record lines repeating a natural key and lines matching existing records"""
+        key = 'date_year, date_month, observer_id, location_id'
+        if report['mode'] == 'upsert':
+            # Upserts leave out the counts and let later lines win
+            kept = 'MAX'
+            lookup = '''
+                SELECT MIN(cd.id) FROM main.crab_data cd INDEXED BY idx_crab_data_natural_key
+                WHERE cd.location_id = k.location_id
+                  AND cd.date_year = k.date_year AND cd.date_month = k.date_month
+                  AND cd.observer_id = k.observer_id
+            '''
+        else:
+            key += ', male_counts, female_counts'
+            kept = 'MIN'
+            # One probe of the hash index per row; comparing the key columns
+            # rules out hash collisions
+            lookup = '''
+                SELECT MIN(cd.id) FROM main.crab_data cd INDEXED BY idx_crab_data_content_hash
+                WHERE cd.content_hash = k.content_hash
+                  AND cd.date_year = k.date_year AND cd.date_month = k.date_month
+                  AND cd.observer_id = k.observer_id AND cd.location_id = k.location_id
+                  AND cd.male_counts = k.male_counts AND cd.female_counts = k.female_counts
+            '''
+
+        cursor.execute(f'''
+        INSERT INTO import_staging.duplicates (line, kept_line)
+        SELECT line, kept_line FROM (
+            SELECT line, {kept}(line) OVER (PARTITION BY {key}) AS kept_line
+            FROM import_staging.keyed
+        )
+        WHERE line != kept_line
+        ''')
+        report['duplicates'] = cursor.rowcount
+
+        # The earliest record wins if the database holds the key more than once
+        cursor.execute(f'''
+        INSERT INTO import_staging.matches (line, crab_id)
+        SELECT line, crab_id FROM (
+            SELECT k.line, ({lookup}) AS crab_id
+            FROM import_staging.keyed k
+            WHERE k.line NOT IN (SELECT line FROM import_staging.duplicates)
+        )
+        WHERE crab_id IS NOT NULL
+        ''')
+        report['existing'] = cursor.rowcount
+
+    def _map_observers(self, cursor, report):
+        """Match staged names to observers by name key, creating the missing ones"""
+        cursor.execute('''
+        INSERT INTO import_staging.observer_map (name_key, first_line)
+        SELECT name_key, MIN(line) FROM import_staging.rows GROUP BY name_key
+        ''')
+        match = '''
+        UPDATE import_staging.observer_map SET observer_id = (
+            SELECT o.id FROM main.observers o WHERE o.name_key = observer_map.name_key
+        )
+        WHERE observer_id IS NULL
+        '''
+        cursor.execute(match)
+
+        # New observers take their details from the first line naming them
+        _, report['observers_created'] = self.db.insert_from_select(
+            cursor, 'observers', ('name', 'name_key', 'email', 'organization'), '''
+            SELECT om.first_line AS sort_key, s.observer_name AS name, om.name_key,
+                   s.observer_email AS email, s.observer_organization AS organization
+            FROM import_staging.observer_map om
+            JOIN import_staging.rows s ON s.line = om.first_line
+            WHERE om.observer_id IS NULL
+            '''
+        )
+        if report['observers_created']:
+            cursor.execute(match)
+
+    def _map_locations(self, cursor, report):
+        """Match staged points to sites within LOCATION_TOLERANCE, creating the missing ones"""
+        cursor.execute('''
+        INSERT INTO import_staging.point_map (latitude, longitude, first_line)
+        SELECT latitude, longitude, MIN(line) FROM import_staging.rows
+        GROUP BY latitude, longitude
+        ORDER BY MIN(line)
+        ''')
+        cursor.execute('''
+        CREATE UNIQUE INDEX import_staging.idx_point_map_coordinates
+        ON point_map (latitude, longitude)
+        ''')
+
+        # Matching is order dependent (the first point claims a new site), so
+        # the distinct points go through the batch resolver in line order
+        cursor.execute('''
+        SELECT pm.point, pm.latitude, pm.longitude, s.location_name, s.region
+        FROM import_staging.point_map pm
+        JOIN import_staging.rows s ON s.line = pm.first_line
+        ORDER BY pm.point
+        ''')
+        points = cursor.fetchall()
+        if not points:
+            return
+
+        before = self.db.last_id(cursor, 'locations')
+        location_ids = self.db.resolve_locations(cursor, [
+            {
+                'latitude': row['latitude'],
+                'longitude': row['longitude'],
+                'location_name': row['location_name'] or '',
+                'region': row['region'] or ''
+            }
+            for row in points
+        ])
+        report['locations_created'] = self.db.last_id(cursor, 'locations') - before
+        cursor.executemany(
+            'UPDATE import_staging.point_map SET location_id = ? WHERE point = ?',
+            [(location_id, row['point']) for row, location_id in zip(points, location_ids)]
+        )
+
+    def _duplicate_errors(self, cursor, mode):
+        """Error table rows for the repeated lines and existing records found by _promote"""
+        repeated = 'Replaced by line ' if mode == 'upsert' else 'Duplicate of line '
+        cursor.execute('''
+        SELECT line, :repeated || kept_line AS error FROM import_staging.duplicates
+        UNION ALL
+        SELECT m.line, 'Already in database as ' || cd.code
+        FROM import_staging.matches m
+        JOIN main.crab_data cd ON cd.id = m.crab_id
+        WHERE :mode != 'upsert'
+        ORDER BY line
+        LIMIT :limit
+        ''', {'repeated': repeated, 'mode': mode, 'limit': MAX_REPORTED_ERRORS})
+        rows = cursor.fetchall()
+        return pd.DataFrame({
+            'line': np.array([row['line'] for row in rows], dtype='int64'),
+            'column': '',
+            'value': '',
+            'error': [row['error'] for row in rows]
+        }, columns=ERROR_COLUMNS)
+
+    def _stats(self, report, started, bytes_read=None, total_bytes=None):
+        elapsed = time.perf_counter() - started
+        if bytes_read is None:
+            bytes_read = total_bytes = os.path.getsize(report['path'])
+        bytes_read = min(bytes_read, total_bytes)
+        eta = elapsed * (total_bytes - bytes_read) / bytes_read if bytes_read else None
+        return {
+            'stage': 'reading',
+            'rows': report['rows'],
+            'rejected': report['rejected_count'],
+            'bytes_read': bytes_read,
+            'total_bytes': total_bytes,
+            'rows_per_second': report['rows'] / elapsed if elapsed else 0.0,
+            'eta_seconds': eta
+        }
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.database import MONTH_MAP
+
+# Columns every crab data CSV must have
+CSV_REQUIRED_COLUMNS = (
+    'date_month', 'date_year', 'male_counts', 'female_counts',
+    'population', 'observer_name', 'latitude', 'longitude'
+)
+
+# Columns passed through to the records when the CSV has them
+CSV_OPTIONAL_COLUMNS = ('observer_email', 'observer_organization', 'location_name', 'region')
+
+# Columns read as text; everything else is parsed as numbers
+CSV_TEXT_COLUMNS = ('observer_name',) + CSV_OPTIONAL_COLUMNS
+
+CSV_NUMERIC_COLUMNS = (
+    'date_month', 'date_year', 'male_counts', 'female_counts',
+    'population', 'latitude', 'longitude'
+)
+CSV_INTEGER_COLUMNS = ('date_month', 'date_year', 'male_counts', 'female_counts', 'population')
+
+# (column, lowest, highest, message); the rules mirror the crab_data CHECK
+# constraints and DatabaseManager._normalize_crab_record
+CSV_RANGE_RULES = (
+    ('date_month', 1, 12, "Month must be between 1 and 12"),
+    ('date_year', 1900, 2100, "Year must be between 1900 and 2100"),
+    ('male_counts', 0, None, "Counts cannot be negative"),
+    ('female_counts', 0, None, "Counts cannot be negative"),
+    ('population', 1, None, "Population must be greater than 0"),
+    ('latitude', -90, 90, "Latitude must be between -90 and 90"),
+    ('longitude', -180, 180, "Longitude must be between -180 and 180"),
+)
+
+# Columns of the error table: CSV line number (the header is line 1),
+# column name, the cell as written and what is wrong with it
+ERROR_COLUMNS = ('line', 'column', 'value', 'error')
+
+def empty_errors():
+    """An error table with no rows"""
+    return pd.DataFrame({column: pd.Series(dtype=object) for column in ERROR_COLUMNS})
+
+def _blank(values):
+    """Mask of missing or empty cells
+
+    Files are read with skipinitialspace, so whitespace-only cells already
+    arrive as missing and no per-cell string stripping is needed.
+    """
+    if pd.api.types.is_integer_dtype(values):
+        return np.zeros(len(values), dtype=bool)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.isna().to_numpy()
+    return values.to_numpy(dtype=object, na_value='') == ''
+
+def _parse_numbers(column, values, blank):
+    """Parse a column to a float64 array, mapping month names for date_month"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype='float64')
+    try:
+        # A text column is usually one stray cell away from numeric; the
+        # plain cast is several times faster than coercing every cell
+        return values.where(~blank, None).to_numpy(dtype='float64')
+    except (TypeError, ValueError):
+        pass
+
+    # Parse each distinct text once; months, years and counts repeat a lot
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype='float64')
+    if column == 'date_month':
+        # Same rule as _normalize_crab_record: the first three letters name the month
+        names = pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower().str[:3].map(MONTH_MAP)
+        parsed = np.where(np.isnan(parsed), names.to_numpy(dtype='float64'), parsed)
+    # Missing cells have code -1 and stay NaN
+    return np.append(parsed, np.nan)[codes]
+
+def validate_frame(frame, first_line=2):
+    """Check every row of a CSV chunk against all rules at once
+
+    frame holds the rows as read (column names may carry spaces); its first
+    row is CSV line first_line. Returns (values, valid, errors): values maps
+    the required and optional columns to their parsed floats and strings,
+    valid is a boolean array of rows with no errors and errors is a table
+    with one row per failed rule per CSV row, in line order.
+    """
+    frame = frame.rename(columns=lambda name: str(name).strip())
+    count = len(frame)
+    bad = np.zeros(count, dtype=bool)
+    found = []
+
+    def fail(mask, column, message):
+        if not mask.any():
+            return
+        bad[mask] = True
+        cells = ''
+        if column in frame.columns:
+            cells = frame[column][mask].astype(object)
+            cells = cells.where(cells.notna(), '').astype(str).to_numpy()
+        found.append(pd.DataFrame({
+            'line': np.flatnonzero(mask) + first_line,
+            'column': column,
+            'value': cells,
+            'error': message
+        }))
+
+    values = {}
+    numbers = {}
+    for column in CSV_REQUIRED_COLUMNS + CSV_OPTIONAL_COLUMNS:
+        if column not in frame.columns:
+            if column in CSV_REQUIRED_COLUMNS:
+                fail(np.ones(count, dtype=bool), column, "Column is missing")
+            continue
+
+        raw = frame[column]
+        blank = _blank(raw)
+        if column in CSV_TEXT_COLUMNS:
+            if column in CSV_REQUIRED_COLUMNS:
+                fail(blank, column, "Value is required")
+            values[column] = raw.where(~blank, '').astype(str) if blank.any() else raw.astype(str)
+            continue
+
+        parsed = _parse_numbers(column, raw, blank)
+        missing = np.isnan(parsed)
+        fail(blank, column, "Value is required")
+        fail(missing & ~blank, column, "Not a number")
+        if column in CSV_INTEGER_COLUMNS and not pd.api.types.is_integer_dtype(raw):
+            # NaN != NaN, so cells already reported don't show up again
+            fail((np.floor(parsed) != parsed) & ~missing, column, "Must be a whole number")
+        numbers[column] = values[column] = parsed
+
+    # NaN compares false, so cells that failed parsing aren't reported twice
+    for column, lowest, highest, message in CSV_RANGE_RULES:
+        if column not in numbers:
+            continue
+        out_of_range = numbers[column] < lowest
+        if highest is not None:
+            out_of_range |= numbers[column] > highest
+        fail(out_of_range, column, message)
+
+    if all(column in numbers for column in ('male_counts', 'female_counts', 'population')):
+        totals = numbers['male_counts'] + numbers['female_counts']
+        population = numbers['population']
+        fail((totals != population) & ~np.isnan(totals) & ~np.isnan(population),
+             'population', "Male + Female counts must equal population")
+
+    errors = pd.concat(found, ignore_index=True) if found else empty_errors()
+    if len(found) > 1:
+        errors = errors.sort_values('line', kind='stable', ignore_index=True)
+    return values, ~bad, errors
@@ -0,0 +1,134 @@
+from PyQt5.QtCore import QObject, QSettings, QTimer, pyqtSignal
+
+from src.utils.backup import BackupManager, BackupThread
+from src.utils.database import DatabaseManager
+from src.utils.db_worker import DbWorker, PRIORITY_BULK, PRIORITY_MAINTENANCE
+from src.utils.maintenance import DatabaseMaintenance, LARGE_WRITE_CHANGES
+
+class DataService(QObject):
+    """Application-wide data access shared by every page
+
+    Owns the one DatabaseManager (and with it the connections and caches),
+    the background worker that runs database calls, and the notification
+    pages listen to when the data changes. The database opens in the
+    background: ready is emitted once the schema is up to date, and pages
+    may submit reads before that, which wait until then.
+    """
+    data_changed = pyqtSignal()
+    maintenance_done = pyqtSignal(object)  # DatabaseMaintenance.run report
+    ready = pyqtSignal()
+    open_failed = pyqtSignal(str)  # Error message
+
+    def __init__(self, db_path="data/blue_crab.db", parent=None):
+        super().__init__(parent)
+        self.db = DatabaseManager(db_path, initialize=False)
+        self.data_version = None
+        self.is_ready = False
+
+        # Database calls from every page run on the worker's reader and writer
+        # threads so the UI never blocks on SQLite. Schema migrations can copy
+        # whole tables, so they are the writer's first job and reads are held
+        # until they finish
+        self.worker = DbWorker(self)
+        self.worker.start(reads=False)
+        request = self.worker.submit(self._open_database, priority=PRIORITY_BULK)
+        request.finished.connect(self._on_database_open)
+        request.failed.connect(self.open_failed.emit)
+
+        # Online backups run on their own thread, separate from the worker
+        self.backups = BackupManager(db_path)
+        self.backup_thread = None
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.auto_backup_if_due)
+        self.backup_timer.start(60 * 60 * 1000)
+        QTimer.singleShot(30 * 1000, self.auto_backup_if_due)
+
+        # Vacuum/analyze when the worker is idle, or straight after large writes
+        self.maintenance = DatabaseMaintenance(self.db)
+        self.maintenance_version = self.data_version
+        self.maintenance_request = None
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.timeout.connect(self.run_maintenance_if_idle)
+        self.maintenance_timer.start(10 * 60 * 1000)
+
+    def _open_database(self):
+        """Apply pending schema migrations and read the data version (database worker thread)"""
+        self.db.initialize_db()
+        return self.db.get_data_version()
+
+    def _on_database_open(self, version):
+        self.data_version = version
+        self.maintenance_version = version
+        self.is_ready = True
+        self.worker.start_reads()
+        self.ready.emit()
+
+    def notify_changed(self):
+        """Check the data version and tell every page if the data changed"""
+        request = self.worker.submit(self.db.get_data_version)
+        request.finished.connect(self._on_version)
+
+    def _on_version(self, version):
+        if version != self.data_version:
+            self.data_version = version
+            self.data_changed.emit()
+            if version - self.maintenance_version >= LARGE_WRITE_CHANGES:
+                self.schedule_maintenance(analyze=True)
+
+    def run_maintenance_if_idle(self):
+        """Run maintenance if nothing else is queued and it hasn't run on the current data"""
+        if not self.is_ready or not self.worker.is_idle():
+            return
+        if self.maintenance.last_report is None or self.maintenance_version != self.data_version:
+            self.schedule_maintenance()
+
+    def schedule_maintenance(self, analyze=False):
+        """Queue a maintenance run on the lowest worker lane"""
+        # VACUUM would wait on a running backup's read snapshot
+        if self.maintenance_request is not None or self.backup_thread is not None:
+            return
+        request = self.worker.submit(self.maintenance.run, analyze, priority=PRIORITY_MAINTENANCE)
+        request.finished.connect(self._on_maintenance_done)
+        request.failed.connect(self._on_maintenance_failed)
+        request.cancelled.connect(self._on_maintenance_failed)
+        self.maintenance_request = request
+
+    def _on_maintenance_done(self, report):
+        self.maintenance_request = None
+        self.maintenance_version = report['version']
+        self.maintenance_done.emit(report)
+
+    def _on_maintenance_failed(self, error=None):
+        self.maintenance_request = None
+
+    def start_backup(self):
+        """Start a backup in the background and return its thread, or None if one is running"""
+        if self.backup_thread is not None:
+            return None
+        thread = BackupThread(self.backups, self)
+        thread.finished.connect(self._on_backup_done)
+        self.backup_thread = thread
+        thread.start()
+        return thread
+
+    def _on_backup_done(self):
+        self.backup_thread.deleteLater()
+        self.backup_thread = None
+
+    def auto_backup_if_due(self):
+        """Back up if the auto backup setting is on and the last backup is old enough"""
+        settings = QSettings("BlueCrabGIS", "App")
+        if settings.value("data/auto_backup", "true") != "true" or not self.is_ready:
+            return
+        if self.backups.is_backup_due():
+            self.start_backup()
+
+    def close(self):
+        """Stop the worker and any backup, and close every connection"""
+        self.backup_timer.stop()
+        self.maintenance_timer.stop()
+        if self.backup_thread is not None:
+            self.backup_thread.cancel()
+            self.backup_thread.wait()
+        self.worker.stop()
+        self.db.close()
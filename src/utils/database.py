@@ -1,41 +1,308 @@
 import sqlite3
 import os
-import uuid
+import re
+from contextlib import contextmanager
 from datetime import datetime
 
+import numpy as np
+
+from src.utils.db_connection import ConnectionManager
+from src.utils.query_cache import QueryCache, make_key
+from src.utils.query_log import QueryLog
+
+MONTH_MAP = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+CRAB_REQUIRED_FIELDS = ('date_month', 'date_year', 'male_counts', 'female_counts', 'population')
+
+# Columns query_crab_data can return, mapped to their SQL expressions
+CRAB_COLUMNS = {
+    'id': 'cd.id',
+    'code': 'cd.code',
+    'date_month': 'cd.date_month',
+    'date_year': 'cd.date_year',
+    'male_counts': 'cd.male_counts',
+    'female_counts': 'cd.female_counts',
+    'population': 'cd.population',
+    'observer_id': 'cd.observer_id',
+    'observer_name': 'o.name',
+    'observer_email': 'o.email',
+    'observer_organization': 'o.organization',
+    'location_id': 'cd.location_id',
+    'latitude': 'l.latitude',
+    'longitude': 'l.longitude',
+    'location_name': 'l.location_name',
+    'region': 'l.region',
+    'created_at': 'cd.created_at'
+}
+
+# Keyset for iter_crab_data; matches the default newest-first ordering
+CRAB_KEYSET_ORDER = ('cd.date_year', 'cd.date_month', 'cd.rowid')
+
+# Columns update_crab_data_many can change
+CRAB_UPDATE_COLUMNS = ('date_month', 'date_year', 'male_counts', 'female_counts',
+                       'population', 'observer_id', 'location_id')
+
+# NumPy dtypes for columnar reads; text columns stay as object arrays
+CRAB_DTYPES = {
+    'id': np.int64,
+    'date_month': np.int16,
+    'date_year': np.int16,
+    'male_counts': np.int64,
+    'female_counts': np.int64,
+    'population': np.int64,
+    'observer_id': np.int64,
+    'location_id': np.int64,
+    'latitude': np.float64,
+    'longitude': np.float64
+}
+
+# agg_population stores exact counts per population value up to this cap,
+# so any bucketing with edges at or below it can be summed from it
+POPULATION_HISTOGRAM_CAP = 501
+
+# Tables whose changes are recorded in change_log
+TRACKED_TABLES = ('crab_data', 'observers', 'locations')
+
+# How many change_log entries to keep once prune_change_log runs
+CHANGE_LOG_RETENTION = 100000
+
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+SQL_CHUNK_SIZE = 500
+
+# Columns of the crab_search full-text index and their bm25 weights
+SEARCH_COLUMNS = (
+    ('code', 10.0),
+    ('observer', 5.0),
+    ('organization', 2.0),
+    ('location', 3.0),
+    ('region', 1.0)
+)
+
+# Searches matching more records than this skip bm25 ranking (it would cost
+# more than the lookup itself) and return the newest matches first
+SEARCH_RANK_LIMIT = 10000
+
+# Search text that looks like a record ID, e.g. 123 or C0000123
+SEARCH_ID_PATTERN = re.compile(r'[A-Za-z]?\d+')
+
+# Prefixes of the human-facing codes given to new rows, e.g. C0000042
+CODE_PREFIXES = {'crab_data': 'C', 'observers': 'O', 'locations': 'L'}
+
+# printf-style format of those codes (prefix, id); shared by Python and SQL
+CODE_FORMAT = '%s%07d'
+
+# Prime just under 2**48; see content_hash_sql
+CONTENT_HASH_MODULUS = 281474976710597
+
+def content_hash_sql(year, month, observer_id, location_id, male_counts, female_counts):
+    """SQL expression hashing a record's natural key to one INTEGER
+
+    The natural key is year, month, observer, location and the counts
+    (population is their sum), so two samples taken at the same site and
+    month are different records. Year and month take the top 15 bits; the
+    IDs and counts are folded into the low 48 modulo a prime, staying
+    within 64-bit integers. Different keys can collide, so matches must
+    still compare the key columns. Pure integer SQL keeps it usable in a
+    generated column with no application function.
+    """
+    ids = f"((({observer_id}) * 16777216 + ({location_id})) % {CONTENT_HASH_MODULUS})"
+    counts = f"({male_counts}) * 65537 + ({female_counts})"
+    return f"((({year}) * 12 + ({month})) << 48) + (({ids} * 1021 + {counts}) % {CONTENT_HASH_MODULUS})"
+
+# Ordered schema migrations: (version, description, DatabaseManager method).
+# PRAGMA user_version records the last one applied; append new steps at the end.
+SCHEMA_MIGRATIONS = (
+    (1, "base tables", '_migrate_base_tables'),
+    (2, "location spatial index", '_create_spatial_index'),
+    (3, "observer name registry", '_create_observer_registry'),
+    (4, "crab data indexes", '_create_crab_data_indexes'),
+    (5, "analytics summary tables", '_create_aggregates'),
+    (6, "change log", '_create_change_log'),
+    (7, "integer primary keys", '_migrate_integer_keys'),
+    (8, "full-text search index", '_create_search_index'),
+    (9, "merge log", '_create_merge_log'),
+    (10, "import batches", '_create_import_batches'),
+    (11, "content hash", '_create_content_hash'),
+    (12, "region totals trigger", '_create_region_trigger'),
+    (13, "content hash over counts", '_create_content_hash'),
+    (14, "import batch updates", '_create_import_batch_updates'),
+)
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def normalize_observer_name(name):
+    """Key used to decide whether two observer names are the same person"""
+    return ' '.join(str(name).split()).casefold()
+
+# Two locations closer than this (in degrees, about 100m) are the same site
+LOCATION_TOLERANCE = 0.001
+
+class LocationGrid:
+    """In-memory grid for matching points to sites not yet in the database"""
+    
+    def __init__(self, rows=()):
+        self.cells = {}
+        self.count = 0
+        for row in rows:
+            self.add(row['id'], row['latitude'], row['longitude'])
+    
+    def _cell(self, latitude, longitude):
+        return (int(latitude // LOCATION_TOLERANCE), int(longitude // LOCATION_TOLERANCE))
+    
+    def add(self, location_id, latitude, longitude):
+        """Register a location"""
+        self.cells.setdefault(self._cell(latitude, longitude), []).append(
+            (self.count, location_id, latitude, longitude)
+        )
+        self.count += 1
+    
+    def find(self, latitude, longitude):
+        """Return the ID of the earliest location within tolerance, or None"""
+        cell_lat, cell_lon = self._cell(latitude, longitude)
+        best = None
+        # A match can only be in the point's own cell or one of its neighbours
+        for d_lat in (-1, 0, 1):
+            for d_lon in (-1, 0, 1):
+                for entry in self.cells.get((cell_lat + d_lat, cell_lon + d_lon), ()):
+                    if (abs(entry[2] - latitude) < LOCATION_TOLERANCE and
+                            abs(entry[3] - longitude) < LOCATION_TOLERANCE):
+                        if best is None or entry[0] < best[0]:
+                            best = entry
+        return best[1] if best else None
+
 class DatabaseManager:
-    def __init__(self, db_path="data/blue_crab.db"):
+    def __init__(self, db_path="data/blue_crab.db", initialize=True):
         # Ensure data directory exists
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
         
         self.db_path = db_path
-        self.initialize_db()
+        # Every query is timed; slow ones are kept with their plans
+        self.query_log = QueryLog()
+        self.connection_manager = ConnectionManager(db_path, query_log=self.query_log)
+        self._has_rtree = None
+        
+        # Normalized observer name -> observer ID
+        self._observer_cache = {}
+        
+        # Results of repeated reads (aggregates, year-filtered lists)
+        self.query_cache = QueryCache()
+        
+        # Callers passing initialize=False run initialize_db() themselves,
+        # e.g. on a worker thread, before any other call
+        if initialize:
+            self.initialize_db()
     
     def get_connection(self):
-        """Get a connection to the SQLite database"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-        return conn
+        """Get this thread's long-lived connection to the SQLite database"""
+        return self.connection_manager.get_connection()
+    
+    @contextmanager
+    def transaction(self):
+        """Context manager that commits on success and rolls back on error"""
+        try:
+            with self.connection_manager.transaction() as conn:
+                yield conn
+        except BaseException:
+            # Cached IDs may refer to rows that were just rolled back
+            self.invalidate_caches()
+            raise
+    
+    def invalidate_caches(self):
+        """Drop in-process caches of database state"""
+        self._observer_cache.clear()
+        self.query_cache.clear()
+    
+    def cached_query(self, name, func, *args, **kwargs):
+        """Return func(*args, **kwargs), served from the query cache when possible
+        
+        name identifies the query; together with the normalized arguments and
+        the current data version it forms the cache key, so any write to the
+        tracked tables makes earlier results unreachable. Reads inside a
+        transaction bypass the cache since they may see uncommitted rows.
+        """
+        if self.connection_manager.in_transaction():
+            return func(*args, **kwargs)
+        
+        key = (self.get_data_version(),) + make_key(name, args, kwargs)
+        found, result = self.query_cache.get(key)
+        if not found:
+            result = func(*args, **kwargs)
+            self.query_cache.put(key, result)
+        return result
+    
+    def close(self):
+        """Close all connections held by this manager"""
+        self.connection_manager.close_all()
     
     def initialize_db(self):
-        """Initialize the database with required tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Bring the schema up to SCHEMA_VERSION by applying pending migrations"""
+        # Fast path: an up-to-date database costs a single pragma read
+        if self.get_schema_version() == SCHEMA_VERSION:
+            return
         
-        # Check if we need to migrate the existing table
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            # Re-read under the write lock; another connection may have migrated meanwhile
+            version = self.get_schema_version()
+            if version > SCHEMA_VERSION:
+                print(f"Database schema version {version} is newer than this application ({SCHEMA_VERSION})")
+                return
+            
+            for step_version, description, step in SCHEMA_MIGRATIONS:
+                if step_version <= version:
+                    continue
+                print(f"Applying schema migration {step_version}: {description}")
+                getattr(self, step)(cursor)
+                # user_version is part of the database header, so it commits with the step
+                cursor.execute(f"PRAGMA user_version = {step_version}")
+        
+        self._has_rtree = None
+    
+    def get_schema_version(self):
+        """Get the number of the last schema migration applied"""
+        return self.get_connection().execute("PRAGMA user_version").fetchone()[0]
+    
+    def _create_crab_data_table(self, cursor, name):
+        """Create the crab data table under the given name"""
+        cursor.execute(f'''
+        CREATE TABLE {name} (
+            id TEXT PRIMARY KEY,
+            date_month INTEGER NOT NULL,
+            date_year INTEGER NOT NULL,
+            male_counts INTEGER NOT NULL DEFAULT 0,
+            female_counts INTEGER NOT NULL DEFAULT 0,
+            population INTEGER NOT NULL,
+            observer_id TEXT NOT NULL,
+            location_id TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (observer_id) REFERENCES observers (id),
+            FOREIGN KEY (location_id) REFERENCES locations (id),
+            CHECK (male_counts + female_counts = population),
+            CHECK (male_counts >= 0 AND female_counts >= 0),
+            CHECK (population > 0),
+            CHECK (date_month >= 1 AND date_month <= 12),
+            CHECK (date_year >= 1900 AND date_year <= 2100)
+        )
+        ''')
+    
+    def _migrate_base_tables(self, cursor):
+        """Migration 1: create the core tables, converting pre-versioning layouts"""
         cursor.execute("PRAGMA table_info(crab_data)")
         columns = [column[1] for column in cursor.fetchall()]
         
         # If the old table exists with juvenile/adult columns, we need to migrate
         if 'juvenile_counts' in columns or 'adult_counts' in columns:
             print("Migrating database schema...")
-            self.migrate_database(conn, cursor)
+            self.migrate_database(cursor)
         
         # Create observers table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS observers (
             id TEXT PRIMARY KEY,
             name TEXT NOT NULL,
+            name_key TEXT,
             email TEXT,
             organization TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
@@ -54,17 +321,92 @@ class DatabaseManager:
         )
         ''')
         
-        # Create new crab_data table (without juvenile_counts and adult_counts)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('crab_data', 'crab_data_new')")
+        tables = {row[0] for row in cursor.fetchall()}
+        
+        if 'crab_data' in tables:
+            # Rebuild the existing table once so it carries the current
+            # constraints and defaults (without juvenile_counts and adult_counts)
+            print("Migrating data from old table to new table...")
+            cursor.execute('DROP TABLE IF EXISTS crab_data_new')
+            self._create_crab_data_table(cursor, 'crab_data_new')
+            cursor.execute('''
+            INSERT INTO crab_data_new (
+                id, date_month, date_year, male_counts, female_counts, 
+                population, observer_id, location_id, created_at
+            )
+            SELECT 
+                id, date_month, date_year, 
+                COALESCE(male_counts, 0) as male_counts,
+                COALESCE(female_counts, 0) as female_counts,
+                population, observer_id, location_id, created_at
+            FROM crab_data
+            ''')
+            
+            # Drop old table and rename new table
+            cursor.execute("DROP TABLE crab_data")
+            cursor.execute("ALTER TABLE crab_data_new RENAME TO crab_data")
+            print("Database migration completed successfully!")
+        elif 'crab_data_new' in tables:
+            # Left behind by an interrupted run of the old startup migration
+            cursor.execute("ALTER TABLE crab_data_new RENAME TO crab_data")
+        else:
+            self._create_crab_data_table(cursor, 'crab_data')
+        
+        # Drop old crab_population table if it exists
+        cursor.execute('DROP TABLE IF EXISTS crab_population')
+    
+    def _create_crab_data_indexes(self, cursor):
+        """Create the indexes behind the query_crab_data filters"""
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS crab_data_new (
-            id TEXT PRIMARY KEY,
+        CREATE INDEX IF NOT EXISTS idx_crab_data_year_month ON crab_data (date_year, date_month)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_crab_data_location ON crab_data (location_id)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_crab_data_observer ON crab_data (observer_id)
+        ''')
+    
+    def _migrate_integer_keys(self, cursor):
+        """Migration 7: replace the 8-character text IDs with INTEGER keys
+        
+        Each row keeps its old ID as its code. The new keys are the old rowids,
+        so insertion order is preserved and foreign keys become integer joins.
+        """
+        cursor.execute('''
+        CREATE TABLE observers_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL,
+            name TEXT NOT NULL,
+            name_key TEXT,
+            email TEXT,
+            organization TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE locations_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            location_name TEXT,
+            region TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE crab_data_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL,
             date_month INTEGER NOT NULL,
             date_year INTEGER NOT NULL,
             male_counts INTEGER NOT NULL DEFAULT 0,
             female_counts INTEGER NOT NULL DEFAULT 0,
             population INTEGER NOT NULL,
-            observer_id TEXT NOT NULL,
-            location_id TEXT NOT NULL,
+            observer_id INTEGER NOT NULL,
+            location_id INTEGER NOT NULL,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (observer_id) REFERENCES observers (id),
             FOREIGN KEY (location_id) REFERENCES locations (id),
@@ -76,49 +418,513 @@ class DatabaseManager:
         )
         ''')
         
-        # If the new table was just created and old table exists, migrate data
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='crab_data'")
-        old_table_exists = cursor.fetchone() is not None
+        cursor.execute('''
+        INSERT INTO observers_new (id, code, name, name_key, email, organization, created_at)
+        SELECT rowid, id, name, name_key, email, organization, created_at FROM observers
+        ''')
+        cursor.execute('''
+        INSERT INTO locations_new (id, code, latitude, longitude, location_name, region, created_at)
+        SELECT rowid, id, latitude, longitude, location_name, region, created_at FROM locations
+        ''')
+        cursor.execute('''
+        INSERT INTO crab_data_new (
+            id, code, date_month, date_year, male_counts, female_counts,
+            population, observer_id, location_id, created_at
+        )
+        SELECT cd.rowid, cd.id, cd.date_month, cd.date_year, cd.male_counts, cd.female_counts,
+               cd.population, o.rowid, l.rowid, cd.created_at
+        FROM crab_data cd
+        JOIN observers o ON o.id = cd.observer_id
+        JOIN locations l ON l.id = cd.location_id
+        ''')
+        copied = cursor.rowcount
+        cursor.execute('SELECT COUNT(*) FROM crab_data')
+        orphans = cursor.fetchone()[0] - copied
+        if orphans:
+            print(f"Dropped {orphans} records whose observer or location no longer exists")
+        
+        # crab_data goes first so no trigger is left pointing at a dropped table;
+        # the triggers, indexes and R*Tree are rebuilt below for the new keys
+        cursor.execute('DROP TABLE crab_data')
+        cursor.execute('DROP TABLE locations')
+        cursor.execute('DROP TABLE observers')
+        cursor.execute('DROP TABLE IF EXISTS locations_rtree')
+        cursor.execute('ALTER TABLE observers_new RENAME TO observers')
+        cursor.execute('ALTER TABLE locations_new RENAME TO locations')
+        cursor.execute('ALTER TABLE crab_data_new RENAME TO crab_data')
         
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='crab_data_new'")
-        new_table_exists = cursor.fetchone() is not None
+        for table in CODE_PREFIXES:
+            cursor.execute(f'CREATE UNIQUE INDEX idx_{table}_code ON {table} (code)')
+        self._create_spatial_index(cursor)
+        self._create_observer_registry(cursor)
+        self._create_crab_data_indexes(cursor)
+        self._create_aggregates(cursor)
         
-        if old_table_exists and new_table_exists:
-            # Check if new table is empty
-            cursor.execute("SELECT COUNT(*) FROM crab_data_new")
-            new_table_count = cursor.fetchone()[0]
-            
-            if new_table_count == 0:
-                print("Migrating data from old table to new table...")
-                # Migrate data from old table to new table
+        # Logged record IDs refer to the old keys; restart the log with a reset
+        # marker, keeping the version counter increasing
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        row = cursor.fetchone()
+        cursor.execute('DROP TABLE change_log')
+        self._create_change_log(cursor)
+        cursor.execute('''
+        INSERT INTO change_log (version, table_name, operation) VALUES (?, '*', 'reset')
+        ''', ((row[0] if row else 0) + 1,))
+    
+    def _create_change_log(self, cursor):
+        """Create the change log and the triggers that feed it"""
+        # AUTOINCREMENT keeps versions increasing even after the log is pruned
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            record_id INTEGER,
+            operation TEXT NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
+        for table in TRACKED_TABLES:
+            for operation, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+                cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_log_{operation} AFTER {operation.upper()} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, record_id, operation)
+                    VALUES ('{table}', {row}.id, '{operation}');
+                END
+                ''')
+    
+    def _create_search_index(self, cursor):
+        """Create the crab_search full-text index and the triggers that keep it in sync"""
+        # One row per crab record (rowid = crab_data.id) holding the text of
+        # its code, observer and location; prefix indexes make 'term*' fast
+        columns = ', '.join(name for name, _ in SEARCH_COLUMNS)
+        cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS crab_search USING fts5(
+            {columns},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        ''')
+        
+        # Bulk inserts set deferred inside their transaction and index their
+        # rows in one statement instead of one trigger call per row
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_index_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            deferred INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO search_index_state (id, deferred) VALUES (1, 0)')
+        
+        index_row = f'''
+            INSERT INTO crab_search (rowid, {columns})
+            SELECT NEW.id, NEW.code, o.name, o.organization, l.location_name, l.region
+            FROM (SELECT 1)
+            LEFT JOIN observers o ON o.id = NEW.observer_id
+            LEFT JOIN locations l ON l.id = NEW.location_id;
+        '''
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS crab_data_search_insert AFTER INSERT ON crab_data
+        WHEN NOT (SELECT deferred FROM search_index_state)
+        BEGIN
+            {index_row}
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS crab_data_search_delete AFTER DELETE ON crab_data
+        BEGIN
+            DELETE FROM crab_search WHERE rowid = OLD.id;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS crab_data_search_update AFTER UPDATE ON crab_data
+        WHEN NEW.code IS NOT OLD.code
+            OR NEW.observer_id IS NOT OLD.observer_id
+            OR NEW.location_id IS NOT OLD.location_id
+        BEGIN
+            DELETE FROM crab_search WHERE rowid = OLD.id;
+            {index_row}
+        END
+        ''')
+        
+        # Renaming an observer or location re-labels every record that uses it
+        for table, key, fields in (
+            ('observers', 'observer_id', (('observer', 'name'), ('organization', 'organization'))),
+            ('locations', 'location_id', (('location', 'location_name'), ('region', 'region')))
+        ):
+            changed = ' OR '.join(f"NEW.{column} IS NOT OLD.{column}" for _, column in fields)
+            assignments = ', '.join(f"{name} = NEW.{column}" for name, column in fields)
+            cleared = ', '.join(f"{name} = NULL" for name, _ in fields)
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table}
+            WHEN {changed}
+            BEGIN
+                UPDATE crab_search SET {assignments}
+                WHERE rowid IN (SELECT id FROM crab_data WHERE {key} = NEW.id);
+            END
+            ''')
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE crab_search SET {cleared}
+                WHERE rowid IN (SELECT id FROM crab_data WHERE {key} = OLD.id);
+            END
+            ''')
+        
+        # Index the records that already exist
+        cursor.execute('DELETE FROM crab_search')
+        self._index_search_rows(cursor)
+    
+    def _index_search_rows(self, cursor, first_id=None, last_id=None):
+        """Add crab_data rows, all or those with IDs in first_id..last_id, to crab_search"""
+        columns = ', '.join(name for name, _ in SEARCH_COLUMNS)
+        where = 'WHERE cd.id BETWEEN ? AND ?' if first_id is not None else ''
+        params = (first_id, last_id) if first_id is not None else ()
+        cursor.execute(f'''
+        INSERT INTO crab_search (rowid, {columns})
+        SELECT cd.id, cd.code, o.name, o.organization, l.location_name, l.region
+        FROM crab_data cd
+        LEFT JOIN observers o ON o.id = cd.observer_id
+        LEFT JOIN locations l ON l.id = cd.location_id
+        {where}
+        ''', params)
+    
+    def _create_merge_log(self, cursor):
+        """Migration 9: record how far each merged source database has been read"""
+        # last_source_id is the highest source crab_data rowid merged so far
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS merge_log (
+            source TEXT PRIMARY KEY,
+            last_source_id INTEGER NOT NULL DEFAULT 0,
+            merged_rows INTEGER NOT NULL DEFAULT 0,
+            rejected_rows INTEGER NOT NULL DEFAULT 0,
+            first_merged_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_merged_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+    
+    def _create_import_batches(self, cursor):
+        """Migration 10: record each CSV import and tag its records with batch_id"""
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_name TEXT NOT NULL,
+            file_hash TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            imported_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            rolled_back_at DATETIME
+        )
+        ''')
+        cursor.execute("PRAGMA table_info(crab_data)")
+        if 'batch_id' not in [column[1] for column in cursor.fetchall()]:
+            # Records entered by hand or merged from field databases keep NULL
+            cursor.execute('ALTER TABLE crab_data ADD COLUMN batch_id INTEGER REFERENCES import_batches (id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_crab_data_batch ON crab_data (batch_id)')
+    
+    def _create_import_batch_updates(self, cursor):
+        """Migration 14: keep the counts an import overwrote, so its rollback restores them"""
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_batch_updates (
+            batch_id INTEGER NOT NULL REFERENCES import_batches (id),
+            crab_id INTEGER NOT NULL,
+            male_counts INTEGER NOT NULL,
+            female_counts INTEGER NOT NULL,
+            population INTEGER NOT NULL,
+            PRIMARY KEY (batch_id, crab_id)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute("PRAGMA table_info(import_batches)")
+        if 'updated_count' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE import_batches ADD COLUMN updated_count INTEGER NOT NULL DEFAULT 0')
+    
+    def _create_content_hash(self, cursor):
+        """Migrations 11 and 13: index records by a hash of their natural key
+
+        A virtual generated column is computed on read, so every write path
+        keeps it current and only its index takes space. A column built
+        from an older content_hash_sql (migration 11 left out the counts)
+        is dropped and added again.
+        """
+        expression = content_hash_sql(
+            'date_year', 'date_month', 'observer_id', 'location_id', 'male_counts', 'female_counts'
+        )
+        cursor.execute("PRAGMA table_xinfo(crab_data)")
+        has_column = 'content_hash' in [column[1] for column in cursor.fetchall()]
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'crab_data'")
+        if expression not in cursor.fetchone()[0]:
+            if has_column:
+                cursor.execute('DROP INDEX IF EXISTS idx_crab_data_content_hash')
+                cursor.execute('ALTER TABLE crab_data DROP COLUMN content_hash')
+            cursor.execute(f'''
+            ALTER TABLE crab_data ADD COLUMN content_hash INTEGER
+            GENERATED ALWAYS AS ({expression}) VIRTUAL
+            ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_crab_data_content_hash ON crab_data (content_hash)')
+        # Upserts find the record to update by the key without the counts. Its
+        # location_id prefix serves the location filters, replacing that index
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_crab_data_natural_key
+        ON crab_data (location_id, date_year, date_month, observer_id)
+        ''')
+        cursor.execute('DROP INDEX IF EXISTS idx_crab_data_location')
+
+    def _aggregate_statements(self, row, sign):
+        """SQL that adds (sign=1) or removes (sign=-1) one crab_data row from the summaries
+        
+        row is NEW or OLD inside a trigger body.
+        """
+        region = f"COALESCE((SELECT region FROM locations WHERE id = {row}.location_id), '')"
+        bucket = f"MIN({row}.population, {POPULATION_HISTOGRAM_CAP})"
+        
+        if sign > 0:
+            return f'''
+            INSERT INTO agg_year_month (date_year, date_month, total_population,
+                                        total_males, total_females, record_count)
+            VALUES ({row}.date_year, {row}.date_month, {row}.population,
+                    {row}.male_counts, {row}.female_counts, 1)
+            ON CONFLICT (date_year, date_month) DO UPDATE SET
+                total_population = total_population + excluded.total_population,
+                total_males = total_males + excluded.total_males,
+                total_females = total_females + excluded.total_females,
+                record_count = record_count + 1;
+            INSERT INTO agg_region (date_year, region, total_population, record_count)
+            VALUES ({row}.date_year, {region}, {row}.population, 1)
+            ON CONFLICT (date_year, region) DO UPDATE SET
+                total_population = total_population + excluded.total_population,
+                record_count = record_count + 1;
+            INSERT INTO agg_population (date_year, population_value, record_count)
+            VALUES ({row}.date_year, {bucket}, 1)
+            ON CONFLICT (date_year, population_value) DO UPDATE SET
+                record_count = record_count + 1;
+            '''
+        
+        return f'''
+            UPDATE agg_year_month SET
+                total_population = total_population - {row}.population,
+                total_males = total_males - {row}.male_counts,
+                total_females = total_females - {row}.female_counts,
+                record_count = record_count - 1
+            WHERE date_year = {row}.date_year AND date_month = {row}.date_month;
+            DELETE FROM agg_year_month
+            WHERE date_year = {row}.date_year AND date_month = {row}.date_month AND record_count <= 0;
+            UPDATE agg_region SET
+                total_population = total_population - {row}.population,
+                record_count = record_count - 1
+            WHERE date_year = {row}.date_year AND region = {region};
+            DELETE FROM agg_region
+            WHERE date_year = {row}.date_year AND region = {region} AND record_count <= 0;
+            UPDATE agg_population SET record_count = record_count - 1
+            WHERE date_year = {row}.date_year AND population_value = {bucket};
+            DELETE FROM agg_population
+            WHERE date_year = {row}.date_year AND population_value = {bucket} AND record_count <= 0;
+            '''
+    
+    def _create_aggregates(self, cursor):
+        """Create the summary tables and the triggers that maintain them"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'agg_year_month'")
+        needs_rebuild = cursor.fetchone() is None
+        
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agg_year_month (
+            date_year INTEGER NOT NULL,
+            date_month INTEGER NOT NULL,
+            total_population INTEGER NOT NULL DEFAULT 0,
+            total_males INTEGER NOT NULL DEFAULT 0,
+            total_females INTEGER NOT NULL DEFAULT 0,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date_year, date_month)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agg_region (
+            date_year INTEGER NOT NULL,
+            region TEXT NOT NULL,
+            total_population INTEGER NOT NULL DEFAULT 0,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date_year, region)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS agg_population (
+            date_year INTEGER NOT NULL,
+            population_value INTEGER NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (date_year, population_value)
+        ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS crab_data_agg_insert AFTER INSERT ON crab_data
+        BEGIN
+            {self._aggregate_statements('NEW', 1)}
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS crab_data_agg_delete AFTER DELETE ON crab_data
+        BEGIN
+            {self._aggregate_statements('OLD', -1)}
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS crab_data_agg_update
+        AFTER UPDATE OF date_year, date_month, male_counts, female_counts, population, location_id
+        ON crab_data
+        BEGIN
+            {self._aggregate_statements('OLD', -1)}
+            {self._aggregate_statements('NEW', 1)}
+        END
+        ''')
+        self._create_region_trigger(cursor)
+        
+        if needs_rebuild:
+            self._rebuild_aggregates(cursor)
+    
+    def _create_region_trigger(self, cursor):
+        """Move a location's records between agg_region rows when its region changes"""
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS locations_agg_region
+        AFTER UPDATE OF region ON locations
+        WHEN COALESCE(OLD.region, '') <> COALESCE(NEW.region, '')
+        BEGIN
+            UPDATE agg_region SET
+                total_population = total_population - moved.population,
+                record_count = record_count - moved.records
+            FROM (
+                SELECT date_year, SUM(population) AS population, COUNT(*) AS records
+                FROM crab_data WHERE location_id = OLD.id GROUP BY date_year
+            ) AS moved
+            WHERE agg_region.date_year = moved.date_year
+              AND agg_region.region = COALESCE(OLD.region, '');
+            DELETE FROM agg_region
+            WHERE region = COALESCE(OLD.region, '') AND record_count <= 0;
+            INSERT INTO agg_region (date_year, region, total_population, record_count)
+            SELECT date_year, COALESCE(NEW.region, ''), SUM(population), COUNT(*)
+            FROM crab_data WHERE location_id = NEW.id GROUP BY date_year
+            ON CONFLICT (date_year, region) DO UPDATE SET
+                total_population = total_population + excluded.total_population,
+                record_count = record_count + excluded.record_count;
+        END
+        ''')
+    
+    def _rebuild_aggregates(self, cursor):
+        """Recompute every summary table from crab_data"""
+        cursor.execute('DELETE FROM agg_year_month')
+        cursor.execute('DELETE FROM agg_region')
+        cursor.execute('DELETE FROM agg_population')
+        
+        cursor.execute('''
+        INSERT INTO agg_year_month (date_year, date_month, total_population,
+                                    total_males, total_females, record_count)
+        SELECT date_year, date_month, SUM(population), SUM(male_counts),
+               SUM(female_counts), COUNT(*)
+        FROM crab_data
+        GROUP BY date_year, date_month
+        ''')
+        cursor.execute('''
+        INSERT INTO agg_region (date_year, region, total_population, record_count)
+        SELECT cd.date_year, COALESCE(l.region, ''), SUM(cd.population), COUNT(*)
+        FROM crab_data cd
+        LEFT JOIN locations l ON cd.location_id = l.id
+        GROUP BY cd.date_year, COALESCE(l.region, '')
+        ''')
+        cursor.execute(f'''
+        INSERT INTO agg_population (date_year, population_value, record_count)
+        SELECT date_year, MIN(population, {POPULATION_HISTOGRAM_CAP}), COUNT(*)
+        FROM crab_data
+        GROUP BY date_year, MIN(population, {POPULATION_HISTOGRAM_CAP})
+        ''')
+    
+    def rebuild_aggregates(self):
+        """Recompute the analytics summary tables from scratch
+        
+        The triggers keep them current for changes to crab_data and location
+        regions; run this after writing to the database outside the app.
+        """
+        with self.transaction() as conn:
+            self._rebuild_aggregates(conn.cursor())
+    
+    def _create_observer_registry(self, cursor):
+        """Give observers a normalized name key with a unique index"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'idx_observers_name_key'")
+        if cursor.fetchone() is not None:
+            return
+        
+        cursor.execute("PRAGMA table_info(observers)")
+        if 'name_key' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE observers ADD COLUMN name_key TEXT')
+        
+        # Older databases hold one observer per uploaded row; merge them first
+        self._backfill_observer_keys(cursor)
+        merged = self._merge_duplicate_observers(cursor)
+        if merged['merged']:
+            print(f"Merged {merged['merged']} duplicate observers")
+        
+        cursor.execute('''
+        CREATE UNIQUE INDEX idx_observers_name_key ON observers (name_key)
+        ''')
+    
+    def _create_spatial_index(self, cursor):
+        """Create the location indexes used for matching nearby sites"""
+        # Plain B-tree fallback, also used for bounding-box queries
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_locations_lat_lon ON locations (latitude, longitude)
+        ''')
+        
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'locations_rtree'")
+        rtree_exists = cursor.fetchone() is not None
+        
+        if not rtree_exists:
+            try:
                 cursor.execute('''
-                INSERT INTO crab_data_new (
-                    id, date_month, date_year, male_counts, female_counts, 
-                    population, observer_id, location_id, created_at
+                CREATE VIRTUAL TABLE locations_rtree USING rtree (
+                    id, min_lat, max_lat, min_lon, max_lon
                 )
-                SELECT 
-                    id, date_month, date_year, 
-                    COALESCE(male_counts, 0) as male_counts,
-                    COALESCE(female_counts, 0) as female_counts,
-                    population, observer_id, location_id, created_at
-                FROM crab_data
                 ''')
-                
-                # Drop old table and rename new table
-                cursor.execute("DROP TABLE crab_data")
-                cursor.execute("ALTER TABLE crab_data_new RENAME TO crab_data")
-                print("Database migration completed successfully!")
-        elif new_table_exists and not old_table_exists:
-            # Just rename the new table to the correct name
-            cursor.execute("ALTER TABLE crab_data_new RENAME TO crab_data")
-        
-        # Drop old crab_population table if it exists
-        cursor.execute('DROP TABLE IF EXISTS crab_population')
+            except sqlite3.OperationalError as e:
+                # SQLite built without R*Tree support
+                print(f"Spatial index unavailable, using B-tree index: {e}")
+                return
+            
+            # Index the sites that already exist
+            cursor.execute('''
+            INSERT INTO locations_rtree
+            SELECT rowid, latitude, latitude, longitude, longitude FROM locations
+            ''')
         
-        conn.commit()
-        conn.close()
+        # Keep the R*Tree in sync with locations (keyed on locations.rowid).
+        # OR REPLACE covers rowids left behind by INSERT OR REPLACE into locations.
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS locations_rtree_insert AFTER INSERT ON locations
+        BEGIN
+            INSERT OR REPLACE INTO locations_rtree
+            VALUES (NEW.rowid, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS locations_rtree_update AFTER UPDATE OF latitude, longitude ON locations
+        BEGIN
+            DELETE FROM locations_rtree WHERE id = OLD.rowid;
+            INSERT OR REPLACE INTO locations_rtree
+            VALUES (NEW.rowid, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS locations_rtree_delete AFTER DELETE ON locations
+        BEGIN
+            DELETE FROM locations_rtree WHERE id = OLD.rowid;
+        END
+        ''')
+    
+    def has_spatial_index(self):
+        """Whether locations has its R*Tree (SQLite may be built without it)"""
+        if self._has_rtree is None:
+            row = self.get_connection().execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'locations_rtree'"
+            ).fetchone()
+            self._has_rtree = row is not None
+        return self._has_rtree
     
-    def migrate_database(self, conn, cursor):
+    def migrate_database(self, cursor):
         """Migrate existing database to new schema"""
         try:
             # Create backup of existing data
@@ -134,25 +940,137 @@ class DatabaseManager:
     
     # Observer methods
     def insert_observer(self, data):
-        """Insert a new observer"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Insert a new observer, reusing the existing one with the same name"""
+        if 'id' not in data:
+            return self.get_or_create_observer(
+                data['name'], data.get('email', ''), data.get('organization', '')
+            )
         
-        observer_id = data.get('id', str(uuid.uuid4())[:8])
+        observer_id = int(data['id'])
+        with self.transaction() as conn:
+            conn.execute('''
+            INSERT INTO observers (id, code, name, name_key, email, organization)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name,
+                name_key = excluded.name_key,
+                email = excluded.email,
+                organization = excluded.organization
+            ''', (observer_id, data.get('code') or self._format_code('observers', observer_id),
+                  data['name'], normalize_observer_name(data['name']),
+                  data.get('email', ''), data.get('organization', '')))
         
-        cursor.execute('''
-        INSERT OR REPLACE INTO observers (id, name, email, organization)
-        VALUES (?, ?, ?, ?)
-        ''', (observer_id, data['name'], data.get('email', ''), data.get('organization', '')))
+        # The observer may have been renamed
+        self._observer_cache.clear()
+        return observer_id
+    
+    def get_or_create_observer(self, name, email='', organization=''):
+        """Return the ID of the observer with this name, creating it if needed"""
+        name_key = normalize_observer_name(name)
+        if not name_key:
+            raise ValueError("Observer name is required")
         
-        conn.commit()
-        conn.close()
+        observer_id = self._observer_cache.get(name_key)
+        if observer_id:
+            return observer_id
+        
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM observers WHERE name_key = ?', (name_key,))
+            row = cursor.fetchone()
+            if row:
+                observer_id = row['id']
+            else:
+                observer_id, code = self._allocate_ids(cursor, 'observers', 1)[0]
+                cursor.execute('''
+                INSERT INTO observers (id, code, name, name_key, email, organization)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', (observer_id, code, ' '.join(str(name).split()), name_key, email, organization))
+        
+        self._observer_cache[name_key] = observer_id
         return observer_id
     
+    def compact_observers(self):
+        """Merge observers sharing a normalized name and repoint their records
+        
+        Returns a dict with the number of observers 'merged' away and the
+        number of crab_data 'records_updated'.
+        """
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            self._backfill_observer_keys(cursor)
+            result = self._merge_duplicate_observers(cursor)
+        
+        self._observer_cache.clear()
+        return result
+    
+    def _backfill_observer_keys(self, cursor):
+        """Fill in name_key for observers that predate the registry"""
+        cursor.execute('SELECT id, name FROM observers WHERE name_key IS NULL')
+        rows = cursor.fetchall()
+        if rows:
+            cursor.executemany(
+                'UPDATE observers SET name_key = ? WHERE id = ?',
+                [(normalize_observer_name(row['name']), row['id']) for row in rows]
+            )
+    
+    def _merge_duplicate_observers(self, cursor):
+        """Fold duplicate observers into the oldest one of each name, set-based"""
+        # Untyped columns: migration 3 runs while observer IDs are still TEXT
+        cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS observer_merge (
+            old_id PRIMARY KEY,
+            new_id NOT NULL
+        )
+        ''')
+        cursor.execute('DELETE FROM temp.observer_merge')
+        cursor.execute('''
+        INSERT INTO temp.observer_merge (old_id, new_id)
+        SELECT o.id, keep.id
+        FROM observers o
+        JOIN (
+            SELECT name_key, MIN(rowid) AS keep_rowid
+            FROM observers
+            GROUP BY name_key
+            HAVING COUNT(*) > 1
+        ) d ON d.name_key = o.name_key
+        JOIN observers keep ON keep.rowid = d.keep_rowid
+        WHERE o.rowid <> d.keep_rowid
+        ''')
+        merged = cursor.rowcount
+        if merged <= 0:
+            return {'merged': 0, 'records_updated': 0}
+        
+        # Keep contact details the surviving observer is missing
+        for column in ('email', 'organization'):
+            cursor.execute(f'''
+            UPDATE observers SET {column} = (
+                SELECT o.{column}
+                FROM temp.observer_merge m
+                JOIN observers o ON o.id = m.old_id
+                WHERE m.new_id = observers.id AND COALESCE(o.{column}, '') <> ''
+                ORDER BY o.rowid
+                LIMIT 1
+            )
+            WHERE COALESCE({column}, '') = ''
+              AND id IN (SELECT new_id FROM temp.observer_merge)
+            ''')
+        
+        cursor.execute('''
+        UPDATE crab_data SET observer_id = (
+            SELECT new_id FROM temp.observer_merge WHERE old_id = crab_data.observer_id
+        )
+        WHERE observer_id IN (SELECT old_id FROM temp.observer_merge)
+        ''')
+        records_updated = cursor.rowcount
+        
+        cursor.execute('DELETE FROM observers WHERE id IN (SELECT old_id FROM temp.observer_merge)')
+        cursor.execute('DELETE FROM temp.observer_merge')
+        return {'merged': merged, 'records_updated': records_updated}
+    
     def get_all_observers(self):
         """Get all observers"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
         cursor.execute('SELECT * FROM observers ORDER BY name')
         rows = cursor.fetchall()
@@ -161,37 +1079,42 @@ class DatabaseManager:
         for row in rows:
             result.append({
                 'id': row['id'],
+                'code': row['code'],
                 'name': row['name'],
                 'email': row['email'],
                 'organization': row['organization'],
                 'created_at': row['created_at']
             })
         
-        conn.close()
         return result
     
     # Location methods
     def insert_location(self, data):
         """Insert a new location"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        location_id = data.get('id', str(uuid.uuid4())[:8])
+        with self.transaction() as conn:
+            if 'id' in data:
+                location_id = int(data['id'])
+                code = data.get('code') or self._format_code('locations', location_id)
+            else:
+                location_id, code = self._allocate_ids(conn.cursor(), 'locations', 1)[0]
+            # An upsert (not OR REPLACE) so update triggers see a changed region
+            conn.execute('''
+            INSERT INTO locations (id, code, latitude, longitude, location_name, region)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                code = excluded.code,
+                latitude = excluded.latitude,
+                longitude = excluded.longitude,
+                location_name = excluded.location_name,
+                region = excluded.region
+            ''', (location_id, code, data['latitude'], data['longitude'], 
+                  data.get('location_name', ''), data.get('region', '')))
         
-        cursor.execute('''
-        INSERT OR REPLACE INTO locations (id, latitude, longitude, location_name, region)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (location_id, data['latitude'], data['longitude'], 
-              data.get('location_name', ''), data.get('region', '')))
-        
-        conn.commit()
-        conn.close()
         return location_id
     
     def get_all_locations(self):
         """Get all locations"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
         cursor.execute('SELECT * FROM locations ORDER BY location_name')
         rows = cursor.fetchall()
@@ -200,6 +1123,7 @@ class DatabaseManager:
         for row in rows:
             result.append({
                 'id': row['id'],
+                'code': row['code'],
                 'latitude': row['latitude'],
                 'longitude': row['longitude'],
                 'location_name': row['location_name'],
@@ -207,146 +1131,739 @@ class DatabaseManager:
                 'created_at': row['created_at']
             })
         
-        conn.close()
         return result
     
     def find_or_create_location(self, latitude, longitude, location_name='', region=''):
         """Find existing location or create new one"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Try to find existing location within 0.001 degrees (approximately 100m)
+            location_id = self.match_locations([(latitude, longitude)])[0]
+            if location_id:
+                return location_id
+            
+            # Create new location
+            location_id, code = self._allocate_ids(cursor, 'locations', 1)[0]
+            cursor.execute('''
+            INSERT INTO locations (id, code, latitude, longitude, location_name, region)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (location_id, code, latitude, longitude, location_name, region))
+        
+        return location_id
+    
+    def match_locations(self, points):
+        """Match (latitude, longitude) points to existing locations in one call
+        
+        Returns a list with the ID of the earliest location within 0.001
+        degrees of each point, or None where there is no such location.
+        """
+        points = [(float(latitude), float(longitude)) for latitude, longitude in points]
+        if not points:
+            return []
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Try to find existing location within 0.001 degrees (approximately 100m)
         cursor.execute('''
-        SELECT id FROM locations 
-        WHERE ABS(latitude - ?) < 0.001 AND ABS(longitude - ?) < 0.001
-        LIMIT 1
-        ''', (latitude, longitude))
+        CREATE TEMP TABLE IF NOT EXISTS match_points (
+            idx INTEGER PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL
+        )
+        ''')
+        cursor.execute('DELETE FROM temp.match_points')
+        cursor.executemany(
+            'INSERT INTO temp.match_points (idx, latitude, longitude) VALUES (?, ?, ?)',
+            [(idx, latitude, longitude) for idx, (latitude, longitude) in enumerate(points)]
+        )
         
-        row = cursor.fetchone()
-        if row:
-            conn.close()
-            return row['id']
+        # The index narrows candidates to a small box; the ABS test is the exact match
+        if self.has_spatial_index():
+            candidates = '''
+                FROM locations_rtree r
+                JOIN locations l ON l.rowid = r.id
+                WHERE r.min_lat <= p.latitude + :tol AND r.max_lat >= p.latitude - :tol
+                  AND r.min_lon <= p.longitude + :tol AND r.max_lon >= p.longitude - :tol
+            '''
+        else:
+            candidates = '''
+                FROM locations l
+                WHERE l.latitude > p.latitude - :tol AND l.latitude < p.latitude + :tol
+            '''
+        cursor.execute(f'''
+        SELECT p.idx, (
+            SELECT l.id {candidates}
+              AND ABS(l.latitude - p.latitude) < :tol
+              AND ABS(l.longitude - p.longitude) < :tol
+            ORDER BY l.rowid
+            LIMIT 1
+        ) AS location_id
+        FROM temp.match_points p
+        ''', {'tol': LOCATION_TOLERANCE})
         
-        # Create new location
-        location_id = str(uuid.uuid4())[:8]
-        cursor.execute('''
-        INSERT INTO locations (id, latitude, longitude, location_name, region)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (location_id, latitude, longitude, location_name, region))
+        matches = [None] * len(points)
+        for row in cursor.fetchall():
+            matches[row['idx']] = row['location_id']
         
-        conn.commit()
-        conn.close()
-        return location_id
+        cursor.execute('DELETE FROM temp.match_points')
+        return matches
     
     # Crab data methods
-    def insert_crab_data(self, data):
-        """Insert a single crab data record"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _normalize_crab_record(self, data):
+        """Return a validated copy of a crab record, raising ValueError on bad data"""
+        record = dict(data)
         
-        # Generate ID if not provided
-        crab_id = data.get('id', str(uuid.uuid4())[:8])
+        missing = [key for key in CRAB_REQUIRED_FIELDS if record.get(key) is None]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
         
         # Convert month name to number if needed
-        if isinstance(data['date_month'], str):
-            month_map = {
-                'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-                'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
-            }
-            data['date_month'] = month_map.get(data['date_month'].lower(), 1)
+        if isinstance(record['date_month'], str):
+            month_text = record['date_month'].strip().lower()
+            if month_text[:3] in MONTH_MAP:
+                record['date_month'] = MONTH_MAP[month_text[:3]]
+        
+        try:
+            for key in ('date_month', 'date_year', 'male_counts', 'female_counts', 'population'):
+                record[key] = int(record[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid numeric value for {key}: {record[key]!r}")
+        
+        # Mirror the CHECK constraints so bad rows are caught before they hit SQLite
+        if not 1 <= record['date_month'] <= 12:
+            raise ValueError("Month must be between 1 and 12")
+        if not 1900 <= record['date_year'] <= 2100:
+            raise ValueError("Year must be between 1900 and 2100")
+        if record['male_counts'] < 0 or record['female_counts'] < 0:
+            raise ValueError("Counts cannot be negative")
+        if record['population'] <= 0:
+            raise ValueError("Population must be greater than 0")
         
         # Validate population totals (only male + female now)
-        if data['male_counts'] + data['female_counts'] != data['population']:
+        if record['male_counts'] + record['female_counts'] != record['population']:
             raise ValueError("Male + Female counts must equal population")
         
-        # Find or create observer
-        observer_id = data.get('observer_id')
-        if not observer_id and 'observer_name' in data:
-            observer_id = self.insert_observer({
-                'name': data['observer_name'],
-                'email': data.get('observer_email', ''),
-                'organization': data.get('observer_organization', '')
-            })
+        if not record.get('observer_id') and not record.get('observer_name'):
+            raise ValueError("Observer name is required")
         
-        # Find or create location
-        location_id = data.get('location_id')
-        if not location_id:
-            location_id = self.find_or_create_location(
-                data['latitude'], 
-                data['longitude'],
-                data.get('location_name', ''),
-                data.get('region', '')
-            )
+        if not record.get('location_id'):
+            try:
+                record['latitude'] = float(record['latitude'])
+                record['longitude'] = float(record['longitude'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("Valid latitude and longitude are required")
         
-        cursor.execute('''
-        INSERT INTO crab_data (
-            id, date_month, date_year, male_counts, female_counts, 
-            population, observer_id, location_id
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (crab_id, data['date_month'], data['date_year'], 
-              data['male_counts'], data['female_counts'], 
-              data['population'], observer_id, location_id))
+        return record
+    
+    def insert_crab_data(self, data):
+        """Insert a single crab data record and return its ID"""
+        data = self._normalize_crab_record(data)
+        
+        # Observer, location and record are written atomically
+        with self.transaction() as conn:
+            # Find or create observer
+            observer_id = data.get('observer_id')
+            if not observer_id and 'observer_name' in data:
+                observer_id = self.get_or_create_observer(
+                    data['observer_name'],
+                    data.get('observer_email', ''),
+                    data.get('observer_organization', '')
+                )
+            
+            # Find or create location
+            location_id = data.get('location_id')
+            if not location_id:
+                location_id = self.find_or_create_location(
+                    data['latitude'], 
+                    data['longitude'],
+                    data.get('location_name', ''),
+                    data.get('region', '')
+                )
+            
+            # The code is generated unless the record brings its own
+            crab_id, code = self._allocate_ids(conn.cursor(), 'crab_data', 1)[0]
+            conn.execute('''
+            INSERT INTO crab_data (
+                id, code, date_month, date_year, male_counts, female_counts, 
+                population, observer_id, location_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (crab_id, data.get('code') or code, data['date_month'], data['date_year'], 
+                  data['male_counts'], data['female_counts'], 
+                  data['population'], observer_id, location_id))
         
-        conn.commit()
-        conn.close()
         return crab_id
     
     def insert_many_crab_data(self, data_list):
-        """Insert multiple crab data records"""
-        for data in data_list:
-            self.insert_crab_data(data)
+        """Bulk insert crab data records in a single transaction
+        
+        Observers and locations for the whole batch are resolved in memory and
+        every table is written with executemany. Returns a dict with 'ids' (one
+        entry per input row, None for rejected rows), 'inserted' and 'rejected'
+        (a list of {'row': index, 'error': message}).
+        """
+        with self.transaction() as conn:
+            return self._insert_crab_records(conn.cursor(), data_list)
+    
+    def _insert_crab_records(self, cursor, data_list):
+        """insert_many_crab_data inside the caller's transaction
+        
+        Rows are validated before anything is written, so callers adding many
+        batches to one transaction don't need a savepoint per batch. Savepoints
+        make SQLite copy every already-dirty page a statement touches again,
+        which grows with the transaction.
+        """
+        ids = [None] * len(data_list)
+        rejected = []
+        valid = []
+        
+        # Validate every row up front so one bad row can't abort the batch
+        for index, data in enumerate(data_list):
+            try:
+                valid.append((index, self._normalize_crab_record(data)))
+            except ValueError as e:
+                rejected.append({'row': index, 'error': str(e)})
+        
+        if not valid:
+            return {'ids': ids, 'inserted': 0, 'rejected': rejected}
+        
+        valid = self._reject_duplicate_codes(cursor, valid, rejected)
+        records = [record for _, record in valid]
+        observer_ids = self.resolve_observers(cursor, records)
+        location_ids = self.resolve_locations(cursor, records)
+        
+        new_ids = self._allocate_ids(cursor, 'crab_data', len(valid))
+        rows = []
+        for (index, record), observer_id, location_id, (crab_id, code) in zip(
+            valid, observer_ids, location_ids, new_ids
+        ):
+            ids[index] = crab_id
+            rows.append((
+                crab_id, record.get('code') or code, record['date_month'], record['date_year'],
+                record['male_counts'], record['female_counts'],
+                record['population'], observer_id, location_id
+            ))
+        
+        # The new IDs are consecutive, so the search index is filled for the range at the end
+        cursor.execute('UPDATE search_index_state SET deferred = 1')
+        cursor.executemany('''
+        INSERT INTO crab_data (
+            id, code, date_month, date_year, male_counts, female_counts, 
+            population, observer_id, location_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        cursor.execute('UPDATE search_index_state SET deferred = 0')
+        if rows:
+            self._index_search_rows(cursor, new_ids[0][0], new_ids[-1][0])
+        
+        rejected.sort(key=lambda item: item['row'])
+        return {'ids': ids, 'inserted': len(rows), 'rejected': rejected}
+    
+    def _existing_codes(self, cursor, table, codes):
+        """Return the subset of codes already present in table"""
+        existing = set()
+        codes = list(codes)
+        for start in range(0, len(codes), SQL_CHUNK_SIZE):
+            chunk = codes[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'SELECT code FROM {table} WHERE code IN ({placeholders})', chunk)
+            existing.update(row['code'] for row in cursor.fetchall())
+        return existing
+    
+    def _format_code(self, table, row_id):
+        """Human-facing code for a row, e.g. C0000042"""
+        return CODE_FORMAT % (CODE_PREFIXES[table], row_id)
+    
+    def last_id(self, cursor, table):
+        """Highest ID ever given out in table (its AUTOINCREMENT counter)"""
+        cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    
+    def _allocate_ids(self, cursor, table, count):
+        """Reserve count new (id, code) pairs in table
+        
+        Must run inside a write transaction. IDs continue from the table's
+        AUTOINCREMENT counter, so they are never reused after deletes.
+        """
+        start = self.last_id(cursor, table) + 1
+        return [(row_id, self._format_code(table, row_id)) for row_id in range(start, start + count)]
+    
+    def insert_from_select(self, cursor, table, columns, select_sql, params=None):
+        """Insert the rows of a SELECT under new IDs and codes; returns (first_id, count)
+        
+        select_sql returns a sort_key column followed by columns, and its rows
+        get consecutive IDs in sort_key order, allocated and coded like
+        _allocate_ids. New crab_data rows are added to the search index in
+        one statement. params are the named parameters of select_sql. Must
+        run inside a write transaction.
+        """
+        first_id = self.last_id(cursor, table) + 1
+        column_list = ', '.join(columns)
+        params = dict(params or {}, insert_first_id=first_id, insert_code_prefix=CODE_PREFIXES[table])
+        if table == 'crab_data':
+            cursor.execute('UPDATE search_index_state SET deferred = 1')
+        cursor.execute(f'''
+        INSERT INTO {table} (id, code, {column_list})
+        SELECT new_id, printf('{CODE_FORMAT}', :insert_code_prefix, new_id), {column_list}
+        FROM (
+            SELECT :insert_first_id - 1 + ROW_NUMBER() OVER (ORDER BY sort_key) AS new_id, {column_list}
+            FROM ({select_sql})
+        )
+        ''', params)
+        count = cursor.rowcount
+        if table == 'crab_data':
+            # The new IDs are consecutive, so the search index is filled for the range
+            cursor.execute('UPDATE search_index_state SET deferred = 0')
+            if count:
+                self._index_search_rows(cursor, first_id, first_id + count - 1)
+        return first_id, count
+    
+    def _reject_duplicate_codes(self, cursor, valid, rejected):
+        """Drop rows whose explicit code repeats within the batch or already exists"""
+        explicit_codes = [record['code'] for _, record in valid if record.get('code')]
+        if not explicit_codes:
+            return valid
+        
+        existing = self._existing_codes(cursor, 'crab_data', explicit_codes)
+        
+        kept = []
+        for index, record in valid:
+            code = record.get('code')
+            if code and code in existing:
+                rejected.append({'row': index, 'error': f"Record code {code} already exists"})
+                continue
+            if code:
+                existing.add(code)
+            kept.append((index, record))
+        return kept
+    
+    def resolve_observers(self, cursor, records):
+        """Return an observer ID per record, resolving names through the registry
+        
+        Creates the missing observers; must run inside a write transaction.
+        """
+        name_keys = [
+            None if record.get('observer_id') else normalize_observer_name(record['observer_name'])
+            for record in records
+        ]
+        
+        # Look up every distinct name the cache doesn't know in one pass
+        missing = {}
+        for record, name_key in zip(records, name_keys):
+            if name_key and name_key not in self._observer_cache and name_key not in missing:
+                missing[name_key] = record
+        
+        keys = list(missing)
+        for start in range(0, len(keys), SQL_CHUNK_SIZE):
+            chunk = keys[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f'SELECT id, name_key FROM observers WHERE name_key IN ({placeholders})', chunk
+            )
+            for row in cursor.fetchall():
+                self._observer_cache[row['name_key']] = row['id']
+                del missing[row['name_key']]
+        
+        if missing:
+            new_ids = self._allocate_ids(cursor, 'observers', len(missing))
+            rows = []
+            for (observer_id, code), (name_key, record) in zip(new_ids, missing.items()):
+                rows.append((
+                    observer_id, code, ' '.join(str(record['observer_name']).split()), name_key,
+                    record.get('observer_email', ''), record.get('observer_organization', '')
+                ))
+                self._observer_cache[name_key] = observer_id
+            cursor.executemany('''
+            INSERT INTO observers (id, code, name, name_key, email, organization)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+        
+        return [
+            record.get('observer_id') or self._observer_cache[name_key]
+            for record, name_key in zip(records, name_keys)
+        ]
+    
+    def resolve_locations(self, cursor, records):
+        """Return a location ID per record, matching existing sites within 0.001 degrees
+        
+        Creates the missing locations; must run inside a write transaction.
+        """
+        location_ids = []
+        grid = LocationGrid()
+        new_locations = []
+        
+        # Existing sites come from the spatial index in one pass
+        unresolved = [record for record in records if not record.get('location_id')]
+        matches = iter(self.match_locations(
+            (record['latitude'], record['longitude']) for record in unresolved
+        ))
+        
+        for record in records:
+            location_id = record.get('location_id')
+            if not location_id:
+                latitude, longitude = record['latitude'], record['longitude']
+                # Points with no existing site may still share a site created in this batch
+                location_id = next(matches) or grid.find(latitude, longitude)
+                if location_id is None:
+                    # Placeholder key until real IDs are generated below
+                    location_id = ('new', len(new_locations))
+                    grid.add(location_id, latitude, longitude)
+                    new_locations.append((
+                        latitude, longitude,
+                        record.get('location_name', ''), record.get('region', '')
+                    ))
+            location_ids.append(location_id)
+        
+        if new_locations:
+            generated = self._allocate_ids(cursor, 'locations', len(new_locations))
+            cursor.executemany('''
+            INSERT INTO locations (id, code, latitude, longitude, location_name, region)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', [new_id + values for new_id, values in zip(generated, new_locations)])
+            location_ids = [
+                generated[location_id[1]][0] if isinstance(location_id, tuple) else location_id
+                for location_id in location_ids
+            ]
+        
+        return location_ids
     
     def get_all_crab_data(self):
         """Get all crab data with observer and location information"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        return self.query_crab_data()
+    
+    def _build_crab_filters(self, year=None, month=None, pop_range=None, bbox=None, observer=None):
+        """Translate query_crab_data filters into a WHERE clause and parameters"""
+        clauses = []
+        params = []
         
-        cursor.execute('''
-        SELECT 
-            cd.*,
-            o.name as observer_name,
-            o.email as observer_email,
-            o.organization as observer_organization,
-            l.latitude,
-            l.longitude,
-            l.location_name,
-            l.region
-        FROM crab_data cd
+        def add_in(column, values):
+            values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+            clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        
+        if year is not None:
+            add_in('cd.date_year', year)
+        if month is not None:
+            add_in('cd.date_month', month)
+        if pop_range is not None:
+            low, high = pop_range
+            if low is not None:
+                clauses.append('cd.population >= ?')
+                params.append(low)
+            if high is not None:
+                clauses.append('cd.population <= ?')
+                params.append(high)
+        if bbox is not None:
+            # (min_lat, min_lon, max_lat, max_lon), resolved through the locations index
+            min_lat, min_lon, max_lat, max_lon = bbox
+            clauses.append('''cd.location_id IN (
+                SELECT id FROM locations
+                WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+            )''')
+            params.extend([min_lat, max_lat, min_lon, max_lon])
+        if observer is not None:
+            names = observer if isinstance(observer, (list, tuple, set)) else [observer]
+            keys = [normalize_observer_name(name) for name in names]
+            clauses.append(
+                f"cd.observer_id IN (SELECT id FROM observers WHERE name_key IN ({','.join('?' * len(keys))}))"
+            )
+            params.extend(keys)
+        
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return where, params
+    
+    def _build_crab_order(self, order):
+        """Translate an order spec such as '-date_year' or ['region', 'id'] into SQL"""
+        if order is None:
+            return 'ORDER BY cd.date_year DESC, cd.date_month DESC'
+        
+        terms = []
+        for term in ([order] if isinstance(order, str) else order):
+            descending = term.startswith('-')
+            column = term.lstrip('-')
+            if column not in CRAB_COLUMNS:
+                raise ValueError(f"Unknown column: {column}")
+            terms.append(f"{CRAB_COLUMNS[column]} {'DESC' if descending else 'ASC'}")
+        return f"ORDER BY {', '.join(terms)}" if terms else ''
+    
+    def _build_crab_query(self, columns=None, year=None, month=None, pop_range=None,
+                          bbox=None, observer=None, order=None, limit=None,
+                          keyset=False, after_key=None):
+        """Build the SELECT behind query_crab_data; returns (sql, params, columns)
+        
+        With keyset=True the rows come in CRAB_KEYSET_ORDER, each prefixed by
+        its key values, starting after after_key.
+        """
+        columns = list(columns) if columns else list(CRAB_COLUMNS)
+        unknown = [column for column in columns if column not in CRAB_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        
+        where, params = self._build_crab_filters(year, month, pop_range, bbox, observer)
+        order_sql = self._build_crab_order(order)
+        
+        select = ', '.join(f"{CRAB_COLUMNS[column]} AS {column}" for column in columns)
+        if keyset:
+            key_columns = ', '.join(CRAB_KEYSET_ORDER)
+            select = f"{key_columns}, {select}"
+            order_sql = f"ORDER BY {' DESC, '.join(CRAB_KEYSET_ORDER)} DESC"
+            if after_key is not None:
+                # Row-value comparison walks the (date_year, date_month) index
+                where += ' AND ' if where else 'WHERE '
+                where += f"({key_columns}) < ({', '.join('?' * len(CRAB_KEYSET_ORDER))})"
+                params.extend(after_key)
+        needed = select + ' ' + order_sql
+        joins = ''
+        if 'o.' in needed:
+            joins += ' LEFT JOIN observers o ON cd.observer_id = o.id'
+        if 'l.' in needed:
+            joins += ' LEFT JOIN locations l ON cd.location_id = l.id'
+        
+        sql = f"SELECT {select} FROM crab_data cd{joins} {where} {order_sql}"
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        return sql, params, columns
+    
+    def query_crab_data(self, year=None, month=None, pop_range=None, bbox=None,
+                        observer=None, columns=None, order=None, limit=None):
+        """Query crab data with the filters applied in SQL
+        
+        year and month take a value or a list of values, pop_range an inclusive
+        (min, max) pair where either end may be None, bbox a
+        (min_lat, min_lon, max_lat, max_lon) box and observer a name or list of
+        names. columns restricts the keys of the returned dicts (default: all of
+        CRAB_COLUMNS) and order is a column name, '-column' for descending, or
+        a list of those. Observers and locations are only joined when a
+        requested column or the ordering needs them.
+        """
+        sql, params, columns = self._build_crab_query(
+            columns, year, month, pop_range, bbox, observer, order, limit
+        )
+        cursor = self.get_connection().cursor()
+        cursor.execute(sql, params)
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def count_crab_data(self, **filters):
+        """Count the records query_crab_data would return for the same filters"""
+        return self.cached_query('crab_data_count', self._read_crab_data_count, **filters)
+    
+    def _read_crab_data_count(self, **filters):
+        where, params = self._build_crab_filters(**filters)
+        cursor = self.get_connection().cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM crab_data cd {where}', params)
+        return cursor.fetchone()[0]
+
+    def query_crab_data_columns(self, columns=None, chunk_size=50000, **filters):
+        """Query crab data as a dict of NumPy arrays, one per column
+        
+        Takes the same filters as query_crab_data. Rows are fetched as plain
+        tuples in chunks and transposed straight into typed arrays, so no
+        per-row dicts are built. Results are cached and the arrays read-only.
+        """
+        return self.cached_query(
+            'crab_data_columns', self._read_crab_data_columns, columns, chunk_size, **filters
+        )
+    
+    def _read_crab_data_columns(self, columns, chunk_size, **filters):
+        sql, params, columns = self._build_crab_query(columns, **filters)
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunks.append(self._rows_to_columns(columns, rows))
+        
+        if not chunks:
+            return self._rows_to_columns(columns, [])
+        return {
+            column: np.concatenate([chunk[column] for chunk in chunks])
+            for column in columns
+        }
+    
+    def _rows_to_columns(self, columns, rows):
+        """Transpose row tuples into a dict of typed NumPy arrays"""
+        if not rows:
+            return {column: np.empty(0, dtype=CRAB_DTYPES.get(column, object)) for column in columns}
+        return {
+            column: np.array(values, dtype=CRAB_DTYPES.get(column, object))
+            for column, values in zip(columns, zip(*rows))
+        }
+    
+    def iter_crab_data(self, batch_size=1000, after_key=None, columnar=False,
+                       columns=None, **filters):
+        """Stream crab data in fixed-size batches using keyset pagination
+        
+        Yields (key, batch) pairs, newest records first. batch is a list of
+        dicts, or a dict of NumPy arrays when columnar is True; key is the
+        position after the batch and can be passed back as after_key to resume.
+        Each batch is a separate indexed query, so memory stays bounded and no
+        read transaction is held between batches. Takes the filters of
+        query_crab_data except order and limit.
+        """
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = None
+        key_width = len(CRAB_KEYSET_ORDER)
+        
+        while True:
+            sql, params, batch_columns = self._build_crab_query(
+                columns, limit=batch_size, keyset=True, after_key=after_key, **filters
+            )
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            
+            after_key = tuple(rows[-1][:key_width])
+            rows = [row[key_width:] for row in rows]
+            if columnar:
+                yield after_key, self._rows_to_columns(batch_columns, rows)
+            else:
+                yield after_key, [dict(zip(batch_columns, row)) for row in rows]
+            
+            if len(rows) < batch_size:
+                return
+    
+    def query_crab_data_frame(self, columns=None, **filters):
+        """Query crab data as a pandas DataFrame"""
+        import pandas as pd
+        
+        data = self.query_crab_data_columns(columns, **filters)
+        return pd.DataFrame(data, columns=list(data), copy=False)
+    
+    def get_available_years(self):
+        """Get the distinct survey years, oldest first"""
+        return self.cached_query('available_years', self._read_available_years)
+    
+    def _read_available_years(self):
+        cursor = self.get_connection().cursor()
+        cursor.execute('SELECT DISTINCT date_year FROM crab_data ORDER BY date_year')
+        return [row[0] for row in cursor.fetchall()]
+    
+    def get_available_months(self, year=None):
+        """Get the distinct survey months, optionally within one year"""
+        return self.cached_query('available_months', self._read_available_months, year)
+    
+    def _read_available_months(self, year):
+        where, params = self._build_crab_filters(year=year)
+        cursor = self.get_connection().cursor()
+        cursor.execute(
+            f'SELECT DISTINCT cd.date_month FROM crab_data cd {where} ORDER BY cd.date_month', params
+        )
+        return [row[0] for row in cursor.fetchall()]
+    
+    def search(self, text, limit=50, columns=None, offset=0, **filters):
+        """Full-text search over record codes, observers and locations
+        
+        Every word of text must match a word in the record's code, observer
+        name or organization, location name or region; the last word may be
+        the start of one, so results follow the text as it is typed. Text that
+        looks like a record ID (digits, optionally after a letter) also
+        matches any code containing it, so '123' finds C0000123. Results
+        are best match first (bm25, code matches weighted highest) as dicts
+        with the requested columns (default: all of CRAB_COLUMNS) plus 'rank';
+        when more than SEARCH_RANK_LIMIT records match, or the text looks
+        like an ID, they come newest first with rank None. Takes the filters
+        of query_crab_data; offset skips that many results for paging and
+        limit=None returns every match.
+        """
+        columns = list(columns) if columns else list(CRAB_COLUMNS)
+        unknown = [column for column in columns if column not in CRAB_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        select = ', '.join(f"{CRAB_COLUMNS[column]} AS {column}" for column in columns)
+        
+        cursor = self.get_connection().cursor()
+        matches = self._search_matches(cursor, text)
+        if matches is None:
+            return []
+        source, params, order = matches
+        where, filter_params = self._build_crab_filters(**filters)
+        
+        # Rank inside the index, then join only the rows that pass the filters.
+        # CROSS JOIN keeps the matches as the outer loop; driven from a
+        # filter's index instead, the match would run once per record
+        sql = f'''
+        SELECT {select}, s.score
+        FROM ({source}) s
+        CROSS JOIN crab_data cd ON cd.id = s.rowid
         LEFT JOIN observers o ON cd.observer_id = o.id
         LEFT JOIN locations l ON cd.location_id = l.id
-        ORDER BY cd.date_year DESC, cd.date_month DESC
-        ''')
+        {where}
+        ORDER BY s.{order}
+        '''
+        params = params + filter_params
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [-1 if limit is None else int(limit), int(offset)]
+        cursor.execute(sql, params)
+        return [dict(zip(columns + ['rank'], row)) for row in cursor.fetchall()]
+    
+    def count_search(self, text, limit=None, **filters):
+        """Count the records search() would return for text and filters, stopping at limit"""
+        cursor = self.get_connection().cursor()
+        matches = self._search_matches(cursor, text)
+        if matches is None:
+            return 0
+        source, params, _ = matches
+        where, filter_params = self._build_crab_filters(**filters)
+        joins = ''
+        if where:
+            joins = 'CROSS JOIN crab_data cd ON cd.id = s.rowid'
+        limit_sql = ' LIMIT ?' if limit is not None else ''
+        params = params + filter_params + ([int(limit)] if limit is not None else [])
+        cursor.execute(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM ({source}) s {joins} {where}{limit_sql})', params
+        )
+        return cursor.fetchone()[0]
+    
+    def _search_matches(self, cursor, text):
+        """Build the subquery of rowid and score for records matching text
         
-        rows = cursor.fetchall()
+        Returns (sql, params, order), order being the column to sort the
+        subquery's rows by, or None when text has no words.
+        """
+        terms = re.findall(r'\w+', str(text))
+        if not terms:
+            return None
+        # Quoted so FTS5 operators in user text are taken literally. Only the
+        # last term is a prefix: long prefixes can't use the prefix index and
+        # make FTS5 merge whole doclists
+        match = ' '.join(f'"{term}"' for term in terms) + '*'
         
-        result = []
-        for row in rows:
-            result.append({
-                'id': row['id'],
-                'date_month': row['date_month'],
-                'date_year': row['date_year'],
-                'male_counts': row['male_counts'],
-                'female_counts': row['female_counts'],
-                'population': row['population'],
-                'observer_id': row['observer_id'],
-                'observer_name': row['observer_name'],
-                'observer_email': row['observer_email'],
-                'observer_organization': row['observer_organization'],
-                'location_id': row['location_id'],
-                'latitude': row['latitude'],
-                'longitude': row['longitude'],
-                'location_name': row['location_name'],
-                'region': row['region'],
-                'created_at': row['created_at']
-            })
+        if SEARCH_ID_PATTERN.fullmatch(str(text).strip()):
+            # Each code is a single token, so a part of one such as '123' in
+            # C0000123 is only found by LIKE. That scans the code index, but
+            # a page of common matches stops early; indexing every digit
+            # suffix instead would double the cost of building crab_search
+            sql = '''
+            SELECT id AS rowid, NULL AS score FROM crab_data
+            WHERE code LIKE ? OR id IN (SELECT rowid FROM crab_search WHERE crab_search MATCH ?)
+            '''
+            return sql, [f"%{str(text).strip()}%", match], 'rowid DESC'
         
-        conn.close()
-        return result
+        cursor.execute(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM crab_search WHERE crab_search MATCH ? LIMIT ?)',
+            (match, SEARCH_RANK_LIMIT + 1)
+        )
+        if cursor.fetchone()[0] <= SEARCH_RANK_LIMIT:
+            weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+            score = f"bm25(crab_search, {weights})"
+            order = 'score'
+        else:
+            score = 'NULL'
+            order = 'rowid DESC'
+        sql = f'SELECT rowid, {score} AS score FROM crab_search WHERE crab_search MATCH ?'
+        return sql, [match], order
     
     def get_crab_data_by_id(self, crab_id):
         """Get crab data by ID with observer and location information"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.get_connection().cursor()
         
         cursor.execute('''
         SELECT 
@@ -365,11 +1882,11 @@ class DatabaseManager:
         ''', (crab_id,))
         
         row = cursor.fetchone()
-        conn.close()
         
         if row:
             return {
                 'id': row['id'],
+                'code': row['code'],
                 'date_month': row['date_month'],
                 'date_year': row['date_year'],
                 'male_counts': row['male_counts'],
@@ -390,111 +1907,380 @@ class DatabaseManager:
     
     def update_crab_data(self, crab_id, data):
         """Update crab data record"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         # Validate population totals
         if data['male_counts'] + data['female_counts'] != data['population']:
             raise ValueError("Male + Female counts must equal population")
         
-        cursor.execute('''
-        UPDATE crab_data SET
-            date_month = ?, date_year = ?, male_counts = ?, 
-            female_counts = ?, population = ?
-        WHERE id = ?
-        ''', (data['date_month'], data['date_year'], 
-              data['male_counts'], data['female_counts'], 
-              data['population'], crab_id))
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute('''
+            UPDATE crab_data SET
+                date_month = ?, date_year = ?, male_counts = ?, 
+                female_counts = ?, population = ?
+            WHERE id = ?
+            ''', (data['date_month'], data['date_year'], 
+                  data['male_counts'], data['female_counts'], 
+                  data['population'], crab_id))
     
     def delete_crab_data(self, crab_id):
         """Delete crab data by ID"""
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM crab_data WHERE id = ?', (crab_id,))
+    
+    def _load_id_list(self, cursor, ids):
+        """Fill temp.id_list with ids so statements can join against the set"""
+        cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS id_list (
+            id INTEGER PRIMARY KEY
+        )
+        ''')
+        cursor.execute('DELETE FROM temp.id_list')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO temp.id_list (id) VALUES (?)', ((int(crab_id),) for crab_id in ids)
+        )
+    
+    def delete_crab_data_many(self, ids):
+        """Delete a set of crab data records in one statement; returns the number deleted"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            self._load_id_list(cursor, ids)
+            cursor.execute('DELETE FROM crab_data WHERE id IN (SELECT id FROM temp.id_list)')
+            deleted = cursor.rowcount
+            cursor.execute('DELETE FROM temp.id_list')
+        return deleted
+    
+    # Import batch methods
+    def get_import_batches(self):
+        """Get every CSV import, newest first, with the number of its records still present"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        # The correlated count is a range scan of idx_crab_data_batch per batch
+        cursor.execute('''
+        SELECT b.id, b.file_name, b.file_hash, b.row_count, b.updated_count, b.imported_at, b.rolled_back_at,
+               (SELECT COUNT(*) FROM crab_data cd WHERE cd.batch_id = b.id) AS remaining
+        FROM import_batches b
+        ORDER BY b.id DESC
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def rollback_import_batch(self, batch_id):
+        """Undo an import; returns a dict with the records 'deleted' and 'restored'
+        
+        Records the import added are deleted, including those edited since.
+        Records it updated get back the counts they had before the import,
+        overwriting any later change; deleted ones stay deleted. Observers
+        and locations the import created are kept, since other records may
+        use them by now.
+        """
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT rolled_back_at FROM import_batches WHERE id = ?', (batch_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Import batch {batch_id} does not exist")
+            if row['rolled_back_at']:
+                raise ValueError(f"Import batch {batch_id} was already rolled back")
+            
+            cursor.execute('''
+            UPDATE crab_data
+            SET male_counts = u.male_counts, female_counts = u.female_counts, population = u.population
+            FROM import_batch_updates u
+            WHERE u.batch_id = ? AND crab_data.id = u.crab_id
+            ''', (batch_id,))
+            restored = cursor.rowcount
+            cursor.execute('DELETE FROM crab_data WHERE batch_id = ?', (batch_id,))
+            deleted = cursor.rowcount
+            cursor.execute(
+                'UPDATE import_batches SET rolled_back_at = CURRENT_TIMESTAMP WHERE id = ?', (batch_id,)
+            )
+        print(f"Rolled back import batch {batch_id}: {deleted} records deleted, {restored} restored")
+        return {'deleted': deleted, 'restored': restored}
+    
+    def update_crab_data_many(self, changes):
+        """Apply per-record changes in one transaction; returns the number of rows updated
+        
+        changes maps record IDs to dicts of new values for any of date_month,
+        date_year, male_counts, female_counts, population, observer_id,
+        observer_name and location_id. Changing one count requires both
+        male_counts and female_counts; population is derived when omitted.
+        Raises ValueError, leaving the data untouched, if any change is invalid.
+        """
+        rows = []
+        for crab_id, values in dict(changes).items():
+            row = {column: values.get(column) for column in CRAB_UPDATE_COLUMNS}
+            
+            month = row['date_month']
+            if isinstance(month, str) and month.strip().lower()[:3] in MONTH_MAP:
+                row['date_month'] = month = MONTH_MAP[month.strip().lower()[:3]]
+            if month is not None and not 1 <= int(month) <= 12:
+                raise ValueError(f"Record {crab_id}: Month must be between 1 and 12")
+            if row['date_year'] is not None and not 1900 <= int(row['date_year']) <= 2100:
+                raise ValueError(f"Record {crab_id}: Year must be between 1900 and 2100")
+            
+            counts = [row[key] for key in ('male_counts', 'female_counts', 'population')]
+            if any(value is not None for value in counts):
+                male, female, population = counts
+                if male is None or female is None:
+                    raise ValueError(f"Record {crab_id}: Both male and female counts are required")
+                if population is None:
+                    row['population'] = population = int(male) + int(female)
+                if int(male) < 0 or int(female) < 0:
+                    raise ValueError(f"Record {crab_id}: Counts cannot be negative")
+                if int(population) <= 0:
+                    raise ValueError(f"Record {crab_id}: Population must be greater than 0")
+                if int(male) + int(female) != int(population):
+                    raise ValueError(f"Record {crab_id}: Male + Female counts must equal population")
+            
+            observer_name = values.get('observer_name')
+            if observer_name is not None and not normalize_observer_name(observer_name):
+                raise ValueError(f"Record {crab_id}: Observer name is required")
+            rows.append((int(crab_id), row, observer_name))
         
-        cursor.execute('DELETE FROM crab_data WHERE id = ?', (crab_id,))
+        if not rows:
+            return 0
         
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Observers given by name are resolved (or created) in one pass
+            named = [(row, name) for _, row, name in rows if name is not None and row['observer_id'] is None]
+            if named:
+                observer_ids = self.resolve_observers(
+                    cursor, [{'observer_name': name} for _, name in named]
+                )
+                for (row, _), observer_id in zip(named, observer_ids):
+                    row['observer_id'] = observer_id
+            
+            columns = ', '.join(CRAB_UPDATE_COLUMNS)
+            cursor.execute(f'''
+            CREATE TEMP TABLE IF NOT EXISTS crab_changes (
+                id INTEGER PRIMARY KEY,
+                {', '.join(f"{column} INTEGER" for column in CRAB_UPDATE_COLUMNS)}
+            )
+            ''')
+            cursor.execute('DELETE FROM temp.crab_changes')
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO temp.crab_changes (id, {columns}) "
+                f"VALUES (?, {', '.join('?' * len(CRAB_UPDATE_COLUMNS))})",
+                [(crab_id,) + tuple(row[column] for column in CRAB_UPDATE_COLUMNS)
+                 for crab_id, row, _ in rows]
+            )
+            
+            # NULL in the change table means "keep the current value"
+            assignments = ', '.join(
+                f"{column} = COALESCE(c.{column}, crab_data.{column})" for column in CRAB_UPDATE_COLUMNS
+            )
+            cursor.execute(f'''
+            UPDATE crab_data SET {assignments}
+            FROM temp.crab_changes c
+            WHERE c.id = crab_data.id
+            ''')
+            updated = cursor.rowcount
+            cursor.execute('DELETE FROM temp.crab_changes')
+        return updated
     
-    def get_analytics_data(self):
-        """Get data for analytics"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_analytics_data(self, year=None):
+        """Get data for analytics from the precomputed summary tables"""
+        return self.cached_query('analytics', self._read_analytics_data, year)
+    
+    def _read_analytics_data(self, year):
+        cursor = self.get_connection().cursor()
+        year_filter = 'WHERE date_year = ?' if year is not None else ''
+        params = (year,) if year is not None else ()
         
         # Get monthly data
-        cursor.execute('''
+        cursor.execute(f'''
         SELECT 
-            date_year, date_month,
-            SUM(population) as total_population,
-            SUM(male_counts) as total_males,
-            SUM(female_counts) as total_females,
-            COUNT(*) as record_count
-        FROM crab_data
-        GROUP BY date_year, date_month
+            date_year, date_month, total_population, total_males,
+            total_females, record_count
+        FROM agg_year_month
+        {year_filter}
         ORDER BY date_year, date_month
-        ''')
+        ''', params)
         
-        monthly_data = cursor.fetchall()
+        monthly_data = [dict(row) for row in cursor.fetchall()]
         
         # Get regional data
-        cursor.execute('''
+        cursor.execute(f'''
         SELECT 
-            l.region,
-            SUM(cd.population) as total_population,
-            COUNT(*) as record_count
-        FROM crab_data cd
-        LEFT JOIN locations l ON cd.location_id = l.id
-        GROUP BY l.region
+            region,
+            SUM(total_population) as total_population,
+            SUM(record_count) as record_count
+        FROM agg_region
+        {year_filter}
+        GROUP BY region
         ORDER BY total_population DESC
-        ''')
+        ''', params)
         
-        regional_data = cursor.fetchall()
+        regional_data = [dict(row) for row in cursor.fetchall()]
         
-        # Get sex distribution
-        cursor.execute('''
+        # Sex distribution is the sum of the (few) year x month rows
+        sex_data = {
+            'total_males': sum(row['total_males'] for row in monthly_data),
+            'total_females': sum(row['total_females'] for row in monthly_data)
+        }
+        
+        return {
+            'monthly': monthly_data,
+            'regional': regional_data,
+            'sex_distribution': sex_data
+        }
+    
+    def get_summary_stats(self, year=None):
+        """Get record count and population totals, optionally for one year"""
+        return self.cached_query('summary_stats', self._read_summary_stats, year)
+    
+    def _read_summary_stats(self, year):
+        cursor = self.get_connection().cursor()
+        year_filter = 'WHERE date_year = ?' if year is not None else ''
+        
+        cursor.execute(f'''
         SELECT 
-            SUM(male_counts) as total_males,
-            SUM(female_counts) as total_females
-        FROM crab_data
-        ''')
+            COALESCE(SUM(record_count), 0) as record_count,
+            COALESCE(SUM(total_population), 0) as total_population,
+            COALESCE(SUM(total_males), 0) as total_males,
+            COALESCE(SUM(total_females), 0) as total_females
+        FROM agg_year_month
+        {year_filter}
+        ''', (year,) if year is not None else ())
         
-        sex_data = cursor.fetchone()
+        return dict(cursor.fetchone())
+    
+    def get_population_bucket_counts(self, upper_bounds, year=None):
+        """Count records per population bucket from the population histogram
         
-        conn.close()
+        upper_bounds are inclusive bucket edges in increasing order (each at
+        most POPULATION_HISTOGRAM_CAP - 1); the result has one more entry than
+        upper_bounds, the last counting everything above the final edge.
+        """
+        if any(bound >= POPULATION_HISTOGRAM_CAP for bound in upper_bounds):
+            raise ValueError(f"Bucket edges must be below {POPULATION_HISTOGRAM_CAP}")
+        return self.cached_query(
+            'population_buckets', self._read_population_bucket_counts, upper_bounds, year
+        )
+    
+    def _read_population_bucket_counts(self, upper_bounds, year):
+        cursor = self.get_connection().cursor()
+        year_filter = 'WHERE date_year = ?' if year is not None else ''
+        cursor.execute(f'''
+        SELECT population_value, SUM(record_count) as record_count
+        FROM agg_population
+        {year_filter}
+        GROUP BY population_value
+        ''', (year,) if year is not None else ())
         
-        return {
-            'monthly': [dict(row) for row in monthly_data],
-            'regional': [dict(row) for row in regional_data],
-            'sex_distribution': dict(sex_data) if sex_data else {'total_males': 0, 'total_females': 0}
-        }
+        counts = [0] * (len(upper_bounds) + 1)
+        for row in cursor.fetchall():
+            index = next(
+                (i for i, bound in enumerate(upper_bounds) if row['population_value'] <= bound),
+                len(upper_bounds)
+            )
+            counts[index] += row['record_count']
+        return counts
     
-    def reset_database(self):
-        """Reset the database by dropping and recreating all tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    # Change tracking
+    def get_data_version(self):
+        """Get a number that increases whenever tracked data changes"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    
+    def get_changes_since(self, version, table='crab_data'):
+        """Get the record IDs of table that changed after version
         
-        # Drop all tables
-        cursor.execute('DROP TABLE IF EXISTS crab_data')
-        cursor.execute('DROP TABLE IF EXISTS crab_data_new')
-        cursor.execute('DROP TABLE IF EXISTS crab_data_backup')
-        cursor.execute('DROP TABLE IF EXISTS crab_population')
-        cursor.execute('DROP TABLE IF EXISTS observers')
-        cursor.execute('DROP TABLE IF EXISTS locations')
+        Returns a dict with the current 'version' and the 'inserted',
+        'updated' and 'deleted' IDs, with repeated changes to a record
+        collapsed into its net effect. 'reset' is True when the delta can't
+        be computed (the database was reset or the log was pruned past
+        version) and the consumer should reload everything.
+        """
+        cursor = self.get_connection().cursor()
+        # Bound the read by the current version so concurrent writes can't split a delta
+        current = self.get_data_version()
+        cursor.execute('SELECT MIN(version) FROM change_log')
+        oldest = cursor.fetchone()[0]
+        cursor.execute('''
+        SELECT table_name, record_id, operation
+        FROM change_log
+        WHERE version > ? AND version <= ?
+        ORDER BY version
+        ''', (version, current))
+        rows = cursor.fetchall()
         
-        conn.commit()
-        conn.close()
+        result = {'version': current, 'inserted': [], 'updated': [], 'deleted': [], 'reset': False}
+        if version < current and (oldest is None or oldest > version + 1):
+            result['reset'] = True
+            return result
+        
+        # record_id -> (operation of first change, operation of last change)
+        net = {}
+        for row in rows:
+            if row['operation'] == 'reset':
+                result['reset'] = True
+                return result
+            if row['table_name'] != table:
+                continue
+            first, _ = net.get(row['record_id'], (row['operation'], None))
+            net[row['record_id']] = (first, row['operation'])
         
-        # Reinitialize
-        self.initialize_db()
+        for record_id, (first, last) in net.items():
+            if last == 'delete':
+                if first != 'insert':
+                    result['deleted'].append(record_id)
+            elif first == 'insert':
+                result['inserted'].append(record_id)
+            else:
+                result['updated'].append(record_id)
+        return result
+    
+    def prune_change_log(self, keep=CHANGE_LOG_RETENTION):
+        """Drop all but the newest keep change_log entries"""
+        with self.transaction() as conn:
+            conn.execute(
+                'DELETE FROM change_log WHERE version <= ?',
+                (self.get_data_version() - keep,)
+            )
+    
+    def reset_database(self):
+        """Reset the database by dropping and recreating all tables"""
+        with self.transaction() as conn:
+            # Drop all tables
+            conn.execute('DROP TABLE IF EXISTS crab_data')
+            conn.execute('DROP TABLE IF EXISTS crab_data_new')
+            conn.execute('DROP TABLE IF EXISTS crab_data_backup')
+            conn.execute('DROP TABLE IF EXISTS crab_population')
+            conn.execute('DROP TABLE IF EXISTS observers')
+            conn.execute('DROP TABLE IF EXISTS locations')
+            conn.execute('DROP TABLE IF EXISTS locations_rtree')
+            conn.execute('DROP TABLE IF EXISTS agg_year_month')
+            conn.execute('DROP TABLE IF EXISTS agg_region')
+            conn.execute('DROP TABLE IF EXISTS agg_population')
+            conn.execute('DROP TABLE IF EXISTS crab_search')
+            conn.execute('DROP TABLE IF EXISTS search_index_state')
+            conn.execute('DROP TABLE IF EXISTS merge_log')
+            conn.execute('DROP TABLE IF EXISTS import_batch_updates')
+            conn.execute('DROP TABLE IF EXISTS import_batches')
+            
+            # The change log survives so consumers learn they must reload
+            conn.execute('''
+            INSERT INTO change_log (table_name, operation) VALUES ('*', 'reset')
+            ''')
+            
+            # Reinitialize by replaying every migration in the same transaction
+            conn.execute('PRAGMA user_version = 0')
+            self.initialize_db()
+        
+        self.invalidate_caches()
         print("Database reset completed successfully!")
 
     def delete_all_crab_data(self):
         """Delete all records from the crab_data table"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM crab_data')
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM crab_data')
+            # Merged files would otherwise be skipped when merged again
+            conn.execute('DELETE FROM merge_log')
+            conn.execute('''
+            UPDATE import_batches SET rolled_back_at = CURRENT_TIMESTAMP
+            WHERE rolled_back_at IS NULL
+            ''')
+            conn.execute('DELETE FROM import_batch_updates')
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+# Every live manager, so a thread can close all of its connections on exit
+_managers = weakref.WeakSet()
+
+def close_thread_connections():
+    """Close the calling thread's connection in every ConnectionManager"""
+    for manager in list(_managers):
+        manager.close_thread_connection()
+
+class ConnectionManager:
+    """Hand out long-lived, per-thread SQLite connections"""
+
+    def __init__(self, db_path, busy_timeout=5000, cached_statements=256, query_log=None):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        # Connections record their queries in query_log when one is given
+        self.query_log = query_log
+        self._factory = query_log.connection_factory() if query_log else sqlite3.Connection
+
+        # One connection per thread, plus a registry so they can all be closed
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        _managers.add(self)
+
+    def _open(self):
+        """Open and tune a new connection"""
+        # isolation_level=None leaves transaction control to transaction()
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=self._factory
+        )
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+
+        # Only takes effect when the file is new; maintenance converts older files.
+        # Setting it waits for the write lock, so don't on existing files
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL lets readers run alongside a writer; NORMAL is durable in WAL mode
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def get_connection(self):
+        """Get the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a block in a transaction; nested blocks become savepoints"""
+        conn = self.get_connection()
+        depth = self._local.depth
+        savepoint = f"sp_{depth}"
+
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        else:
+            conn.execute(f"SAVEPOINT {savepoint}")
+        self._local.depth = depth + 1
+
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            else:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            raise
+
+        self._local.depth = depth
+        if depth == 0:
+            conn.execute("COMMIT")
+        else:
+            conn.execute(f"RELEASE {savepoint}")
+
+    def in_transaction(self):
+        """Whether the calling thread is inside transaction()"""
+        return getattr(self._local, 'depth', 0) > 0
+
+    def close_thread_connection(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+        self._local.conn = None
+        self._local.depth = 0
+
+    def close_all(self):
+        """Close every connection handed out by this manager"""
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import threading
+import traceback
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal
+
+from src.utils.db_connection import close_thread_connections
+
+# Priorities. Interactive requests (reads for the pages) get their own
+# thread and connection, so under WAL they run alongside a bulk write
+# instead of waiting for it. The rest share the writer thread, lower first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+PRIORITY_MAINTENANCE = 20
+
+class CancelledError(Exception):
+    """Raised inside a job to stop it after cancel() was requested"""
+    pass
+
+class DbRequest(QObject):
+    """Handle for one queued database call, delivering its results as signals"""
+    finished = pyqtSignal(object)    # Return value of the call
+    failed = pyqtSignal(str)         # Error message
+    cancelled = pyqtSignal()
+    progress = pyqtSignal(int, int)  # done, total
+    partial = pyqtSignal(object)     # Intermediate result, e.g. one batch of rows
+
+    def __init__(self, func, args, kwargs, priority, pass_request):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.pass_request = pass_request
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Ask the request to stop; queued requests are dropped, running jobs stop at their next check"""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        """Whether cancel() has been called"""
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Raise CancelledError if cancel() has been called"""
+        if self._cancel_event.is_set():
+            raise CancelledError()
+
+    def report_progress(self, done, total):
+        """Report progress from inside a running job"""
+        self.progress.emit(int(done), int(total))
+
+    def report_partial(self, result):
+        """Deliver an intermediate result from inside a running job"""
+        self.partial.emit(result)
+
+class _DbLane(QThread):
+    """One worker thread running its queued requests one at a time, by priority"""
+    request_done = pyqtSignal(object)
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.setObjectName(name)
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._current = None
+
+    def push(self, request):
+        """Queue a request; False once the lane is stopping"""
+        with self._condition:
+            if self._stopping:
+                return False
+            # The counter keeps requests of the same priority first-in, first-out
+            heapq.heappush(self._queue, (request.priority, next(self._counter), request))
+            self._condition.notify()
+            return True
+
+    def is_idle(self):
+        """Whether nothing is running or queued"""
+        with self._condition:
+            return not self._queue and self._current is None
+
+    def cancel_all(self):
+        """Cancel the running request and everything still queued"""
+        with self._condition:
+            for _, _, request in self._queue:
+                request.cancel()
+            if self._current is not None:
+                self._current.cancel()
+
+    def stop(self, timeout=5000):
+        """Cancel outstanding work and wait for the thread to finish"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.cancel_all()
+        self.wait(timeout)
+
+    def run(self):
+        """Thread body: take requests off the queue until stop() is called"""
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if self._stopping and not self._queue:
+                    break
+                _, _, request = heapq.heappop(self._queue)
+                self._current = request
+
+            self._execute(request)
+
+            with self._condition:
+                self._current = None
+            self.request_done.emit(request)
+
+        # Connections are per thread, so close ours on the way out
+        close_thread_connections()
+
+    def _execute(self, request):
+        """Run one request and emit the matching signal"""
+        if request.is_cancelled():
+            request.cancelled.emit()
+            return
+        try:
+            if request.pass_request:
+                result = request.func(request, *request.args, **request.kwargs)
+            else:
+                result = request.func(*request.args, **request.kwargs)
+        except CancelledError:
+            request.cancelled.emit()
+            return
+        except Exception as e:
+            print(f"Database request failed: {e}")
+            traceback.print_exc()
+            request.failed.emit(str(e))
+            return
+
+        if request.is_cancelled():
+            request.cancelled.emit()
+        else:
+            request.finished.emit(result)
+
+class DbWorker(QObject):
+    """Run database calls off the GUI thread: a reader lane and a writer lane
+
+    PRIORITY_INTERACTIVE requests run on the reader thread; everything else
+    runs on the writer thread by priority. Each thread has its own
+    connection, and in WAL mode reads see the last committed data while a
+    long write is in progress. Interactive requests must only read.
+    """
+    _request_submitted = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._reader = _DbLane("DbReader", self)
+        self._writer = _DbLane("DbWriter", self)
+
+        # Keep requests alive until their signals have been delivered
+        self._pending = set()
+        self._request_submitted.connect(self._push, Qt.QueuedConnection)
+        for lane in (self._reader, self._writer):
+            lane.request_done.connect(self._release)
+
+    def start(self, reads=True):
+        """Start the writer thread, and the reader thread unless reads is False
+
+        With reads=False interactive requests wait in their queue until
+        start_reads(), e.g. while a first writer job migrates the schema.
+        """
+        self._writer.start()
+        if reads:
+            self.start_reads()
+
+    def start_reads(self):
+        """Start the reader thread if it isn't running yet"""
+        if not self._reader.isRunning():
+            self._reader.start()
+
+    def submit(self, func, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """Queue func(*args, **kwargs) and return its DbRequest"""
+        return self._enqueue(func, args, kwargs, priority, False)
+
+    def submit_job(self, job, *args, priority=PRIORITY_BULK, **kwargs):
+        """Queue a long job called as job(request, *args, **kwargs)
+
+        The job can use the request to report progress and partial results
+        and should call request.check_cancelled() between steps.
+        """
+        return self._enqueue(job, args, kwargs, priority, True)
+
+    def _enqueue(self, func, args, kwargs, priority, pass_request):
+        request = DbRequest(func, args, kwargs, priority, pass_request)
+        self._pending.add(request)
+        # Queued to the next event loop pass, so the caller can connect to
+        # the request's signals before the worker could possibly finish it
+        self._request_submitted.emit(request)
+        return request
+
+    def _push(self, request):
+        """Put a submitted request on its lane's queue (GUI thread)"""
+        lane = self._reader if request.priority == PRIORITY_INTERACTIVE else self._writer
+        if not lane.push(request):
+            request.cancelled.emit()
+            self._release(request)
+
+    def is_idle(self):
+        """Whether nothing is running or queued on either lane"""
+        return self._reader.is_idle() and self._writer.is_idle()
+
+    def cancel_all(self):
+        """Cancel the running requests and everything still queued"""
+        self._reader.cancel_all()
+        self._writer.cancel_all()
+
+    def stop(self, timeout=5000):
+        """Cancel outstanding work and wait for both threads to finish"""
+        self._reader.stop(timeout)
+        self._writer.stop(timeout)
+
+    def _release(self, request):
+        """Drop the reference to a request once it is done (GUI thread)"""
+        self._pending.discard(request)
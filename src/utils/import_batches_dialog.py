@@ -0,0 +1,184 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                            QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox,
+                            QAbstractItemView)
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor
+
+from src.utils.db_worker import PRIORITY_BULK
+from src.utils.notification import show_notification
+
+class ImportBatchesDialog(QDialog):
+    """List the CSV imports and roll back a whole import at once"""
+
+    def __init__(self, data_service, parent=None):
+        super().__init__(parent)
+        self.data_service = data_service
+        self.db_manager = data_service.db
+        self.db_worker = data_service.worker
+        self.batches = []
+        self.rollback_request = None
+        self.setWindowTitle("Import Batches")
+        self.resize(900, 500)
+
+        self.setStyleSheet("""
+            QDialog {
+                background-color: rgba(15, 32, 65, 0.95);
+                color: #e0e0e0;
+            }
+            QLabel {
+                color: #e0e0e0;
+            }
+            QTableWidget {
+                background-color: rgba(10, 25, 50, 0.7);
+                border: 1px solid rgba(41, 128, 185, 0.5);
+                border-radius: 8px;
+                color: #e0e0e0;
+            }
+            QHeaderView::section {
+                background-color: rgba(41, 128, 185, 0.7);
+                color: white;
+                border: none;
+                padding: 5px;
+                font-weight: bold;
+            }
+            QPushButton {
+                background-color: rgba(41, 128, 185, 0.8);
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 8px 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: rgba(52, 152, 219, 0.9);
+            }
+            QPushButton:disabled {
+                background-color: rgba(41, 128, 185, 0.3);
+            }
+        """)
+
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        controls.addStretch()
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.refresh)
+        self.rollback_btn = QPushButton("Roll Back Import")
+        self.rollback_btn.clicked.connect(self.rollback_selected)
+        controls.addWidget(refresh_btn)
+        controls.addWidget(self.rollback_btn)
+        layout.addLayout(controls)
+
+        # One row per import, newest first
+        self.table = QTableWidget()
+        self.table.setColumnCount(7)
+        self.table.setHorizontalHeaderLabels(["Batch", "File", "Imported", "Rows", "Updated", "Remaining", "Status"])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        for column in range(7):
+            header.setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.itemSelectionChanged.connect(self.update_buttons)
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.update_buttons()
+        self.refresh()
+
+    def refresh(self):
+        """Reload the import batches"""
+        # Read on the worker so a running import can't block the dialog
+        request = self.db_worker.submit(self.db_manager.get_import_batches)
+        request.finished.connect(self._show_batches)
+        request.failed.connect(
+            lambda error: show_notification(self, "Error", f"Failed to load import batches: {error}")
+        )
+
+    def _show_batches(self, batches):
+        self.batches = batches
+        self.table.setRowCount(len(self.batches))
+        for row, batch in enumerate(self.batches):
+            status = f"Rolled back {batch['rolled_back_at']}" if batch['rolled_back_at'] else "Active"
+            values = [
+                str(batch['id']), batch['file_name'], batch['imported_at'] or '',
+                f"{batch['row_count']:,}", f"{batch['updated_count']:,}", f"{batch['remaining']:,}", status
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column in (0, 3, 4, 5):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                if column == 1:
+                    item.setToolTip(f"SHA-256 {batch['file_hash']}")
+                if batch['rolled_back_at']:
+                    item.setForeground(QColor("#808080"))
+                self.table.setItem(row, column, item)
+
+        active = [batch for batch in self.batches if not batch['rolled_back_at']]
+        self.summary_label.setText(
+            f"{len(self.batches)} imports, {len(active)} active with "
+            f"{sum(batch['remaining'] for batch in active):,} records"
+        )
+        self.update_buttons()
+
+    def selected_batch(self):
+        rows = self.table.selectionModel().selectedRows()
+        return self.batches[rows[0].row()] if rows else None
+
+    def update_buttons(self):
+        batch = self.selected_batch()
+        self.rollback_btn.setEnabled(
+            self.rollback_request is None and batch is not None and not batch['rolled_back_at']
+        )
+
+    def rollback_selected(self):
+        """Delete every record of the selected import and restore the counts it updated"""
+        batch = self.selected_batch()
+        if batch is None or batch['rolled_back_at']:
+            return
+        message = (
+            f"Roll back the import of {batch['file_name']} (batch {batch['id']})?\n\n"
+            f"The {batch['remaining']:,} records it added will be deleted."
+        )
+        if batch['updated_count']:
+            # Only the counts are kept for updated records, and restoring them
+            # overwrites whatever was changed since
+            message += (
+                f" The {batch['updated_count']:,} existing records it updated get back the "
+                f"counts they had before the import, replacing any later edits to their counts."
+            )
+        reply = QMessageBox.question(
+            self, "Confirm Roll Back", message + "\n\nThis action cannot be undone.",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        self.rollback_btn.setText("Rolling Back...")
+        self.rollback_request = self.db_worker.submit(
+            self.db_manager.rollback_import_batch, batch['id'], priority=PRIORITY_BULK
+        )
+        self.rollback_request.finished.connect(self._on_rollback_finished)
+        self.rollback_request.failed.connect(self._on_rollback_failed)
+        self.update_buttons()
+
+    def _rollback_done(self):
+        self.rollback_request = None
+        self.rollback_btn.setText("Roll Back Import")
+        self.refresh()
+
+    def _on_rollback_finished(self, result):
+        self._rollback_done()
+        message = f"Rolled back import: {result['deleted']:,} records deleted"
+        if result['restored']:
+            message += f", {result['restored']:,} restored to their previous counts"
+        show_notification(self, "Success", message + ".")
+        self.data_service.notify_changed()
+
+    def _on_rollback_failed(self, error):
+        self._rollback_done()
+        show_notification(self, "Error", f"Failed to roll back import: {error}")
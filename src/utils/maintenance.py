@@ -0,0 +1,136 @@
+import os
+import time
+
+# Rows each index is sampled at by ANALYZE, so statistics stay cheap on big files
+ANALYSIS_LIMIT = 1000
+
+# This many tracked changes since the last run count as a large write
+LARGE_WRITE_CHANGES = 10000
+
+def format_report(report):
+    """Describe a DatabaseMaintenance.run report as lines of text"""
+    lines = [
+        f"Database maintenance: {report['vacuum']} vacuum freed {report['freed_pages']} pages "
+        f"({report['pages_before']} -> {report['pages_after']}), statistics via "
+        f"{report['statistics']}, {report['seconds']:.2f}s"
+    ]
+    for name, change in report['plan_changes'].items():
+        lines.append(f"  Plan for {name} changed:")
+        lines.append(f"    before: {'; '.join(change['before'])}")
+        lines.append(f"    after:  {'; '.join(change['after'])}")
+    return lines
+
+class DatabaseMaintenance:
+    """Keep the database file compact and the query planner statistics current
+
+    run() prunes the change log, reclaims free pages with incremental
+    vacuum, refreshes planner statistics with ANALYZE / PRAGMA optimize and
+    reports what changed. It must run outside a transaction, on the thread
+    that owns the connection (normally the database worker).
+    """
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.last_report = None
+
+    def plan_queries(self):
+        """Representative queries whose plans are compared before and after a run"""
+        queries = {}
+        sql, params, _ = self.db._build_crab_query(year=2024)
+        queries['crab data by year'] = (sql, params)
+        sql, params, _ = self.db._build_crab_query(keyset=True, limit=5000, after_key=(2024, 6, 0))
+        queries['keyset page'] = (sql, params)
+        sql, params, _ = self.db._build_crab_query(columns=['id'], bbox=(10.0, 120.0, 11.0, 121.0))
+        queries['bounding box'] = (sql, params)
+        sql, params, _ = self.db._build_crab_query(columns=['id'], observer='observer', month=6)
+        queries['observer and month'] = (sql, params)
+        return queries
+
+    def query_plans(self):
+        """Get the EXPLAIN QUERY PLAN details of each representative query"""
+        conn = self.db.get_connection()
+        plans = {}
+        for name, (sql, params) in self.plan_queries().items():
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plans[name] = [row[3] for row in rows]
+        return plans
+
+    def _file_size(self):
+        size = 0
+        for suffix in ('', '-wal'):
+            try:
+                size += os.path.getsize(self.db.db_path + suffix)
+            except OSError:
+                pass
+        return size
+
+    def run(self, analyze=False):
+        """Vacuum, analyze and prune; returns a report of what changed
+
+        The first run on a database created without incremental auto-vacuum
+        converts it with a full VACUUM. Full ANALYZE runs when analyze is
+        True or no statistics exist yet, PRAGMA optimize otherwise.
+        """
+        if self.db.connection_manager.in_transaction():
+            raise RuntimeError("Maintenance can't run inside a transaction")
+
+        conn = self.db.get_connection()
+        started = time.perf_counter()
+        version = self.db.get_data_version()
+        plans_before = self.query_plans()
+        size_before = self._file_size()
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        # Prune first so the pages it frees are reclaimed below
+        self.db.prune_change_log()
+
+        # 2 = incremental; other modes need a one-off VACUUM to switch over
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            vacuum = 'full'
+        else:
+            # execute() stops this pragma after one page; executescript() steps it to the end
+            conn.executescript("PRAGMA incremental_vacuum")
+            vacuum = 'incremental'
+
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone() is not None
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        if analyze or not has_stats:
+            conn.execute("ANALYZE")
+            statistics = 'analyze'
+        else:
+            conn.execute("PRAGMA optimize").fetchall()
+            statistics = 'optimize'
+
+        # Fold the WAL back into the main file so its size reflects the vacuum
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+        pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+        plans_after = self.query_plans()
+        plan_changes = {
+            name: {'before': plans_before[name], 'after': plans_after[name]}
+            for name in plans_after
+            if plans_after[name] != plans_before.get(name)
+        }
+
+        report = {
+            'version': version,
+            'vacuum': vacuum,
+            'statistics': statistics,
+            'free_pages_before': free_before,
+            'freed_pages': max(pages_before - pages_after, 0),
+            'pages_before': pages_before,
+            'pages_after': pages_after,
+            'bytes_before': size_before,
+            'bytes_after': self._file_size(),
+            'plan_changes': plan_changes,
+            'seconds': time.perf_counter() - started
+        }
+        self.last_report = report
+
+        print("\n".join(format_report(report)))
+        return report
@@ -0,0 +1,338 @@
+import os
+import time
+
+from src.utils.database import SQL_CHUNK_SIZE
+from src.utils.db_worker import CancelledError
+
+# Source records copied per transaction
+MERGE_BATCH_SIZE = 20000
+
+# Conflicts listed in a report; the rest are only counted
+MAX_REPORTED_CONFLICTS = 1000
+
+# Columns a source database needs, by table
+SOURCE_COLUMNS = {
+    'crab_data': ('date_month', 'date_year', 'male_counts', 'female_counts',
+                  'population', 'observer_id', 'location_id'),
+    'observers': ('id', 'name', 'email', 'organization'),
+    'locations': ('id', 'latitude', 'longitude', 'location_name', 'region'),
+}
+
+def _differs(master, source):
+    """Whether two descriptive values disagree; a blank on either side isn't a conflict"""
+    master = ' '.join(str(master or '').split()).casefold()
+    source = ' '.join(str(source or '').split()).casefold()
+    return bool(master and source and master != source)
+
+class DatabaseMerger:
+    """Merge field-team database files into the master database
+
+    Each source is attached to the master connection and copied with
+    INSERT ... SELECT in batches. Its observers are matched to master
+    observers by normalized name and its locations to master sites within
+    LOCATION_TOLERANCE, creating the ones that are new, and the records'
+    keys are remapped through temp tables. Records get new master codes,
+    since every field database numbers its own from C0000001.
+
+    merge_log keeps the highest source rowid merged per file, updated in
+    the same transaction as each batch, so a cancelled or failed merge
+    resumes where it stopped and merging a file again only brings in the
+    records added since. It must run outside a transaction, on the thread
+    that owns the connection (normally the database worker).
+    """
+
+    def __init__(self, db_manager, batch_size=MERGE_BATCH_SIZE):
+        self.db = db_manager
+        self.batch_size = batch_size
+
+    def merge(self, paths, progress=None, is_cancelled=None):
+        """Merge several source files and return a combined report
+
+        A file that fails is reported with its error and the others still
+        run. progress(done, total) is called in thousandths of the whole
+        job; is_cancelled() is checked between batches and raises
+        CancelledError, keeping the batches already merged.
+        """
+        started = time.perf_counter()
+        files = []
+        for index, path in enumerate(paths):
+            def file_progress(done, total, index=index):
+                if progress:
+                    progress(index * 1000 + done * 1000 // max(total, 1), len(paths) * 1000)
+
+            try:
+                files.append(self.merge_file(path, file_progress, is_cancelled))
+            except CancelledError:
+                raise
+            except Exception as e:
+                print(f"Merging {path} failed: {e}")
+                files.append(self._new_report(os.path.abspath(path), error=str(e)))
+
+        conflicts = [conflict for report in files for conflict in report['conflicts']]
+        return {
+            'files': files,
+            'inserted': sum(report['inserted'] for report in files),
+            'rejected': sum(report['rejected'] for report in files),
+            'observers_created': sum(report['observers_created'] for report in files),
+            'locations_created': sum(report['locations_created'] for report in files),
+            'conflicts': conflicts[:MAX_REPORTED_CONFLICTS],
+            'conflict_count': sum(report['conflict_count'] for report in files),
+            'failed': [report['source'] for report in files if report['error']],
+            'seconds': time.perf_counter() - started
+        }
+
+    def merge_file(self, path, progress=None, is_cancelled=None):
+        """Merge the records of one source file not merged before; returns its report"""
+        source = os.path.abspath(path)
+        if source == os.path.abspath(self.db.db_path):
+            raise ValueError("The master database can't be merged into itself")
+        if not os.path.isfile(source):
+            raise ValueError(f"File not found: {path}")
+        if self.db.connection_manager.in_transaction():
+            raise RuntimeError("Databases can't be merged inside a transaction")
+
+        conn = self.db.get_connection()
+        # ATTACH isn't allowed inside a transaction, so it brackets the batches
+        conn.execute("ATTACH DATABASE ? AS merge_source", (source,))
+        try:
+            self._check_source(conn)
+            return self._merge_attached(conn, source, progress, is_cancelled)
+        finally:
+            conn.execute("DROP TABLE IF EXISTS temp.merge_observer_map")
+            conn.execute("DROP TABLE IF EXISTS temp.merge_location_map")
+            conn.execute("DETACH DATABASE merge_source")
+
+    def _new_report(self, source, error=None):
+        return {
+            'source': source,
+            'pending': 0,
+            'inserted': 0,
+            'rejected': 0,
+            'observers_created': 0,
+            'locations_created': 0,
+            'conflicts': [],
+            'conflict_count': 0,
+            'error': error,
+            'seconds': 0.0
+        }
+
+    def _check_source(self, conn):
+        """Raise ValueError unless the attached file has the tables a merge reads"""
+        for table, columns in SOURCE_COLUMNS.items():
+            present = {row[1] for row in conn.execute(f"PRAGMA merge_source.table_info({table})")}
+            missing = [column for column in columns if column not in present]
+            if not present:
+                raise ValueError(f"Not a Blue Crab database: no {table} table")
+            if missing:
+                raise ValueError(f"Table {table} is missing columns: {', '.join(missing)}")
+
+    def _add_conflict(self, report, conflict):
+        report['conflict_count'] += 1
+        if len(report['conflicts']) < MAX_REPORTED_CONFLICTS:
+            report['conflicts'].append(dict(conflict, source=report['source']))
+
+    def _merge_attached(self, conn, source, progress, is_cancelled):
+        started = time.perf_counter()
+        report = self._new_report(source)
+
+        row = conn.execute(
+            'SELECT last_source_id FROM merge_log WHERE source = ?', (source,)
+        ).fetchone()
+        last_id = row[0] if row else 0
+        # Pre-integer-key files still have stable rowids, so rowid is the resume key
+        total = conn.execute(
+            'SELECT COUNT(*) FROM merge_source.crab_data WHERE rowid > ?', (last_id,)
+        ).fetchone()[0]
+        report['pending'] = total
+        if not total:
+            print(f"{source}: nothing new to merge")
+            return report
+
+        with self.db.transaction() as conn:
+            cursor = conn.cursor()
+            self._map_observers(cursor, last_id, report)
+            self._map_locations(cursor, last_id, report)
+
+        done = 0
+        while done < total:
+            if is_cancelled and is_cancelled():
+                raise CancelledError()
+
+            # Batches are rowid ranges, so each is one indexed range scan of the source
+            row = conn.execute('''
+            SELECT rowid FROM merge_source.crab_data WHERE rowid > ?
+            ORDER BY rowid LIMIT 1 OFFSET ?
+            ''', (last_id, self.batch_size - 1)).fetchone()
+            upper = row[0] if row else conn.execute(
+                'SELECT MAX(rowid) FROM merge_source.crab_data'
+            ).fetchone()[0]
+
+            with self.db.transaction() as conn:
+                cursor = conn.cursor()
+                count, inserted = self._copy_batch(cursor, last_id, upper)
+                cursor.execute('''
+                INSERT INTO merge_log (source, last_source_id, merged_rows, rejected_rows)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (source) DO UPDATE SET
+                    last_source_id = excluded.last_source_id,
+                    merged_rows = merged_rows + excluded.merged_rows,
+                    rejected_rows = rejected_rows + excluded.rejected_rows,
+                    last_merged_at = CURRENT_TIMESTAMP
+                ''', (source, upper, inserted, count - inserted))
+
+            report['inserted'] += inserted
+            report['rejected'] += count - inserted
+            done += count
+            last_id = upper
+            if progress:
+                progress(done, total)
+
+        if report['rejected']:
+            self._add_conflict(report, {
+                'type': 'record',
+                'key': None,
+                'field': None,
+                'master': None,
+                'value': f"{report['rejected']} records failed validation or lost their observer or location"
+            })
+
+        report['seconds'] = time.perf_counter() - started
+        print(f"Merged {report['inserted']} records from {source} in {report['seconds']:.1f}s "
+              f"({report['rejected']} rejected, {report['conflict_count']} conflicts)")
+        return report
+
+    def _map_observers(self, cursor, last_id, report):
+        """Resolve the source observers still needed to master IDs in temp.merge_observer_map"""
+        cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS merge_observer_map (
+            source_id PRIMARY KEY,
+            master_id INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute('DELETE FROM temp.merge_observer_map')
+        cursor.execute('''
+        SELECT id, name, email, organization FROM merge_source.observers
+        WHERE id IN (SELECT observer_id FROM merge_source.crab_data WHERE rowid > ?)
+          AND TRIM(COALESCE(name, '')) != ''
+        ''', (last_id,))
+        sources = cursor.fetchall()
+        if not sources:
+            return
+
+        before = self.db.last_id(cursor, 'observers')
+        master_ids = self.db.resolve_observers(cursor, [
+            {
+                'observer_name': row['name'],
+                'observer_email': row['email'] or '',
+                'observer_organization': row['organization'] or ''
+            }
+            for row in sources
+        ])
+        report['observers_created'] += self.db.last_id(cursor, 'observers') - before
+        cursor.executemany(
+            'INSERT INTO temp.merge_observer_map (source_id, master_id) VALUES (?, ?)',
+            [(row['id'], master_id) for row, master_id in zip(sources, master_ids)]
+        )
+
+        # Same name, different details: the master keeps its own
+        masters = self._fetch_by_id(cursor, 'observers', 'code, name, email, organization', master_ids)
+        for row, master_id in zip(sources, master_ids):
+            master = masters[master_id]
+            for field in ('email', 'organization'):
+                if _differs(master[field], row[field]):
+                    self._add_conflict(report, {
+                        'type': 'observer',
+                        'key': f"{master['code']} {master['name']}",
+                        'field': field,
+                        'master': master[field],
+                        'value': row[field]
+                    })
+
+    def _map_locations(self, cursor, last_id, report):
+        """Resolve the source locations still needed to master IDs in temp.merge_location_map"""
+        cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS merge_location_map (
+            source_id PRIMARY KEY,
+            master_id INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute('DELETE FROM temp.merge_location_map')
+        cursor.execute('''
+        SELECT id, latitude, longitude, location_name, region FROM merge_source.locations
+        WHERE id IN (SELECT location_id FROM merge_source.crab_data WHERE rowid > ?)
+          AND latitude IS NOT NULL AND longitude IS NOT NULL
+        ''', (last_id,))
+        sources = cursor.fetchall()
+        if not sources:
+            return
+
+        before = self.db.last_id(cursor, 'locations')
+        master_ids = self.db.resolve_locations(cursor, [
+            {
+                'latitude': row['latitude'],
+                'longitude': row['longitude'],
+                'location_name': row['location_name'] or '',
+                'region': row['region'] or ''
+            }
+            for row in sources
+        ])
+        report['locations_created'] += self.db.last_id(cursor, 'locations') - before
+        cursor.executemany(
+            'INSERT INTO temp.merge_location_map (source_id, master_id) VALUES (?, ?)',
+            [(row['id'], master_id) for row, master_id in zip(sources, master_ids)]
+        )
+
+        # Same site, different labels: the master keeps its own
+        masters = self._fetch_by_id(cursor, 'locations', 'code, location_name, region', master_ids)
+        for row, master_id in zip(sources, master_ids):
+            master = masters[master_id]
+            for field in ('location_name', 'region'):
+                if _differs(master[field], row[field]):
+                    self._add_conflict(report, {
+                        'type': 'location',
+                        'key': f"{master['code']} ({row['latitude']:.5f}, {row['longitude']:.5f})",
+                        'field': field,
+                        'master': master[field],
+                        'value': row[field]
+                    })
+
+    def _fetch_by_id(self, cursor, table, columns, ids):
+        """Get {id: row} for the given master rows"""
+        rows = {}
+        ids = list(set(ids))
+        for start in range(0, len(ids), SQL_CHUNK_SIZE):
+            chunk = ids[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'SELECT id, {columns} FROM {table} WHERE id IN ({placeholders})', chunk)
+            rows.update((row['id'], row) for row in cursor.fetchall())
+        return rows
+
+    def _copy_batch(self, cursor, after_id, last_id):
+        """Copy source records with rowids in (after_id, last_id]; returns (source rows, inserted)"""
+        cursor.execute('''
+        SELECT COUNT(*) FROM merge_source.crab_data WHERE rowid > ? AND rowid <= ?
+        ''', (after_id, last_id))
+        count = cursor.fetchone()[0]
+
+        # Rows failing the CHECK constraints or without a mapped observer and
+        # location are left out and counted as rejected. CROSS JOIN keeps the
+        # source range scan as the outer loop, and the unary + drops the
+        # source column's affinity so the untyped map keys can be searched by index
+        _, inserted = self.db.insert_from_select(cursor, 'crab_data', (
+            'date_month', 'date_year', 'male_counts', 'female_counts',
+            'population', 'observer_id', 'location_id'
+        ), '''
+        SELECT cd.rowid AS sort_key, cd.date_month, cd.date_year, cd.male_counts,
+               cd.female_counts, cd.population, om.master_id AS observer_id,
+               lm.master_id AS location_id
+        FROM merge_source.crab_data cd
+        CROSS JOIN temp.merge_observer_map om ON om.source_id = +cd.observer_id
+        CROSS JOIN temp.merge_location_map lm ON lm.source_id = +cd.location_id
+        WHERE cd.rowid > :after_id AND cd.rowid <= :last_id
+          AND cd.male_counts >= 0 AND cd.female_counts >= 0
+          AND cd.population > 0
+          AND cd.male_counts + cd.female_counts = cd.population
+          AND cd.date_month BETWEEN 1 AND 12
+          AND cd.date_year BETWEEN 1900 AND 2100
+        ''', {'after_id': after_id, 'last_id': last_id})
+        return count, inserted
@@ -0,0 +1,145 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+def estimate_size(value):
+    """Rough number of bytes a query result keeps alive"""
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(estimate_size(item) for item in value)
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(key) + estimate_size(item) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+def make_key(name, args=(), kwargs=None):
+    """Normalize a query name and its parameters into a hashable key
+
+    Keyword order doesn't matter and lists, tuples and sets of values are
+    treated alike, so equivalent filters share one entry.
+    """
+    def normalize(value):
+        if isinstance(value, dict):
+            return tuple(sorted((key, normalize(item)) for key, item in value.items()))
+        if isinstance(value, (set, frozenset)):
+            return tuple(sorted(normalize(item) for item in value))
+        if isinstance(value, (list, tuple)):
+            return tuple(normalize(item) for item in value)
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+
+    return (name, normalize(tuple(args)), normalize(kwargs or {}))
+
+def _freeze(value):
+    """Make cached NumPy arrays read-only so callers can't change shared results"""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _freeze(item)
+
+def _copy(value):
+    """Copy the dicts and lists of a result, sharing its (frozen) arrays and scalars
+
+    Each caller gets its own containers, so editing a result in place
+    can't change what later cache hits return.
+    """
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_copy(item) for item in value)
+    return value
+
+class QueryCache:
+    """Bounded LRU cache of query results with a byte budget and expiry
+
+    Entries are keyed on the query signature plus the data version they were
+    read at, so a write makes older entries unreachable and they age out.
+    put() stores a copy and get() returns one, so callers may change their
+    dicts and lists; NumPy arrays are shared and made read-only instead.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, max_entries=256):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # key -> (result, size, expiry time), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Get (True, result) for a live entry, or (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[0]
+        return True, _copy(result)
+
+    def put(self, key, result):
+        """Store a result, evicting least recently used entries to fit"""
+        size = estimate_size(result)
+        # A result larger than the whole budget would only flush everything else
+        if size > self.max_bytes:
+            return
+        _freeze(result)
+        result = _copy(result)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, time.monotonic() + self.ttl)
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def clear(self):
+        """Drop every entry; counters are kept"""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Get the hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,297 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Statements EXPLAIN QUERY PLAN can describe
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+# Frames in these files are skipped when looking for the caller of a query
+_DATA_LAYER_FILES = ('query_log.py', 'db_connection.py', 'database.py', 'query_cache.py',
+                     'maintenance.py', 'contextlib.py')
+
+# Long IN (...) lists are cut to this many parameters in the log
+MAX_LOGGED_PARAMS = 20
+
+def _json_value(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+# Code object -> whether it belongs to the data layer
+_layer_codes = {}
+
+def _capture_stack(frame):
+    """Get (code, line) pairs from frame up to the first one outside the data layer"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code, frame.f_lineno))
+        in_layer = _layer_codes.get(code)
+        if in_layer is None:
+            in_layer = _layer_codes[code] = os.path.basename(code.co_filename) in _DATA_LAYER_FILES
+        if not in_layer:
+            break
+        frame = frame.f_back
+    return stack
+
+def _call_site(stack):
+    """Get 'file:line in function' for the query itself and for its caller outside the data layer"""
+    def describe(code, line):
+        return f"{os.path.basename(code.co_filename)}:{line} in {code.co_name}"
+
+    site = next(
+        (describe(code, line) for code, line in stack
+         if os.path.basename(code.co_filename) != 'query_log.py'),
+        None
+    )
+    caller = describe(*stack[-1]) if stack and not _layer_codes.get(stack[-1][0]) else None
+    return site, caller
+
+def find_full_scans(plan):
+    """Get the plan lines that scan a whole table rather than use an index"""
+    return [
+        line for line in plan
+        if line.startswith('SCAN ') and ' USING ' not in line and 'VIRTUAL TABLE' not in line
+    ]
+
+class QueryLog:
+    """Time every query on instrumented connections and keep the slow ones
+
+    Every statement is timed from execute() until its last row is fetched,
+    and totals are kept per SQL text. Statements slower than threshold_ms
+    go into a ring buffer of the newest capacity entries, with their call
+    site, parameters, row count and EXPLAIN QUERY PLAN output. A statement
+    that ends when its cursor is garbage collected is explained at its
+    connection's next execute(); until then its plan is None.
+    """
+
+    def __init__(self, threshold_ms=100, capacity=200):
+        self.threshold_ms = threshold_ms
+        self.enabled = True
+        self._entries = deque(maxlen=capacity)
+        self._statements = {}
+        self._lock = threading.Lock()
+        # (connection, entry, sql, params) of slow statements awaiting EXPLAIN
+        self._unexplained = []
+
+    def connection_factory(self):
+        """Get a sqlite3.Connection subclass whose queries are recorded here"""
+        log = self
+
+        class InstrumentedConnection(sqlite3.Connection):
+            def cursor(self, factory=None):
+                cursor = super().cursor(factory or InstrumentedCursor)
+                if isinstance(cursor, InstrumentedCursor):
+                    cursor._log = log
+                return cursor
+
+            # The C implementations of these skip the cursor's Python methods
+            def execute(self, sql, parameters=()):
+                return self.cursor().execute(sql, parameters)
+
+            def executemany(self, sql, seq_of_parameters):
+                return self.cursor().executemany(sql, seq_of_parameters)
+
+        return InstrumentedConnection
+
+    def record(self, cursor, sql, params, seconds, rows, stack, explain=True):
+        """Add one finished statement to the totals, and to the slow log if over the threshold
+
+        With explain=False the plan is left for explain_pending(), for
+        callers that must not run a statement, such as finalizers.
+        """
+        with self._lock:
+            stats = self._statements.get(sql)
+            if stats is None:
+                stats = self._statements[sql] = {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+        if seconds * 1000 < self.threshold_ms:
+            return
+
+        site, caller = _call_site(stack)
+        plan = self._explain(cursor.connection, sql, params) if explain else None
+        if isinstance(params, dict):
+            logged = {key: _json_value(value) for key, value in list(params.items())[:MAX_LOGGED_PARAMS]}
+        else:
+            logged = [_json_value(value) for value in list(params or ())[:MAX_LOGGED_PARAMS]]
+
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'ms': round(seconds * 1000, 2),
+            'rows': rows,
+            'sql': ' '.join(sql.split()),
+            'params': logged,
+            'call_site': site,
+            'caller': caller,
+            'thread': threading.current_thread().name,
+            'plan': plan,
+            'full_scans': find_full_scans(plan or [])
+        }
+        with self._lock:
+            self._entries.append(entry)
+            if plan is None:
+                self._unexplained.append((cursor.connection, entry, sql, params))
+                # Entries of a connection that never runs again must not pile up
+                del self._unexplained[:-self._entries.maxlen]
+
+    def explain_pending(self, conn):
+        """Fill in the plans of slow statements on conn that were recorded without one"""
+        with self._lock:
+            pending = [item for item in self._unexplained if item[0] is conn]
+            self._unexplained = [item for item in self._unexplained if item[0] is not conn]
+        for _, entry, sql, params in pending:
+            plan = self._explain(conn, sql, params)
+            with self._lock:
+                entry['plan'] = plan
+                entry['full_scans'] = find_full_scans(plan)
+
+    def _explain(self, conn, sql, params):
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            # A plain cursor, so explaining isn't itself recorded
+            cursor = sqlite3.Cursor(conn)
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+            cursor.close()
+        except sqlite3.Error as e:
+            return [f"EXPLAIN failed: {e}"]
+        return [row[3] for row in rows]
+
+    def entries(self):
+        """Get the slow queries, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def statement_stats(self, limit=20):
+        """Get the statements with the most total time, slowest first"""
+        with self._lock:
+            items = [dict(stats, sql=' '.join(sql.split())) for sql, stats in self._statements.items()]
+        items.sort(key=lambda item: item['seconds'], reverse=True)
+        return items[:limit]
+
+    def clear(self):
+        """Forget all slow queries and totals"""
+        with self._lock:
+            self._entries.clear()
+            self._statements.clear()
+            self._unexplained.clear()
+
+    def export_json(self, path):
+        """Write the slow queries and statement totals to a JSON file"""
+        data = {
+            'exported_at': datetime.now().isoformat(timespec='seconds'),
+            'threshold_ms': self.threshold_ms,
+            'slow_queries': self.entries(),
+            'statements': self.statement_stats(limit=None)
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to its QueryLog once it is done"""
+    _log = None
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        log = self._log
+        if log is None or not log.enabled:
+            return super().execute(sql, parameters)
+        if log._unexplained:
+            log.explain_pending(self.connection)
+        stack = _capture_stack(sys._getframe(1))
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        elapsed = time.perf_counter() - started
+        if self.description is None:
+            # No result rows: the statement has already run to completion
+            log.record(self, sql, parameters, elapsed, max(self.rowcount, 0), stack)
+        else:
+            self._pending = [sql, parameters, elapsed, 0, stack]
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        log = self._log
+        if log is None or not log.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        stack = _capture_stack(sys._getframe(1))
+        # Only the first parameter set is kept for the log and EXPLAIN
+        seq_of_parameters = iter(seq_of_parameters)
+        first = next(seq_of_parameters, None)
+        if first is None:
+            return super().executemany(sql, [])
+        started = time.perf_counter()
+
+        def chained():
+            yield first
+            yield from seq_of_parameters
+
+        super().executemany(sql, chained())
+        log.record(self, sql, first, time.perf_counter() - started, max(self.rowcount, 0), stack)
+        return self
+
+    def _fetched(self, elapsed, rows, done):
+        pending = self._pending
+        if pending is None:
+            return
+        pending[2] += elapsed
+        pending[3] += rows
+        if done:
+            self._finish()
+
+    def _finish(self, explain=True):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            sql, parameters, elapsed, rows, stack = pending
+            self._log.record(self, sql, parameters, elapsed, rows, stack, explain)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(time.perf_counter() - started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(time.perf_counter() - started, 0, True)
+            raise
+        self._fetched(time.perf_counter() - started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Statements read with a single fetchone() end when their cursor is
+        # dropped. That can happen anywhere, even inside another statement's
+        # transaction or at shutdown, so only the timing is recorded here
+        self._finish(explain=False)
@@ -0,0 +1,197 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                            QTableWidget, QTableWidgetItem, QHeaderView, QSpinBox,
+                            QTextEdit, QSplitter, QFileDialog, QAbstractItemView)
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor
+import json
+
+from src.utils.maintenance import format_report
+from src.utils.notification import show_notification
+
+class QueryLogDialog(QDialog):
+    """Show the slow-query log of a DatabaseManager and the last maintenance report"""
+
+    def __init__(self, query_log, parent=None, maintenance_report=None):
+        super().__init__(parent)
+        self.query_log = query_log
+        self.entries = []
+        self.maintenance_report = None
+        self.setWindowTitle("Slow Query Log")
+        self.resize(1000, 640)
+
+        self.setStyleSheet("""
+            QDialog {
+                background-color: rgba(15, 32, 65, 0.95);
+                color: #e0e0e0;
+            }
+            QLabel {
+                color: #e0e0e0;
+            }
+            QSpinBox, QTextEdit {
+                background-color: rgba(10, 25, 50, 0.7);
+                border: 1px solid rgba(41, 128, 185, 0.5);
+                border-radius: 8px;
+                padding: 4px;
+                color: #e0e0e0;
+            }
+            QPushButton {
+                background-color: rgba(41, 128, 185, 0.8);
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 8px 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: rgba(52, 152, 219, 0.9);
+            }
+        """)
+
+        layout = QVBoxLayout(self)
+
+        # Threshold and actions
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Slow query threshold:"))
+        self.threshold_spin = QSpinBox()
+        self.threshold_spin.setRange(0, 60000)
+        self.threshold_spin.setSuffix(" ms")
+        self.threshold_spin.setValue(int(query_log.threshold_ms))
+        self.threshold_spin.valueChanged.connect(self.set_threshold)
+        controls.addWidget(self.threshold_spin)
+        controls.addStretch()
+
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.refresh)
+        clear_btn = QPushButton("Clear")
+        clear_btn.clicked.connect(self.clear)
+        export_btn = QPushButton("Export JSON")
+        export_btn.clicked.connect(self.export)
+        self.maintenance_btn = QPushButton("Maintenance Report")
+        self.maintenance_btn.clicked.connect(self.show_maintenance_report)
+        controls.addWidget(refresh_btn)
+        controls.addWidget(clear_btn)
+        controls.addWidget(export_btn)
+        controls.addWidget(self.maintenance_btn)
+        layout.addLayout(controls)
+
+        splitter = QSplitter(Qt.Vertical)
+
+        # One row per slow query, newest first
+        self.table = QTableWidget()
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["Time", "ms", "Rows", "Caller", "Full Scan", "SQL"])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        for column in range(5):
+            header.setSectionResizeMode(column, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(5, QHeaderView.Stretch)
+        self.table.itemSelectionChanged.connect(self.show_details)
+        splitter.addWidget(self.table)
+
+        # Parameters, call site and plan of the selected query
+        self.details = QTextEdit()
+        self.details.setReadOnly(True)
+        splitter.addWidget(self.details)
+        splitter.setSizes([420, 220])
+        layout.addWidget(splitter)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        # Freed pages and query plan changes of the last background maintenance run
+        self.maintenance_label = QLabel()
+        layout.addWidget(self.maintenance_label)
+        self.set_maintenance_report(maintenance_report)
+
+        self.refresh()
+
+    def set_threshold(self, value):
+        self.query_log.threshold_ms = value
+
+    def refresh(self):
+        """Reload the entries from the query log"""
+        self.entries = self.query_log.entries()
+        self.table.setRowCount(len(self.entries))
+        for row, entry in enumerate(self.entries):
+            values = [
+                entry['time'], f"{entry['ms']:.1f}", str(entry['rows']),
+                entry['caller'] or entry['call_site'] or '',
+                "Yes" if entry['full_scans'] else "", entry['sql']
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column in (1, 2):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                if entry['full_scans']:
+                    item.setForeground(QColor("#f87171"))
+                self.table.setItem(row, column, item)
+
+        scans = sum(1 for entry in self.entries if entry['full_scans'])
+        self.summary_label.setText(
+            f"{len(self.entries)} slow queries, {scans} with full table scans"
+        )
+        self.details.clear()
+
+    def show_details(self):
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return
+        entry = self.entries[rows[0].row()]
+        lines = [
+            entry['sql'],
+            "",
+            f"Parameters: {json.dumps(entry['params'])}",
+            f"Call site: {entry['call_site']}",
+            f"Caller: {entry['caller']}",
+            f"Thread: {entry['thread']}",
+            "",
+            "Query plan:"
+        ]
+        if entry['plan'] is None:
+            lines.append("  (captured at the connection's next query)")
+        else:
+            lines += [f"  {line}" for line in entry['plan']] or ["  (none)"]
+        if entry['full_scans']:
+            lines += ["", "Full scans:"] + [f"  {line}" for line in entry['full_scans']]
+        self.details.setPlainText("\n".join(lines))
+
+    def set_maintenance_report(self, report):
+        """Show the summary of a DatabaseMaintenance.run report (None before the first run)"""
+        self.maintenance_report = report
+        self.maintenance_btn.setEnabled(report is not None)
+        if report is None:
+            self.maintenance_label.setText("Maintenance has not run yet")
+            return
+        changes = len(report['plan_changes'])
+        self.maintenance_label.setText(
+            f"Last maintenance freed {report['freed_pages']:,} pages "
+            f"({report['bytes_before'] - report['bytes_after']:,} bytes); "
+            f"{changes} query plan{'' if changes == 1 else 's'} changed"
+        )
+
+    def show_maintenance_report(self):
+        """Show the whole last maintenance report, with the plan changes, in the details pane"""
+        if self.maintenance_report is None:
+            return
+        self.table.clearSelection()
+        self.details.setPlainText("\n".join(format_report(self.maintenance_report)))
+
+    def clear(self):
+        self.query_log.clear()
+        self.refresh()
+
+    def export(self):
+        """Save the log as JSON"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Query Log", "query_log.json", "JSON Files (*.json)"
+        )
+        if not file_path:
+            return
+        try:
+            self.query_log.export_json(file_path)
+            show_notification(self, "Success", f"Query log exported to {file_path}")
+        except OSError as e:
+            show_notification(self, "Error", f"Failed to export query log: {str(e)}")